@@ -0,0 +1,412 @@
+"""Columnar analytics over zone sessions and usage rollups."""
+
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_storage import WaterTrackingDB, from_epoch, local_day_start, to_epoch
+from logger import get_logger
+
+if TYPE_CHECKING:
+    from archive import ParquetArchive
+
+
+# Session record layout, in query order
+SESSION_DTYPE = np.dtype(
+    [
+        ("zone_name", object),
+        ("zone_number", np.int64),
+        ("start_time", np.int64),
+        ("duration_seconds", np.float64),
+        ("total_water_used", np.float64),
+        ("average_flow_rate", np.float64),
+    ]
+)
+
+# Upper bin edges in GPM for flow rate distributions (last bin is open)
+FLOW_RATE_BINS_GPM = (0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 12.0)
+
+
+def sessions_from_arrow(table: Any) -> np.ndarray:
+    """Session records from an Arrow table of archived sessions."""
+    sessions = np.empty(table.num_rows, dtype=SESSION_DTYPE)
+    for name in SESSION_DTYPE.names:
+        column = table.column(name)
+        if SESSION_DTYPE[name].kind == "O":
+            sessions[name] = column.to_pylist()
+        else:
+            sessions[name] = column.fill_null(0).to_numpy()
+    return sessions
+
+
+class SessionAnalytics:
+    """Vectorized per-zone aggregates, percentiles and distributions.
+
+    Sessions for a window are read in one query (plus one archive scan) into
+    a NumPy record array, then grouped with np.bincount. Rows are fetched in
+    chunks and packed into fixed-width records as they arrive, so memory
+    stays at about fifty bytes per session even over multi-year windows.
+    """
+
+    FETCH_SIZE = 50_000
+
+    def __init__(self, db: WaterTrackingDB, archive: Optional["ParquetArchive"] = None):
+        """Initialize the analytics layer.
+
+        Args:
+            db: Database holding the hot tier
+            archive: Parquet archive of older months, if any
+        """
+        self.db = db
+        self.archive = archive
+        self.logger = get_logger(__name__)
+
+    def load_sessions(self, start: datetime, end: datetime) -> np.ndarray:
+        """Sessions starting in [start, end) from SQLite and the archive.
+
+        Archived rows were deleted from SQLite when they were moved, so the
+        two tiers never overlap.
+
+        Returns:
+            Record array with SESSION_DTYPE fields; missing values are 0
+        """
+        start_epoch, end_epoch = to_epoch(start), to_epoch(end)
+        parts = [self._load_archived_sessions(start_epoch, end_epoch)]
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(
+                """
+                SELECT zone_name, zone_number, start_time,
+                       COALESCE(duration_seconds, 0),
+                       COALESCE(total_water_used, 0.0),
+                       COALESCE(average_flow_rate, 0.0)
+                FROM zone_sessions
+                WHERE start_time >= ? AND start_time < ?
+            """,
+                (start_epoch, end_epoch),
+            )
+            while True:
+                rows = cursor.fetchmany(self.FETCH_SIZE)
+                if not rows:
+                    break
+                parts.append(np.array(rows, dtype=SESSION_DTYPE))
+
+        return np.concatenate(parts)
+
+    def period_zone_totals(
+        self, boundaries: Sequence[datetime]
+    ) -> List[List[Dict[str, Any]]]:
+        """Per-zone session totals for consecutive periods, without distributions.
+
+        When every boundary is a local midnight, the hot tier is summed from
+        the per-zone daily rollup in one grouped query and archived sessions
+        are added from one scan. Other boundaries fall back to grouping the
+        raw sessions with period_zone_statistics().
+
+        Args:
+            boundaries: Ascending period edges; period i is
+                [boundaries[i], boundaries[i + 1])
+
+        Returns:
+            One list per period of dicts with zone_name, zone_number,
+            session_count, total_duration_seconds, total_water_used,
+            avg_flow_rate and avg_duration_seconds, ordered by zone number
+        """
+        if any(edge != local_day_start(edge) for edge in boundaries):
+            return self.period_zone_statistics(boundaries)
+
+        totals: Dict[Tuple[int, str, int], Dict[str, Any]] = {}
+        rows = self.db.get_period_zone_stats(list(boundaries))
+
+        archived = self._load_archived_sessions(
+            to_epoch(boundaries[0]), to_epoch(boundaries[-1])
+        )
+        if len(archived):
+            edges = np.array([to_epoch(edge) for edge in boundaries], dtype=np.int64)
+            periods = np.searchsorted(edges, archived["start_time"], side="right") - 1
+            group_periods, groups, inverse = self._group(
+                archived, ("zone_name", "zone_number"), periods
+            )
+            sums = {
+                column: np.bincount(
+                    inverse, weights=archived[source], minlength=len(groups)
+                )
+                for column, source in (
+                    ("total_duration_seconds", "duration_seconds"),
+                    ("total_water_used", "total_water_used"),
+                    ("flow_rate_sum", "average_flow_rate"),
+                )
+            }
+            counts = np.bincount(inverse, minlength=len(groups))
+            rows += [
+                {
+                    "period": period,
+                    **key,
+                    "session_count": int(counts[index]),
+                    **{column: float(sums[column][index]) for column in sums},
+                }
+                for index, (period, key) in enumerate(zip(group_periods, groups))
+            ]
+
+        for row in rows:
+            key = (row["period"], row["zone_name"], row["zone_number"])
+            total = totals.setdefault(
+                key,
+                {
+                    "zone_name": row["zone_name"],
+                    "zone_number": row["zone_number"],
+                    "session_count": 0,
+                    "total_duration_seconds": 0,
+                    "total_water_used": 0.0,
+                    "flow_rate_sum": 0.0,
+                },
+            )
+            for column in (
+                "session_count",
+                "total_duration_seconds",
+                "total_water_used",
+                "flow_rate_sum",
+            ):
+                total[column] += row[column]
+
+        results: List[List[Dict[str, Any]]] = [[] for _ in boundaries[1:]]
+        for (period, _, _), total in sorted(
+            totals.items(), key=lambda item: (item[0][0], item[0][2], item[0][1])
+        ):
+            count = total["session_count"]
+            total["total_duration_seconds"] = int(total["total_duration_seconds"])
+            total["avg_flow_rate"] = total.pop("flow_rate_sum") / count
+            total["avg_duration_seconds"] = total["total_duration_seconds"] / count
+            results[period].append(total)
+        return results
+
+    def zone_statistics(
+        self,
+        start: datetime,
+        end: datetime,
+        by: Tuple[str, ...] = ("zone_name", "zone_number"),
+        percentiles: Sequence[float] = (10, 50, 90),
+    ) -> List[Dict[str, Any]]:
+        """Per-zone session aggregates for sessions starting in [start, end).
+
+        Args:
+            start: Inclusive start of the window
+            end: Exclusive end of the window
+            by: Grouping columns, zone_name and/or zone_number
+            percentiles: Flow rate percentiles to report
+
+        Returns:
+            One dict per group, ordered by zone number then name, with the
+            grouping columns, session_count, total_duration_seconds,
+            total_water_used, avg_flow_rate (mean of session averages),
+            avg_duration_seconds, flow_rate_percentiles (keyed "p50" etc.)
+            and flow_rate_histogram (session counts per FLOW_RATE_BINS_GPM bin)
+        """
+        return self.period_zone_statistics([start, end], by, percentiles)[0]
+
+    def period_zone_statistics(
+        self,
+        boundaries: Sequence[datetime],
+        by: Tuple[str, ...] = ("zone_name", "zone_number"),
+        percentiles: Sequence[float] = (10, 50, 90),
+    ) -> List[List[Dict[str, Any]]]:
+        """Per-zone session aggregates for consecutive periods in one pass.
+
+        Sessions for the whole span are loaded once, assigned to periods by
+        start time and grouped by (period, zone) together.
+
+        Args:
+            boundaries: Ascending period edges; period i is
+                [boundaries[i], boundaries[i + 1])
+            by: Grouping columns, zone_name and/or zone_number
+            percentiles: Flow rate percentiles to report
+
+        Returns:
+            One list per period, each shaped like zone_statistics()
+        """
+        results: List[List[Dict[str, Any]]] = [[] for _ in boundaries[1:]]
+        sessions = self.load_sessions(boundaries[0], boundaries[-1])
+        if not len(sessions):
+            return results
+
+        edges = np.array([to_epoch(edge) for edge in boundaries], dtype=np.int64)
+        periods = np.searchsorted(edges, sessions["start_time"], side="right") - 1
+
+        group_periods, groups, inverse = self._group(sessions, by, periods)
+        group_count = len(groups)
+        counts = np.bincount(inverse, minlength=group_count)
+        durations = np.bincount(
+            inverse, weights=sessions["duration_seconds"], minlength=group_count
+        )
+        water = np.bincount(
+            inverse, weights=sessions["total_water_used"], minlength=group_count
+        )
+        flows = sessions["average_flow_rate"]
+        flow_sums = np.bincount(inverse, weights=flows, minlength=group_count)
+        flow_percentiles = self._group_percentiles(inverse, flows, counts, percentiles)
+
+        # One bincount over (group, bin) pairs gives every zone's histogram
+        bins = np.searchsorted(FLOW_RATE_BINS_GPM, flows, side="right")
+        bin_count = len(FLOW_RATE_BINS_GPM) + 1
+        histograms = np.bincount(
+            inverse * bin_count + bins, minlength=group_count * bin_count
+        ).reshape(group_count, bin_count)
+        labels = [f"<{edge:g}" for edge in FLOW_RATE_BINS_GPM]
+        labels.append(f">={FLOW_RATE_BINS_GPM[-1]:g}")
+
+        for index, key in enumerate(groups):
+            results[group_periods[index]].append(
+                {
+                    **key,
+                    "session_count": int(counts[index]),
+                    "total_duration_seconds": int(durations[index]),
+                    "total_water_used": float(water[index]),
+                    "avg_flow_rate": float(flow_sums[index] / counts[index]),
+                    "avg_duration_seconds": float(durations[index] / counts[index]),
+                    "flow_rate_percentiles": {
+                        f"p{p:g}": float(flow_percentiles[index, column])
+                        for column, p in enumerate(percentiles)
+                    },
+                    "flow_rate_histogram": dict(
+                        zip(labels, histograms[index].tolist())
+                    ),
+                }
+            )
+        return results
+
+    def daily_usage(self, start: datetime, end: datetime) -> Dict[str, Any]:
+        """Distribution of whole-house daily usage from the daily rollup.
+
+        Returns:
+            Dict with days, total_gallons, mean_gallons, p50_gallons,
+            p95_gallons, max_gallons and max_day (None without data)
+        """
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            cursor.execute(
+                """
+                SELECT day_start, total_gallons FROM water_usage_daily
+                WHERE day_start >= ? AND day_start < ?
+                ORDER BY day_start
+            """,
+                (to_epoch(start), to_epoch(end)),
+            )
+            rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2)
+
+        if not len(rows):
+            return {
+                "days": 0,
+                "total_gallons": 0.0,
+                "mean_gallons": 0.0,
+                "p50_gallons": 0.0,
+                "p95_gallons": 0.0,
+                "max_gallons": 0.0,
+                "max_day": None,
+            }
+
+        days, gallons = rows[:, 0], rows[:, 1]
+        p50, p95 = np.percentile(gallons, [50, 95])
+        peak = int(np.argmax(gallons))
+        return {
+            "days": len(gallons),
+            "total_gallons": float(gallons.sum()),
+            "mean_gallons": float(gallons.mean()),
+            "p50_gallons": float(p50),
+            "p95_gallons": float(p95),
+            "max_gallons": float(gallons[peak]),
+            "max_day": from_epoch(int(days[peak])).date().isoformat(),
+        }
+
+    def _load_archived_sessions(self, start: int, end: int) -> np.ndarray:
+        """Archived sessions starting in [start, end) epoch seconds."""
+        if self.archive is not None:
+            archive_end = min(end, self.db.get_archive_cutoff())
+            if start < archive_end:
+                table = self.archive.scan(
+                    "zone_sessions", start, archive_end, list(SESSION_DTYPE.names)
+                )
+                return sessions_from_arrow(table)
+        return np.empty(0, dtype=SESSION_DTYPE)
+
+    def _group(
+        self, sessions: np.ndarray, by: Tuple[str, ...], periods: np.ndarray
+    ) -> Tuple[List[int], List[Dict[str, Any]], np.ndarray]:
+        """Group sessions by period and key columns.
+
+        Returns:
+            Each group's period, group keys ordered by period, zone number
+            then name, and each session's group index
+        """
+        # Factorize each key column, then combine codes into one integer key
+        combined = periods.astype(np.int64)
+        for column in by:
+            codes = self._factorize(sessions[column])
+            combined = combined * (codes.max() + 1) + codes
+        _, first, inverse = np.unique(combined, return_index=True, return_inverse=True)
+
+        # Order groups like the SQL reports: lowest zone number, then name
+        group_count = len(first)
+        min_numbers = np.full(group_count, np.iinfo(np.int64).max)
+        np.minimum.at(min_numbers, inverse, sessions["zone_number"])
+        names = sessions["zone_name"][first]
+        group_periods = periods[first].tolist()
+        order = sorted(
+            range(group_count),
+            key=lambda g: (group_periods[g], min_numbers[g], names[g]),
+        )
+
+        remap = np.empty(group_count, dtype=np.int64)
+        remap[order] = np.arange(group_count)
+        groups = [{column: sessions[column][first[g]] for column in by} for g in order]
+        for group in groups:
+            if "zone_number" in group:
+                group["zone_number"] = int(group["zone_number"])
+        return (
+            [group_periods[g] for g in order],
+            groups,
+            remap[inverse.ravel()],
+        )
+
+    def _factorize(self, values: np.ndarray) -> np.ndarray:
+        """Dense integer codes for a column's distinct values."""
+        if values.dtype != object:
+            return np.unique(values, return_inverse=True)[1].ravel()
+
+        # Sorting Python strings is slow; hashing them is linear
+        lookup: Dict[Any, int] = {}
+        return np.fromiter(
+            (lookup.setdefault(value, len(lookup)) for value in values),
+            dtype=np.int64,
+            count=len(values),
+        )
+
+    def _group_percentiles(
+        self,
+        inverse: np.ndarray,
+        values: np.ndarray,
+        counts: np.ndarray,
+        percentiles: Sequence[float],
+    ) -> np.ndarray:
+        """Linearly interpolated percentiles of values within every group.
+
+        Values are sorted by (group, value) once; each group's percentile
+        positions are then offsets into that sorted array.
+
+        Returns:
+            Array of shape (groups, len(percentiles))
+        """
+        sorted_values = values[np.lexsort((values, inverse))]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        ranks = np.outer(counts - 1, np.asarray(percentiles, dtype=np.float64) / 100)
+        positions = offsets[:, None] + ranks
+        lower = np.floor(positions).astype(np.int64)
+        upper = np.ceil(positions).astype(np.int64)
+        fraction = positions - lower
+        return (
+            sorted_values[lower]
+            + (sorted_values[upper] - sorted_values[lower]) * fraction
+        )
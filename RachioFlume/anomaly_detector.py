@@ -0,0 +1,343 @@
+"""Streaming detection of leaks and broken heads from minute readings."""
+
+import json
+import math
+import sqlite3
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from data_storage import WaterTrackingDB, from_epoch, to_epoch
+from logger import get_logger
+from models import FlowAlert
+
+# A zone running over [start, end): zone_number, zone_name, start, end
+Run = Tuple[int, str, int, int]
+
+
+class FlowStats:
+    """Exponentially weighted mean and variance of a flow rate.
+
+    Keeps three numbers however many minutes it has seen.
+    """
+
+    def __init__(
+        self, alpha: float, count: int = 0, mean: float = 0.0, var: float = 0.0
+    ):
+        """Initialize the statistics.
+
+        Args:
+            alpha: Weight of each new observation
+            count: Observations seen so far
+            mean: Current weighted mean
+            var: Current weighted variance
+        """
+        self.alpha = alpha
+        self.count = count
+        self.mean = mean
+        self.var = var
+
+    @property
+    def std(self) -> float:
+        """Weighted standard deviation."""
+        return math.sqrt(self.var)
+
+    def update(self, value: float) -> None:
+        """Fold one observation into the mean and variance."""
+        self.count += 1
+        if self.count == 1:
+            self.mean, self.var = value, 0.0
+            return
+        diff = value - self.mean
+        increment = self.alpha * diff
+        self.mean += increment
+        self.var = (1 - self.alpha) * (self.var + diff * increment)
+
+    def to_state(self) -> List[float]:
+        """Serializable [count, mean, var]."""
+        return [self.count, self.mean, self.var]
+
+    @classmethod
+    def from_state(cls, alpha: float, state: Optional[List[float]]) -> "FlowStats":
+        """Restore statistics saved with to_state()."""
+        if not state:
+            return cls(alpha)
+        count, mean, var = state
+        return cls(alpha, int(count), mean, var)
+
+
+class AnomalyDetector:
+    """Flag leaks and broken heads as minute readings arrive.
+
+    Each run walks the minutes ingested since the last one, with the zones
+    running in them taken from zone sessions and from start events still
+    waiting for their end event. Minutes with no zone running feed a
+    household flow statistic, and minutes with one zone running the whole
+    minute feed that zone's statistic (after subtracting the household
+    mean). A leak is flow with no zone running that never stops for
+    LEAK_MINUTES, or that stays far above the household mean for
+    BURST_MINUTES. A broken head is a zone flowing far above its own mean
+    for BROKEN_HEAD_MINUTES. Each anomalous run raises one alert.
+
+    Statistics and any run in progress are kept in metadata, so alerts
+    confirmed by the newest readings fire in the cycle that ingested them.
+    """
+
+    HOUSEHOLD_ALPHA = 0.01
+    ZONE_ALPHA = 0.05
+
+    # Minutes of a zone running alone before its statistics are trusted
+    WARMUP_MINUTES = 30
+
+    # Flow is anomalous this many standard deviations above the mean, and
+    # for zones at least this fraction above it
+    Z_SCORE = 4.0
+    MIN_EXCESS_RATIO = 0.25
+
+    LEAK_MIN_GPM = 0.05
+    LEAK_MINUTES = 60
+    BURST_MINUTES = 15
+    BROKEN_HEAD_MINUTES = 3
+
+    # Start events without an end are treated as running for at most this
+    OPEN_SESSION_LIMIT = timedelta(hours=4)
+
+    # History walked by the first run, to learn the statistics
+    FIRST_RUN_HISTORY = timedelta(days=30)
+
+    def __init__(self, db: WaterTrackingDB):
+        """Initialize the detector.
+
+        Args:
+            db: Database holding readings, events and zone sessions
+        """
+        self.db = db
+        self.logger = get_logger(__name__)
+
+    def process(self) -> List[FlowAlert]:
+        """Check the minutes ingested since the last run.
+
+        Minutes after the Rachio collection watermark wait for the next
+        run, so a zone whose start event has not been collected yet does not
+        look like a leak.
+
+        Returns:
+            Alerts raised, also saved to flow_alerts
+        """
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+
+            value = self.db.get_metadata(self.db.ANOMALY_STATE)
+            state: Dict[str, Any] = json.loads(value) if value else {}
+
+            cursor.execute(
+                """
+                SELECT MIN(timestamp), MAX(timestamp) FROM water_readings
+                WHERE bucket = 'MIN'
+            """
+            )
+            first_minute, last_minute = cursor.fetchone()
+            if last_minute is None:
+                return []
+
+            end = last_minute + 60
+            rachio_watermark = self.db.get_collection_watermark("rachio")
+            if rachio_watermark is not None:
+                end = min(end, to_epoch(rachio_watermark))
+            start = state.get(
+                "checkpoint",
+                max(
+                    first_minute,
+                    end - int(self.FIRST_RUN_HISTORY.total_seconds()),
+                    self.db.get_raw_retention_cutoff(),
+                ),
+            )
+            if start >= end:
+                return []
+
+            alerts = self._walk(cursor, state, start, end)
+
+            state["checkpoint"] = end
+            if alerts:
+                self.db.save_flow_alerts(alerts)
+            self.db.set_metadata(self.db.ANOMALY_STATE, json.dumps(state))
+
+        for alert in alerts:
+            self.logger.warning(alert.message)
+        return alerts
+
+    def _zone_runs(self, cursor: sqlite3.Cursor, start: int, end: int) -> List[Run]:
+        """Zones running at some point in [start, end), by start time."""
+        open_limit = int(self.OPEN_SESSION_LIMIT.total_seconds())
+        cursor.execute(
+            """
+            SELECT zone_number, zone_name, start_time, end_time
+            FROM zone_sessions
+            WHERE end_time IS NOT NULL AND start_time < ? AND end_time > ?
+        """,
+            (end, start),
+        )
+        runs: List[Run] = cursor.fetchall()
+
+        # Starts whose end event has not arrived yet
+        cursor.execute(
+            """
+            SELECT s.zone_number, s.zone_name, s.event_date, s.event_date + ?
+            FROM watering_events s
+            WHERE s.event_type = 'ZONE_STARTED'
+            AND s.event_date >= ? AND s.event_date < ?
+            AND NOT EXISTS (
+                SELECT 1 FROM watering_events e
+                WHERE e.zone_number = s.zone_number
+                AND e.event_type IN ('ZONE_COMPLETED', 'ZONE_STOPPED')
+                AND e.event_date > s.event_date
+            )
+        """,
+            (open_limit, start - open_limit, end),
+        )
+        runs.extend(cursor.fetchall())
+        runs.sort(key=lambda run: run[2])
+        return runs
+
+    def _walk(
+        self, cursor: sqlite3.Cursor, state: Dict[str, Any], start: int, end: int
+    ) -> List[FlowAlert]:
+        """Update the statistics with every minute in [start, end) in order."""
+        household = FlowStats.from_state(self.HOUSEHOLD_ALPHA, state.get("household"))
+        zones = {
+            zone: FlowStats.from_state(self.ZONE_ALPHA, stats)
+            for zone, stats in state.get("zones", {}).items()
+        }
+        # Idle flow run in progress and per-zone excess runs in progress
+        leak: Dict[str, Any] = state.get("leak") or {}
+        excess: Dict[str, Dict[str, Any]] = state.get("excess", {})
+
+        runs = self._zone_runs(cursor, start, end)
+        cursor.execute(
+            """
+            SELECT timestamp, SUM(value) FROM water_readings
+            WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp < ?
+            GROUP BY timestamp
+            ORDER BY timestamp
+        """,
+            (start, end),
+        )
+
+        alerts: List[FlowAlert] = []
+        active: List[Run] = []
+        next_run = 0
+        for minute, gallons in cursor:
+            minute_end = minute + 60
+            while next_run < len(runs) and runs[next_run][2] < minute_end:
+                active.append(runs[next_run])
+                next_run += 1
+            active = [run for run in active if run[3] > minute]
+
+            if active:
+                # Flow during irrigation says nothing about leaks
+                leak = {}
+                if len(active) == 1 and (
+                    active[0][2] <= minute and active[0][3] >= minute_end
+                ):
+                    alert = self._check_zone(
+                        active[0], minute, gallons - household.mean, zones, excess
+                    )
+                    if alert is not None:
+                        alerts.append(alert)
+                continue
+
+            alert = self._check_idle(minute, gallons, household, leak)
+            if alert is not None:
+                alerts.append(alert)
+            if gallons < self.LEAK_MIN_GPM:
+                leak = {}
+
+        state["household"] = household.to_state()
+        state["zones"] = {zone: stats.to_state() for zone, stats in zones.items()}
+        state["leak"] = leak
+        state["excess"] = excess
+        return alerts
+
+    def _check_idle(
+        self,
+        minute: int,
+        gpm: float,
+        household: FlowStats,
+        leak: Dict[str, Any],
+    ) -> Optional[FlowAlert]:
+        """Track flow with no zone running; alert once per continuous run."""
+        threshold = household.mean + self.Z_SCORE * household.std
+        high = household.count >= self.WARMUP_MINUTES and gpm > threshold
+        if not high:
+            household.update(gpm)
+        if gpm < self.LEAK_MIN_GPM:
+            return None
+
+        leak.setdefault("start", minute)
+        leak["minutes"] = leak.get("minutes", 0) + 1
+        leak["gallons"] = leak.get("gallons", 0.0) + gpm
+        leak["high_minutes"] = leak.get("high_minutes", 0) + 1 if high else 0
+        if leak.get("alerted") or (
+            leak["minutes"] < self.LEAK_MINUTES
+            and leak["high_minutes"] < self.BURST_MINUTES
+        ):
+            return None
+
+        leak["alerted"] = True
+        rate = leak["gallons"] / leak["minutes"]
+        started = from_epoch(leak["start"])
+        return FlowAlert(
+            alert_type="leak",
+            start_time=started,
+            detected_at=from_epoch(minute),
+            flow_rate_gpm=rate,
+            expected_gpm=household.mean,
+            message=(
+                f"Possible leak: {rate:.2f} GPM with no zone running "
+                f"since {started}"
+            ),
+        )
+
+    def _check_zone(
+        self,
+        run: Run,
+        minute: int,
+        gpm: float,
+        zones: Dict[str, FlowStats],
+        excess: Dict[str, Dict[str, Any]],
+    ) -> Optional[FlowAlert]:
+        """Compare a zone's flow with its own statistics; alert once per run."""
+        zone_number, zone_name, run_start, _ = run
+        key = str(zone_number)
+        stats = zones.setdefault(key, FlowStats(self.ZONE_ALPHA))
+        tracked = excess.get(key)
+        if tracked is None or tracked["run_start"] != run_start:
+            tracked = excess[key] = {"run_start": run_start, "minutes": 0}
+
+        threshold = stats.mean + max(
+            self.Z_SCORE * stats.std, self.MIN_EXCESS_RATIO * stats.mean
+        )
+        if stats.count < self.WARMUP_MINUTES or gpm <= threshold:
+            # Anomalous minutes stay out, so a broken head keeps standing out
+            stats.update(gpm)
+            tracked["minutes"] = 0
+            return None
+
+        tracked["minutes"] += 1
+        if tracked.get("alerted") or tracked["minutes"] < self.BROKEN_HEAD_MINUTES:
+            return None
+
+        tracked["alerted"] = True
+        return FlowAlert(
+            alert_type="broken_head",
+            start_time=from_epoch(run_start),
+            detected_at=from_epoch(minute),
+            zone_number=zone_number,
+            zone_name=zone_name,
+            flow_rate_gpm=gpm,
+            expected_gpm=stats.mean,
+            message=(
+                f"Zone {zone_number} ({zone_name}) flowing {gpm:.2f} GPM, "
+                f"expected {stats.mean:.2f} GPM; possible broken head"
+            ),
+        )
@@ -0,0 +1,239 @@
+"""Parquet archive tier for historical water tracking data."""
+
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from data_storage import (
+    ARCHIVE_TIME_COLUMNS,
+    MAX_EPOCH,
+    MIN_EPOCH,
+    WaterTrackingDB,
+    from_epoch,
+    to_epoch,
+)
+from logger import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional dependency: pip install 'homely-vibes[archive]'
+    pa = None
+
+
+# Archived columns per table as (name, Arrow type alias)
+ARCHIVE_COLUMNS: Dict[str, List[Tuple[str, str]]] = {
+    "water_readings": [
+        ("timestamp", "int64"),
+        ("value", "float64"),
+        ("unit", "string"),
+        ("device_id", "string"),
+        ("bucket", "string"),
+    ],
+    "watering_events": [
+        ("event_date", "int64"),
+        ("zone_name", "string"),
+        ("zone_number", "int64"),
+        ("event_type", "string"),
+        ("duration_seconds", "int64"),
+    ],
+    "zone_sessions": [
+        ("zone_name", "string"),
+        ("zone_number", "int64"),
+        ("start_time", "int64"),
+        ("end_time", "int64"),
+        ("duration_seconds", "int64"),
+        ("total_water_used", "float64"),
+        ("average_flow_rate", "float64"),
+    ],
+}
+
+# Natural key per table, used to merge re-archived months
+ARCHIVE_KEYS: Dict[str, List[str]] = {
+    "water_readings": ["device_id", "timestamp", "bucket"],
+    "watering_events": ["event_date", "zone_number", "event_type"],
+    "zone_sessions": ["zone_number", "start_time"],
+}
+
+
+def month_start(value: datetime, months_offset: int = 0) -> datetime:
+    """Local midnight on the first of value's month, shifted by whole months."""
+    month_index = value.year * 12 + value.month - 1 + months_offset
+    return datetime(month_index // 12, month_index % 12 + 1, 1)
+
+
+class ParquetArchive:
+    """Month-partitioned Parquet files holding rows moved out of SQLite.
+
+    Each table is stored as <root>/<table>/month=YYYY-MM/part-0.parquet, with
+    months in local time. Reads prune partitions by month and only decode the
+    requested columns, so scans over years stay small in memory.
+    """
+
+    def __init__(self, root: str = "archive"):
+        """Initialize the archive.
+
+        Args:
+            root: Directory holding the Parquet partitions
+        """
+        if pa is None:
+            raise ImportError(
+                "Parquet archiving requires pyarrow: "
+                "pip install 'homely-vibes[archive]'"
+            )
+
+        self.root = Path(root)
+        self.logger = get_logger(__name__)
+
+    def archive_before(self, db: WaterTrackingDB, before: datetime) -> Dict[str, int]:
+        """Move every whole month before `before` from SQLite to Parquet.
+
+        Months are written one at a time and merged with any existing file for
+        that month. The rows are deleted from SQLite only after all files are
+        written; an interrupted run just repeats the merge next time.
+
+        Args:
+            db: Database holding the hot tier
+            before: Archive months ending on or before this month's start
+
+        Returns:
+            Number of rows archived per table
+        """
+        cutoff = month_start(before)
+        archived = {}
+
+        # Hold the connection throughout so no writes land between the copy
+        # and the delete
+        with db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+
+            for table, time_column in ARCHIVE_TIME_COLUMNS.items():
+                archived[table] = 0
+                cursor.execute(
+                    f"SELECT MIN({time_column}) FROM {table} WHERE {time_column} < ?",
+                    (to_epoch(cutoff),),
+                )
+                first = cursor.fetchone()[0]
+                if first is None:
+                    continue
+
+                column_list = ", ".join(name for name, _ in ARCHIVE_COLUMNS[table])
+                month = month_start(from_epoch(first))
+                while month < cutoff:
+                    following = month_start(month, 1)
+                    cursor.execute(
+                        f"""
+                        SELECT {column_list} FROM {table}
+                        WHERE {time_column} >= ? AND {time_column} < ?
+                        ORDER BY {time_column}
+                    """,
+                        (to_epoch(month), to_epoch(following)),
+                    )
+                    rows = cursor.fetchall()
+                    if rows:
+                        self._write_month(table, month, rows)
+                        archived[table] += len(rows)
+                    month = following
+
+            db.drop_archived_rows(to_epoch(cutoff))
+
+        self.logger.info(f"Archived rows before {cutoff.date()}: {archived}")
+        return archived
+
+    def scan(
+        self,
+        table: str,
+        start: int,
+        end: int,
+        columns: Optional[List[str]] = None,
+    ) -> "pa.Table":
+        """Read archived rows dated in [start, end) epoch seconds.
+
+        Args:
+            table: Archived table name
+            start: Inclusive start, epoch seconds
+            end: Exclusive end, epoch seconds
+            columns: Columns to read (defaults to all)
+
+        Returns:
+            Matching rows as an Arrow table
+        """
+        dataset = self._dataset(table)
+        columns = columns or [name for name, _ in ARCHIVE_COLUMNS[table]]
+        if dataset is None:
+            return self._schema(table).empty_table().select(columns)
+
+        return dataset.to_table(
+            columns=columns, filter=self._range_filter(table, start, end)
+        )
+
+    def _write_month(self, table: str, month: datetime, rows: List[Tuple]) -> None:
+        """Write (or merge into) one month's Parquet file atomically."""
+        path = self.root / table / f"month={month:%Y-%m}" / "part-0.parquet"
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        schema = self._schema(table)
+        data = pa.Table.from_arrays(
+            [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema,
+        )
+        if path.exists():
+            data = self._merge(table, pq.read_table(path, schema=schema), data)
+
+        temp_path = path.with_suffix(".tmp")
+        pq.write_table(data, temp_path, compression="zstd")
+        os.replace(temp_path, path)
+        self.logger.debug(f"Wrote {data.num_rows} {table} rows to {path}")
+
+    def _merge(self, table: str, existing: "pa.Table", new: "pa.Table") -> "pa.Table":
+        """Combine two batches of rows, keeping the newest row per natural key."""
+        combined = pa.concat_tables([existing, new])
+        combined = combined.append_column(
+            "_row", pa.array(range(combined.num_rows), type=pa.int64())
+        )
+        latest = combined.group_by(ARCHIVE_KEYS[table]).aggregate([("_row", "max")])
+        return (
+            combined.take(latest["_row_max"])
+            .sort_by(ARCHIVE_TIME_COLUMNS[table])
+            .drop_columns(["_row"])
+        )
+
+    def _dataset(self, table: str) -> Optional["ds.Dataset"]:
+        """Open a table's partitions, or None if nothing is archived yet."""
+        table_dir = self.root / table
+        if not table_dir.exists():
+            return None
+
+        month = pa.schema([("month", pa.string())])
+        return ds.dataset(
+            table_dir,
+            schema=pa.unify_schemas([self._schema(table), month]),
+            format="parquet",
+            partitioning=ds.partitioning(month, flavor="hive"),
+        )
+
+    def _range_filter(self, table: str, start: int, end: int) -> "ds.Expression":
+        """Row filter for [start, end), with month bounds for partition pruning."""
+        time_field = ds.field(ARCHIVE_TIME_COLUMNS[table])
+        expression = (time_field >= start) & (time_field < end)
+
+        if start > MIN_EPOCH:
+            expression &= ds.field("month") >= f"{from_epoch(start):%Y-%m}"
+        if end < MAX_EPOCH:
+            expression &= ds.field("month") <= f"{from_epoch(end - 1):%Y-%m}"
+        return expression
+
+    def _schema(self, table: str) -> "pa.Schema":
+        """Arrow schema of an archived table."""
+        return pa.schema(
+            [
+                (name, pa.type_for_alias(type_name))
+                for name, type_name in ARCHIVE_COLUMNS[table]
+            ]
+        )
@@ -0,0 +1,339 @@
+"""Minute-resolution attribution of metered water to irrigation zones."""
+
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from data_storage import WaterTrackingDB, from_epoch, to_epoch
+from logger import get_logger
+
+# Zone session columns the attribution pass walks, in query order
+Session = Tuple[int, str, int, int, int]  # id, zone_name, zone_number, start, end
+
+
+class AttributionResult(BaseModel):
+    """Outcome of one attribution pass."""
+
+    start: datetime
+    end: datetime
+    minutes: int = 0  # reading minutes walked
+    irrigated_minutes: int = 0  # of those, minutes with a zone running
+    attributed_gallons: float = 0.0
+    household_gallons: float = 0.0  # baseline subtracted during irrigation
+    sessions_updated: int = 0
+
+
+class AttributionEngine:
+    """Split each minute's metered usage among the zones running in it.
+
+    Readings and zone sessions are walked together once in time order. In a
+    minute with no zone running, the usage updates a household baseline
+    learned per local hour of day. In a minute with zones running, that
+    baseline is subtracted first and the rest is split among the zones in
+    proportion to how much of the minute each ran times its learned flow
+    rate, so overlapping sessions no longer count the same gallons twice.
+    A zone's flow rate is learned from minutes it ran alone.
+
+    Per-minute shares are stored in zone_attribution, and the sessions in
+    the pass get their totals and average flow rates from them. The learned
+    rates and the end of the last pass are kept in metadata, so each run
+    only revisits minutes touched by rows ingested since.
+    """
+
+    # Idle minutes are plentiful, so the household baseline moves slowly
+    BASELINE_ALPHA = 0.005
+    ZONE_FLOW_ALPHA = 0.1
+
+    # Attribution rows written per executemany
+    BATCH_SIZE = 10_000
+
+    def __init__(self, db: WaterTrackingDB):
+        """Initialize the engine.
+
+        Args:
+            db: Database holding readings and zone sessions
+        """
+        self.db = db
+        self.logger = get_logger(__name__)
+
+    def run(
+        self, since: Optional[datetime] = None, until: Optional[datetime] = None
+    ) -> AttributionResult:
+        """Attribute the reading minutes in [since, until) to zones.
+
+        The range is widened to whole sessions overlapping its start, but
+        never reaches below the raw retention cutoff.
+
+        Args:
+            since: Start of the range (defaults to the earliest minute touched
+                by readings or events ingested since the last run)
+            until: End of the range (defaults to the end of the last reading)
+
+        Returns:
+            Minutes walked, gallons attributed and sessions updated
+        """
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+
+            value = self.db.get_metadata(self.db.ATTRIBUTION_STATE)
+            state: Dict[str, Any] = json.loads(value) if value else {}
+
+            # Capture the high-water marks before reading so rows that land
+            # during this run are picked up by the next one
+            cursor.execute(
+                """
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM water_readings),
+                       (SELECT COALESCE(MAX(id), 0) FROM watering_events),
+                       (SELECT MAX(timestamp) FROM water_readings
+                        WHERE bucket = 'MIN')
+            """
+            )
+            max_reading_id, max_event_id, last_minute = cursor.fetchone()
+
+            end = to_epoch(until) if until else (last_minute or 0) + 60
+            start = (
+                to_epoch(since)
+                if since
+                else self._first_changed_minute(cursor, state, end)
+            )
+            if last_minute is None or start >= end:
+                return AttributionResult(start=from_epoch(end), end=from_epoch(end))
+
+            start = self._widen_to_sessions(cursor, start)
+            result = AttributionResult(start=from_epoch(start), end=from_epoch(end))
+
+            self.logger.info(f"Attributing water from {result.start} to {result.end}")
+            sessions = self._walk(conn, state, start, end, result)
+
+            # Sessions that started before the range were only partly walked
+            updates = []
+            for (session_id, _, _, start_time, end_time), gallons in sessions.items():
+                if start_time < start:
+                    continue
+                duration = end_time - start_time
+                flow_rate = gallons / (duration / 60) if duration > 0 else 0.0
+                updates.append((gallons, flow_rate, session_id, gallons, flow_rate))
+            cursor.executemany(
+                """
+                UPDATE zone_sessions
+                SET total_water_used = ?, average_flow_rate = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = ? AND (
+                    ABS(COALESCE(total_water_used, 0.0) - ?) > 1e-9
+                    OR ABS(COALESCE(average_flow_rate, 0.0) - ?) > 1e-9
+                )
+            """,
+                updates,
+            )
+            result.sessions_updated = max(cursor.rowcount, 0)
+            conn.commit()
+
+            # Totals rewritten in place add no rows for the cache to notice
+            if result.sessions_updated:
+                self.db.invalidate_report_cache(start, end)
+
+            state["checkpoint"] = max(state.get("checkpoint", end), end)
+            if since is None and until is None:
+                state["reading_id"] = max_reading_id
+                state["event_id"] = max_event_id
+            self.db.set_metadata(self.db.ATTRIBUTION_STATE, json.dumps(state))
+
+        self.logger.info(
+            f"Attributed {result.attributed_gallons:.1f} gallons over "
+            f"{result.irrigated_minutes} irrigated minutes "
+            f"({result.household_gallons:.1f} gallons household), "
+            f"updated {result.sessions_updated} sessions"
+        )
+        return result
+
+    def _first_changed_minute(
+        self, cursor: sqlite3.Cursor, state: Dict[str, Any], end: int
+    ) -> int:
+        """Earliest minute that rows ingested since the last run can change."""
+        if "checkpoint" not in state:
+            cursor.execute(
+                "SELECT MIN(timestamp) FROM water_readings WHERE bucket = 'MIN'"
+            )
+            first = cursor.fetchone()[0]
+            return first if first is not None else end
+
+        cursor.execute(
+            """
+            SELECT (SELECT MIN(timestamp) FROM water_readings
+                    WHERE bucket = 'MIN' AND id > ?),
+                   (SELECT MIN(event_date) FROM watering_events WHERE id > ?)
+        """,
+            (state.get("reading_id", 0), state.get("event_id", 0)),
+        )
+        changed = [value for value in cursor.fetchone() if value is not None]
+        return min([state["checkpoint"], *changed])
+
+    def _widen_to_sessions(self, cursor: sqlite3.Cursor, start: int) -> int:
+        """Move start back to the first session running at it.
+
+        The result is floored to the minute and clamped to the raw retention
+        cutoff, below which there are no readings to attribute.
+        """
+        cursor.execute(
+            """
+            SELECT MIN(start_time) FROM zone_sessions
+            WHERE end_time IS NOT NULL AND start_time < ? AND end_time >= ?
+        """,
+            (start, start),
+        )
+        first = cursor.fetchone()[0]
+        if first is not None:
+            start = min(start, first)
+        start -= start % 60
+        return max(start, self.db.get_raw_retention_cutoff())
+
+    def _walk(
+        self,
+        conn: sqlite3.Connection,
+        state: Dict[str, Any],
+        start: int,
+        end: int,
+        result: AttributionResult,
+    ) -> Dict[Session, float]:
+        """Attribute every reading minute in [start, end) in one pass.
+
+        Replaces the range's attribution rows and updates the learned rates
+        in state from minutes not seen by an earlier pass.
+
+        Returns:
+            Gallons attributed to each session overlapping the range
+        """
+        baseline: List[Optional[float]] = state.get("baseline", [None] * 24)
+        zone_flows: Dict[str, float] = state.get("zone_flows", {})
+        learned_until = state.get("learned_until", start)
+
+        readings = conn.cursor()
+        readings.row_factory = None
+        readings.execute(
+            """
+            SELECT timestamp, SUM(value) FROM water_readings
+            WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp < ?
+            GROUP BY timestamp
+            ORDER BY timestamp
+        """,
+            (start, end),
+        )
+        upcoming = conn.cursor()
+        upcoming.row_factory = None
+        upcoming.execute(
+            """
+            SELECT id, zone_name, zone_number, start_time, end_time
+            FROM zone_sessions
+            WHERE end_time IS NOT NULL AND start_time < ? AND end_time > ?
+            ORDER BY start_time
+        """,
+            (end, start),
+        )
+
+        writer = conn.cursor()
+        writer.execute(
+            "DELETE FROM zone_attribution WHERE minute >= ? AND minute < ?",
+            (start, end),
+        )
+
+        totals: Dict[Session, float] = {}
+        active: List[Session] = []
+        next_session = upcoming.fetchone()
+        rows: List[Tuple[int, int, str, float]] = []
+
+        for minute, gallons in readings:
+            minute_end = minute + 60
+            while next_session is not None and next_session[3] < minute_end:
+                totals[next_session] = 0.0
+                active.append(next_session)
+                next_session = upcoming.fetchone()
+            if active:
+                active = [session for session in active if session[4] > minute]
+
+            result.minutes += 1
+            hour = from_epoch(minute).hour
+            learn = minute >= learned_until
+            household = baseline[hour]
+
+            if not active:
+                if learn:
+                    baseline[hour] = (
+                        gallons
+                        if household is None
+                        else household + self.BASELINE_ALPHA * (gallons - household)
+                    )
+                continue
+
+            household = min(gallons, household or 0.0)
+            irrigation = gallons - household
+            result.irrigated_minutes += 1
+            result.household_gallons += household
+            result.attributed_gallons += irrigation
+
+            overlaps = [
+                (min(session[4], minute_end) - max(session[3], minute)) / 60
+                for session in active
+            ]
+            if learn and len(active) == 1 and overlaps[0] >= 1:
+                zone = str(active[0][2])
+                flow = zone_flows.get(zone)
+                zone_flows[zone] = (
+                    irrigation
+                    if flow is None
+                    else flow + self.ZONE_FLOW_ALPHA * (irrigation - flow)
+                )
+
+            # Zones not seen alone yet weigh in at the average learned rate
+            default_flow = (
+                sum(zone_flows.values()) / len(zone_flows) if zone_flows else 1.0
+            )
+            weights = [
+                overlap * zone_flows.get(str(session[2]), default_flow)
+                for session, overlap in zip(active, overlaps)
+            ]
+            total_weight = sum(weights)
+            if total_weight <= 0:
+                weights, total_weight = overlaps, sum(overlaps)
+
+            by_zone: Dict[int, Tuple[str, float]] = {}
+            for session, weight in zip(active, weights):
+                share = irrigation * weight / total_weight
+                totals[session] += share
+                zone_name, zone_gallons = by_zone.get(session[2], (session[1], 0.0))
+                by_zone[session[2]] = (zone_name, zone_gallons + share)
+            rows.extend(
+                (minute, zone_number, zone_name, zone_gallons)
+                for zone_number, (zone_name, zone_gallons) in by_zone.items()
+            )
+
+            if len(rows) >= self.BATCH_SIZE:
+                self._write_rows(writer, rows)
+                rows = []
+
+        self._write_rows(writer, rows)
+
+        # Sessions in the range without readings used no metered water
+        while next_session is not None:
+            totals[next_session] = 0.0
+            next_session = upcoming.fetchone()
+
+        state["baseline"] = baseline
+        state["zone_flows"] = zone_flows
+        state["learned_until"] = max(learned_until, end)
+        return totals
+
+    def _write_rows(
+        self, cursor: sqlite3.Cursor, rows: List[Tuple[int, int, str, float]]
+    ) -> None:
+        """Insert a batch of (minute, zone_number, zone_name, gallons) rows."""
+        cursor.executemany(
+            """
+            INSERT INTO zone_attribution (minute, zone_number, zone_name, gallons)
+            VALUES (?, ?, ?, ?)
+        """,
+            rows,
+        )
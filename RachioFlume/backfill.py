@@ -0,0 +1,263 @@
+"""Chunked, resumable historical backfill from the Rachio and Flume APIs."""
+
+import json
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from attribution import AttributionEngine
+from data_storage import MIN_EPOCH, WaterTrackingDB, from_epoch
+from flume_client import FlumeClient
+from logger import get_logger
+from models import WaterReading
+from rachio_client import RachioClient
+
+Window = Tuple[datetime, datetime]
+
+
+class BackfillResult(BaseModel):
+    """Outcome of backfilling one source."""
+
+    source: str
+    start: datetime
+    end: datetime
+    resumed_from: Optional[datetime] = None
+    requests: int = 0
+    inserted: int = 0
+    skipped: int = 0
+
+
+class BackfillEngine:
+    """Pull history in API-sized windows, concurrently and resumably.
+
+    Each source's range is split into windows; a bounded number of requests
+    run at once, each counted against its client's rate limiter and daily
+    budget, and every finished request is
+    written straight to the database. Progress is checkpointed in metadata as
+    the end of the contiguous run of finished windows, so after a crash the
+    next run with the same start resumes from there. Re-fetched windows are
+    harmless because inserts ignore duplicate natural keys.
+    """
+
+    # Minute readings per Flume query stay under the API's per-query row cap
+    FLUME_WINDOW = timedelta(hours=12)
+    RACHIO_WINDOW = timedelta(days=7)
+    CHECKPOINT_KEY = "backfill.{source}.checkpoint"
+
+    def __init__(
+        self,
+        db: WaterTrackingDB,
+        rachio_client: Optional[RachioClient] = None,
+        flume_client: Optional[FlumeClient] = None,
+        max_concurrency: int = 4,
+    ):
+        """Initialize the engine.
+
+        Args:
+            db: Database to fill
+            rachio_client: Source of watering events (skipped if None)
+            flume_client: Source of water readings (skipped if None)
+            max_concurrency: Requests in flight per source
+        """
+        self.db = db
+        self.rachio_client = rachio_client
+        self.flume_client = flume_client
+        self.max_concurrency = max(1, max_concurrency)
+        self.logger = get_logger(__name__)
+
+    def run(
+        self, since: datetime, until: Optional[datetime] = None
+    ) -> List[BackfillResult]:
+        """Backfill every configured source over [since, until).
+
+        Afterwards sessions are recomputed and the new minutes attributed to
+        zones.
+
+        Args:
+            since: Start of the history to fetch
+            until: End of the history (defaults to now)
+
+        Returns:
+            One result per source, Flume first
+        """
+        until = until or datetime.now()
+        results = []
+
+        if self.flume_client is not None:
+            results.append(self.backfill_flume(since, until))
+        if self.rachio_client is not None:
+            results.append(self.backfill_rachio(since, until))
+            self.db.compute_zone_sessions()
+        if results:
+            AttributionEngine(self.db).run()
+
+        return results
+
+    def backfill_flume(self, since: datetime, until: datetime) -> BackfillResult:
+        """Fetch minute readings, packing windows into batched Flume requests."""
+        flume = self.flume_client
+        if flume is None:
+            raise ValueError("Flume backfill needs a Flume client")
+
+        # Readings older than the retention cutoff would be refused on insert
+        cutoff_epoch = self.db.get_raw_retention_cutoff()
+        cutoff = from_epoch(cutoff_epoch) if cutoff_epoch > MIN_EPOCH else since
+        if since < cutoff:
+            self.logger.warning(
+                f"Flume backfill starts at the retention cutoff {cutoff}, "
+                f"not {since}"
+            )
+
+        def fetch(windows: List[Window]) -> Any:
+            return flume.get_usage_windows(
+                [(start, end - timedelta(seconds=1)) for start, end in windows],
+                bucket="MIN",
+                strict=True,
+            )
+
+        def store(readings: List[WaterReading]) -> Any:
+            return self.db.save_water_readings(readings, update_usage_index=False)
+
+        # Folding older-first windows into the usage index one at a time
+        # would rewrite every later prefix sum each time; rebuild it once
+        try:
+            return self._backfill(
+                "flume",
+                since,
+                until,
+                self.FLUME_WINDOW,
+                FlumeClient.MAX_QUERIES_PER_REQUEST,
+                fetch,
+                store,
+                earliest=cutoff,
+            )
+        finally:
+            self.db.rebuild_usage_index(max(since, cutoff))
+
+    def backfill_rachio(self, since: datetime, until: datetime) -> BackfillResult:
+        """Fetch watering events, one request per window."""
+        rachio = self.rachio_client
+        if rachio is None:
+            raise ValueError("Rachio backfill needs a Rachio client")
+
+        def fetch(windows: List[Window]) -> Any:
+            start, end = windows[0]
+            return rachio.get_events(start, end)
+
+        return self._backfill(
+            "rachio",
+            since,
+            until,
+            self.RACHIO_WINDOW,
+            1,
+            fetch,
+            self.db.save_watering_events,
+        )
+
+    def _backfill(
+        self,
+        source: str,
+        since: datetime,
+        until: datetime,
+        window_size: timedelta,
+        windows_per_request: int,
+        fetch: Callable[[List[Window]], Any],
+        store: Callable[[Any], Any],
+        earliest: Optional[datetime] = None,
+    ) -> BackfillResult:
+        """Run one source's requests and checkpoint the finished prefix.
+
+        Requests complete in any order; each result is stored as it arrives,
+        and the checkpoint only advances past requests whose predecessors are
+        all stored. Windows before `earliest` are not fetched.
+        """
+        result = BackfillResult(source=source, start=since, end=until)
+        start = self._load_checkpoint(source, since)
+        if start > since:
+            result.resumed_from = start
+            self.logger.info(f"Resuming {source} backfill from {start}")
+        if earliest is not None:
+            start = max(start, earliest)
+
+        windows = []
+        while start < until:
+            end = min(start + window_size, until)
+            windows.append((start, end))
+            start = end
+        groups = [
+            windows[i : i + windows_per_request]
+            for i in range(0, len(windows), windows_per_request)
+        ]
+
+        self.logger.info(
+            f"Backfilling {source}: {len(windows)} windows in {len(groups)} requests"
+        )
+
+        finished = [False] * len(groups)
+        frontier = 0
+        next_group = 0
+        pending: Dict[Future, int] = {}
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix=f"backfill-{source}"
+        ) as executor:
+            try:
+                while next_group < len(groups) or pending:
+                    # Keep at most max_concurrency fetched batches in memory
+                    while next_group < len(groups) and len(pending) < (
+                        self.max_concurrency
+                    ):
+                        future = executor.submit(fetch, groups[next_group])
+                        pending[future] = next_group
+                        next_group += 1
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        stats = store(future.result())
+                        result.requests += 1
+                        result.inserted += stats.inserted
+                        result.skipped += stats.skipped
+                        finished[index] = True
+
+                    advanced = frontier
+                    while frontier < len(groups) and finished[frontier]:
+                        frontier += 1
+                    if frontier > advanced:
+                        self._save_checkpoint(
+                            source, since, groups[frontier - 1][-1][1]
+                        )
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+
+        self.logger.info(
+            f"Backfilled {source}: {result.inserted} rows inserted, "
+            f"{result.skipped} skipped in {result.requests} requests"
+        )
+        return result
+
+    def _load_checkpoint(self, source: str, since: datetime) -> datetime:
+        """Where a backfill from `since` should resume."""
+        value = self.db.get_metadata(self.CHECKPOINT_KEY.format(source=source))
+        if value is None:
+            return since
+
+        checkpoint = json.loads(value)
+        if datetime.fromisoformat(checkpoint["since"]) != since:
+            return since
+        return max(since, datetime.fromisoformat(checkpoint["done_until"]))
+
+    def _save_checkpoint(
+        self, source: str, since: datetime, done_until: datetime
+    ) -> None:
+        """Record that everything from `since` to `done_until` is stored."""
+        self.db.set_metadata(
+            self.CHECKPOINT_KEY.format(source=source),
+            json.dumps(
+                {"since": since.isoformat(), "done_until": done_until.isoformat()}
+            ),
+        )
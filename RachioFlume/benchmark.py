@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the water tracking storage layer."""
+
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+
+from analytics import SessionAnalytics
+from data_storage import WaterTrackingDB, from_epoch, to_epoch
+from models import WaterReading
+from reporter import WeeklyReporter
+
+
+def _timed(label: str, row_count: int, func: Callable[[], Any]) -> float:
+    """Run func once and print its throughput."""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    rate = row_count / elapsed if elapsed > 0 else float("inf")
+    print(f"  {label:<32} {elapsed:8.3f}s {rate:12,.0f} rows/sec")
+    return rate
+
+
+def _minute_rows(count: int) -> List[Tuple[Any, ...]]:
+    """Build a week-style run of minute-bucket reading tuples."""
+    start = to_epoch(datetime(2024, 6, 1))
+    return [(start + 60 * i, 0.5, "GAL", "meter-1", "MIN") for i in range(count)]
+
+
+def _row_by_row_insert(db: WaterTrackingDB, rows: List[Tuple[Any, ...]]) -> None:
+    """Previous ingest path: one execute per row in a Python loop."""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for row in rows:
+            cursor.execute(db.INSERT_WATER_READING_SQL, row)
+        conn.commit()
+
+
+def bench_ingest(row_count: int) -> None:
+    """Compare row-by-row, model-based and tuple-based reading ingest."""
+    rows = _minute_rows(row_count)
+    readings = [
+        WaterReading(
+            timestamp=from_epoch(timestamp),
+            value=value,
+            unit=unit,
+            device_id=device,
+            bucket=bucket,
+        )
+        for timestamp, value, unit, device, bucket in rows
+    ]
+
+    print(f"Ingesting {row_count:,} minute readings into a fresh database:")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        runs = [
+            ("row-by-row execute (before)", lambda db: _row_by_row_insert(db, rows)),
+            (
+                "save_water_readings (models)",
+                lambda db: db.save_water_readings(readings),
+            ),
+            (
+                "bulk_insert_water_readings",
+                lambda db: db.bulk_insert_water_readings(rows),
+            ),
+        ]
+        for index, (label, run) in enumerate(runs):
+            db = WaterTrackingDB(str(Path(tmp_dir) / f"ingest_{index}.db"))
+            _timed(label, row_count, lambda run=run, db=db: run(db))
+            db.close()
+
+
+def _range_scan_usage(db: WaterTrackingDB, periods: List[Tuple[int, int]]) -> None:
+    """Previous per-session path: one SUM range scan per period."""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        for start, end in periods:
+            cursor.execute(
+                """
+                SELECT COALESCE(SUM(value), 0) FROM water_readings
+                WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp <= ?
+            """,
+                (start, end),
+            )
+            cursor.fetchone()
+
+
+def _indexed_usage(db: WaterTrackingDB, periods: List[Tuple[int, int]]) -> None:
+    """Current batch path: prefix sums sampled at the period boundaries."""
+    with db.get_connection() as conn:
+        db._usage_for_periods(conn, periods)
+
+
+def bench_usage(days: int, sessions_per_day: int) -> None:
+    """Compare per-session range scans with cumulative index lookups."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = WaterTrackingDB(str(Path(tmp_dir) / "usage.db"))
+        db.bulk_insert_water_readings(_minute_rows(days * 24 * 60))
+        first = to_epoch(datetime(2024, 6, 1))
+        spacing = 86400 // sessions_per_day
+
+        for minutes in (30, 4 * 60, 24 * 60):
+            periods = [
+                (start, start + 60 * minutes)
+                for start in range(first, first + days * 86400, spacing)
+            ]
+            print(f"Summing {len(periods):,} sessions of {minutes} minutes:")
+            for label, run in (
+                ("SUM range scan per session", _range_scan_usage),
+                ("cumulative index batch", _indexed_usage),
+            ):
+                run(db, periods[:10])
+                _timed(
+                    label,
+                    len(periods),
+                    lambda run=run, periods=periods: run(db, periods),
+                )
+        db.close()
+
+
+def _dict_loop_statistics(
+    db: WaterTrackingDB, start: datetime, end: datetime
+) -> List[Any]:
+    """Previous analysis path: session dicts grouped in a Python loop."""
+    by_zone: dict = {}
+    for session in db.get_zone_sessions(start, end):
+        by_zone.setdefault(session["zone_name"], []).append(session)
+
+    stats = []
+    for zone_name, sessions in by_zone.items():
+        flows = sorted(session["average_flow_rate"] or 0 for session in sessions)
+        stats.append(
+            (
+                zone_name,
+                len(sessions),
+                sum(session["total_water_used"] or 0 for session in sessions),
+                flows[len(flows) // 2],
+            )
+        )
+    return stats
+
+
+def bench_analytics(years: int, zones: int, sessions_per_day: int) -> None:
+    """Compare dict-loop grouping with vectorized statistics and batch reports."""
+    days = years * 365
+    first = to_epoch(datetime(2020, 1, 1, 5))
+    spacing = 86400 // sessions_per_day
+    rows = [
+        (
+            f"Zone {index % zones + 1}",
+            index % zones + 1,
+            start,
+            start + 900,
+            900,
+            15.0 + index % 7,
+            1.0 + index % 7 / 7,
+        )
+        for index, start in enumerate(range(first, first + days * 86400, spacing))
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = str(Path(tmp_dir) / "analytics.db")
+        db = WaterTrackingDB(db_path)
+        with db.get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO zone_sessions
+                (zone_name, zone_number, start_time, end_time, duration_seconds,
+                 total_water_used, average_flow_rate)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+                rows,
+            )
+            conn.commit()
+
+        start, end = from_epoch(first), from_epoch(first + days * 86400)
+        analytics = SessionAnalytics(db)
+        print(f"Analyzing {len(rows):,} sessions over {years} years, {zones} zones:")
+        _timed(
+            "dict rows + Python grouping",
+            len(rows),
+            lambda: _dict_loop_statistics(db, start, end),
+        )
+        _timed(
+            "SessionAnalytics.zone_statistics",
+            len(rows),
+            lambda: analytics.zone_statistics(start, end),
+        )
+
+        reporter = WeeklyReporter(db_path)
+        week_count = days // 7
+        print(f"Generating {week_count:,} weekly reports:")
+        _timed(
+            "one report per week",
+            week_count,
+            lambda: [
+                reporter.generate_weekly_report(start + timedelta(weeks=week))
+                for week in range(week_count)
+            ],
+        )
+        _timed(
+            "generate_weekly_reports batch",
+            week_count,
+            lambda: reporter.generate_weekly_reports(
+                start, start + timedelta(weeks=week_count)
+            ),
+        )
+        db.close()
+
+
+def main() -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Water tracking benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Reading ingest throughput")
+    ingest_parser.add_argument(
+        "--rows",
+        type=int,
+        default=7 * 24 * 60,
+        help="Number of minute readings (default: one week)",
+    )
+
+    usage_parser = subparsers.add_parser("usage", help="Session usage lookups")
+    usage_parser.add_argument(
+        "--days",
+        type=int,
+        default=180,
+        help="Days of minute readings (default: one season)",
+    )
+    usage_parser.add_argument(
+        "--sessions-per-day",
+        type=int,
+        default=8,
+        help="Watering sessions per day (default: 8)",
+    )
+
+    analytics_parser = subparsers.add_parser(
+        "analytics", help="Per-zone session statistics"
+    )
+    analytics_parser.add_argument(
+        "--years", type=int, default=5, help="Years of sessions (default: 5)"
+    )
+    analytics_parser.add_argument(
+        "--zones", type=int, default=16, help="Irrigation zones (default: 16)"
+    )
+    analytics_parser.add_argument(
+        "--sessions-per-day",
+        type=int,
+        default=48,
+        help="Watering sessions per day (default: 48)",
+    )
+
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.command == "ingest":
+        bench_ingest(args.rows)
+    elif args.command == "usage":
+        bench_usage(args.days, args.sessions_per_day)
+    elif args.command == "analytics":
+        bench_analytics(args.years, args.zones, args.sessions_per_day)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
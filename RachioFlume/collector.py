@@ -1,64 +1,180 @@
 """Data collection service that polls Rachio and Flume APIs."""
 
 import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
 
+from anomaly_detector import AnomalyDetector
+from attribution import AttributionEngine
 from rachio_client import RachioClient
 from flume_client import FlumeClient
-from data_storage import WaterTrackingDB
+from data_storage import RetentionPolicy, WaterTrackingDB
+from http_utils import PooledSession
 from logger import get_logger
+from models import FlowAlert
+from rate_limiter import ApiRateLimiter
+
+T = TypeVar("T")
 
 
 class WaterTrackingCollector:
     """Service that collects data from Rachio and Flume APIs."""
 
+    # How often retention and compaction run between collection cycles
+    MAINTENANCE_INTERVAL = timedelta(days=1)
+
+    # Shortest wait between cycles when polling adapts to the API budgets
+    MIN_POLL_INTERVAL = 60
+
     def __init__(
-        self, db_path: str = "water_tracking.db", poll_interval_seconds: int = 300
-    ):  # 5 minutes default
+        self,
+        db_path: str = "water_tracking.db",
+        poll_interval_seconds: int = 300,  # 5 minutes default
+        retention_policy: Optional[RetentionPolicy] = None,
+        max_workers: int = 4,
+        adaptive_polling: bool = False,
+        alert_handler: Optional[Callable[[FlowAlert], None]] = None,
+    ):
         """Initialize the collector.
 
         Args:
             db_path: Path to SQLite database
             poll_interval_seconds: How often to poll APIs
+            retention_policy: Data retention applied by periodic maintenance
+            max_workers: Threads for blocking API and database calls
+            adaptive_polling: Poll as often as the daily API budgets allow
+                (down to MIN_POLL_INTERVAL) instead of every poll_interval
+            alert_handler: Called with each leak or broken head alert as
+                soon as the cycle that ingested its readings detects it
         """
         # Setup logging
         self.logger = get_logger(__name__)
 
         self.db = WaterTrackingDB(db_path)
-        self.rachio_client = RachioClient()
-        self.logger.info("Rachio client initialized")
-        self.flume_client = FlumeClient()
-        self.logger.info("Flume client initialized")
+        self.attribution = AttributionEngine(self.db)
+        self.anomaly_detector = AnomalyDetector(self.db)
+        self.alert_handler = alert_handler
+
+        # One keep-alive pool for both APIs, reused for the collector's lifetime;
+        # sized for every worker thread plus the parallel Flume device queries
+        self.http = PooledSession(pool_maxsize=max_workers + 4)
+
+        # Daily API budgets are counted in the database, so every process
+        # polling with this database shares them
+        self.rate_limiters = {
+            api: ApiRateLimiter(api, store=self.db) for api in ("rachio", "flume")
+        }
+
+        # API clients are built on first use, so the Flume sign-in only
+        # happens when a command actually talks to the APIs
+        self._rachio_client: Optional[RachioClient] = None
+        self._flume_client: Optional[FlumeClient] = None
+        self._clients_lock = threading.Lock()
+
         self.poll_interval = poll_interval_seconds
+        self.adaptive_polling = adaptive_polling
+        self.retention_policy = retention_policy or RetentionPolicy()
+
+        # Blocking HTTP and SQLite calls run here so the event loop stays free
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="collector"
+        )
+
+        # Resume from the watermarks committed with the last saved rows
+        self.last_rachio_collection: Optional[datetime] = (
+            self.db.get_collection_watermark("rachio")
+        )
+        self.last_flume_collection: Optional[datetime] = (
+            self.db.get_collection_watermark("flume")
+        )
+
+        # Wall-clock seconds per phase of the most recent collection cycle
+        self.last_cycle_timings: Dict[str, float] = {}
+
+        # API calls made by the most recent collection cycle
+        self.last_cycle_calls: Dict[str, int] = {}
 
-        # Track last collection times to avoid duplicates
-        self.last_rachio_collection: Optional[datetime] = None
-        self.last_flume_collection: Optional[datetime] = None
+    @property
+    def rachio_client(self) -> RachioClient:
+        """Rachio client, constructed on first use."""
+        with self._clients_lock:
+            if self._rachio_client is None:
+                self._rachio_client = RachioClient(
+                    session=self.http, rate_limiter=self.rate_limiters["rachio"]
+                )
+                self.logger.info("Rachio client initialized")
+            return self._rachio_client
+
+    @property
+    def flume_client(self) -> FlumeClient:
+        """Flume client, constructed (and signed in) on first use."""
+        with self._clients_lock:
+            if self._flume_client is None:
+                self._flume_client = FlumeClient(
+                    session=self.http, rate_limiter=self.rate_limiters["flume"]
+                )
+                self.logger.info("Flume client initialized")
+            return self._flume_client
+
+    async def _client(self, name: str) -> Any:
+        """Get an API client, constructing it off the event loop if needed."""
+        return await self._run_blocking(getattr, self, name)
+
+    async def _run_blocking(
+        self, func: Callable[..., T], *args: Any, **kwargs: Any
+    ) -> T:
+        """Run a blocking call on the collector's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _timed(self, phase: str, awaitable: Awaitable[T]) -> T:
+        """Await a phase of the cycle and record its wall-clock time."""
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.last_cycle_timings[phase] = time.perf_counter() - started
 
     async def collect_rachio_data(self) -> None:
         """Collect data from Rachio API."""
         try:
+            rachio_client = await self._client("rachio_client")
+
             # Collect zone information
-            zones = self.rachio_client.get_zones()
-            self.db.save_zones(zones)
+            zones = await self._run_blocking(rachio_client.get_zones)
+            await self._run_blocking(self.db.save_zones, zones)
             self.logger.info(f"Collected {len(zones)} zones from Rachio")
 
-            # Collect recent events (last 24 hours)
+            # Collect recent events; the watermark is taken before the request
+            # so events logged while it runs are picked up next cycle
+            end_time = datetime.now()
             if not self.last_rachio_collection:
                 # First run - get last 7 days of events
-                events = self.rachio_client.get_recent_events(days=7)
+                events = await self._run_blocking(
+                    rachio_client.get_recent_events, days=7
+                )
             else:
                 # Get events since last collection
-                events = self.rachio_client.get_events(
-                    self.last_rachio_collection, datetime.now()
+                events = await self._run_blocking(
+                    rachio_client.get_events,
+                    self.last_rachio_collection,
+                    end_time,
                 )
 
+            # Events and watermark commit together, so a crash re-polls the window
+            await self._run_blocking(
+                self.db.save_watering_events, events, collected_until=end_time
+            )
             if events:
-                self.db.save_watering_events(events)
                 self.logger.info(f"Collected {len(events)} watering events from Rachio")
 
-            self.last_rachio_collection = datetime.now()
+            self.last_rachio_collection = end_time
 
         except Exception as e:
             self.logger.error(f"Error collecting Rachio data: {e}")
@@ -77,10 +193,15 @@ class WaterTrackingCollector:
             end_time = datetime.now()
 
             # Collect water readings
-            readings = self.flume_client.get_usage(start_time, end_time, bucket="MIN")
+            flume_client = await self._client("flume_client")
+            readings = await self._run_blocking(
+                flume_client.get_usage, start_time, end_time, bucket="MIN"
+            )
 
+            await self._run_blocking(
+                self.db.save_water_readings, readings, collected_until=end_time
+            )
             if readings:
-                self.db.save_water_readings(readings)
                 self.logger.info(f"Collected {len(readings)} water readings from Flume")
 
             self.last_flume_collection = end_time
@@ -91,28 +212,88 @@ class WaterTrackingCollector:
     async def process_collected_data(self) -> None:
         """Process collected data to compute zone sessions and statistics."""
         try:
-            # Compute zone sessions from watering events
-            self.db.compute_zone_sessions()
-            self.logger.info("Computed zone sessions from watering events")
+            # Incrementally compute zone sessions from new events and readings
+            updated = await self._run_blocking(self.db.compute_zone_sessions)
+            self.logger.info(f"Updated {updated} zone sessions from watering events")
+
+            # Split the new minutes' usage among the zones that were running
+            await self._run_blocking(self.attribution.run)
+
+            # Check the new minutes for leaks and broken heads
+            alerts = await self._run_blocking(self.anomaly_detector.process)
+            if self.alert_handler is not None:
+                for alert in alerts:
+                    self.alert_handler(alert)
 
         except Exception as e:
             self.logger.error(f"Error processing collected data: {e}")
 
+    async def run_maintenance_if_due(self) -> None:
+        """Prune and compact the database if the last run is old enough."""
+        try:
+            if self.db.maintenance_due(self.MAINTENANCE_INTERVAL):
+                report = await self._run_blocking(
+                    self.db.run_maintenance, self.retention_policy
+                )
+                self.logger.info(
+                    f"Maintenance reclaimed {report.bytes_reclaimed} bytes"
+                )
+
+        except Exception as e:
+            self.logger.error(f"Error running database maintenance: {e}")
+
     async def collect_once(self) -> None:
         """Run one collection cycle."""
         self.logger.info("Starting data collection cycle")
+        self.last_cycle_timings = {}
+        cycle_started = time.perf_counter()
+        calls_before = {
+            api: limiter.calls_made for api, limiter in self.rate_limiters.items()
+        }
 
         # Collect from both APIs concurrently
-        await asyncio.gather(
-            self.collect_rachio_data(),
-            self.collect_flume_data(),
-            return_exceptions=True,
+        await self._timed(
+            "collect",
+            asyncio.gather(
+                self._timed("rachio", self.collect_rachio_data()),
+                self._timed("flume", self.collect_flume_data()),
+                return_exceptions=True,
+            ),
         )
 
         # Process the collected data
-        await self.process_collected_data()
+        await self._timed("process", self.process_collected_data())
+
+        timings = self.last_cycle_timings
+        timings["cycle"] = time.perf_counter() - cycle_started
+        self.last_cycle_calls = {
+            api: limiter.calls_made - calls_before[api]
+            for api, limiter in self.rate_limiters.items()
+        }
+        self.logger.info(
+            f"Data collection cycle completed in {timings['cycle']:.2f}s "
+            f"(rachio {timings['rachio']:.2f}s, flume {timings['flume']:.2f}s "
+            f"in parallel took {timings['collect']:.2f}s, "
+            f"processing {timings['process']:.2f}s)"
+        )
+        self.logger.debug(f"HTTP latency: {self.http.latency_summary()}")
+
+    def next_poll_interval(self) -> float:
+        """Seconds to wait before the next collection cycle.
 
-        self.logger.info("Data collection cycle completed")
+        Starts from poll_interval (MIN_POLL_INTERVAL with adaptive polling)
+        and stretches it when, at the last cycle's call count, an API would
+        spend its daily budget before the budget resets.
+        """
+        interval = float(
+            self.MIN_POLL_INTERVAL if self.adaptive_polling else self.poll_interval
+        )
+        for api, limiter in self.rate_limiters.items():
+            interval = max(
+                interval,
+                limiter.suggested_interval(self.last_cycle_calls.get(api, 0)),
+            )
+        return interval
 
     async def run_continuous(self) -> None:
         """Run continuous data collection."""
@@ -124,8 +305,13 @@ class WaterTrackingCollector:
             try:
                 await self.collect_once()
 
-                # Wait for next collection cycle
-                await asyncio.sleep(self.poll_interval)
+                # Use the idle window before the next cycle for maintenance
+                await self.run_maintenance_if_due()
+
+                # Wait for next collection cycle, paced by the API budgets
+                interval = self.next_poll_interval()
+                self.logger.debug(f"Next collection cycle in {interval:.0f}s")
+                await asyncio.sleep(interval)
 
             except KeyboardInterrupt:
                 self.logger.info("Collection stopped by user")
@@ -135,38 +321,37 @@ class WaterTrackingCollector:
                 # Wait a bit before retrying
                 await asyncio.sleep(60)
 
+    def close(self) -> None:
+        """Stop the worker threads and close the HTTP pool and database."""
+        self.executor.shutdown(wait=True)
+        self.http.close()
+        self.db.close()
+
     def get_current_status(self) -> dict:
-        """Get current status of water tracking system."""
+        """Get current status of water tracking system, live from the APIs.
+
+        Stored data (sessions, watermarks) comes from the database, which a
+        running collector in another process keeps current; see
+        WaterTrackingDB.get_status for the same report without API calls.
+        """
         try:
+            status = self.db.get_status()
+
             # Get current active zone from Rachio
             active_zone = self.rachio_client.get_active_zone()
+            status["active_zone"] = {
+                "zone_number": active_zone.zone_number if active_zone else None,
+                "zone_name": active_zone.name if active_zone else None,
+            }
 
-            # Get current water usage rate from Flume
-            current_usage_rate = self.flume_client.get_current_usage_rate()
-
-            # Get recent sessions from database
-            recent_sessions = self.db.get_zone_sessions(
-                datetime.now() - timedelta(hours=24), datetime.now()
-            )
+            # Get current water usage rate and today's usage from Flume
+            status.update(self.flume_client.get_usage_snapshot())
 
-            return {
-                "active_zone": {
-                    "zone_number": active_zone.zone_number if active_zone else None,
-                    "zone_name": active_zone.name if active_zone else None,
-                },
-                "current_usage_rate_gpm": current_usage_rate,
-                "recent_sessions_count": len(recent_sessions),
-                "last_rachio_collection": (
-                    self.last_rachio_collection.isoformat()
-                    if self.last_rachio_collection
-                    else None
-                ),
-                "last_flume_collection": (
-                    self.last_flume_collection.isoformat()
-                    if self.last_flume_collection
-                    else None
-                ),
+            status["api_budget"] = {
+                api: limiter.budget_summary()
+                for api, limiter in self.rate_limiters.items()
             }
+            return status
 
         except Exception as e:
             self.logger.error(f"Error getting current status: {e}")
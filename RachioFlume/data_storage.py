@@ -1,19 +1,259 @@
 """Data storage for water tracking integration."""
 
+import json
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time as timer
+from datetime import datetime, time, timedelta
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import (
+    List,
+    Dict,
+    Any,
+    Optional,
+    Set,
+    Tuple,
+    Iterator,
+    Iterable,
+    Callable,
+    ClassVar,
+)
 from contextlib import contextmanager
 
-from rachio_client import WateringEvent, Zone
-from flume_client import WaterReading
+import numpy as np
+from pydantic import BaseModel
+
 from logger import get_logger
+from models import FlowAlert, WaterReading, WateringEvent, Zone
+
+
+def to_epoch(value: datetime) -> int:
+    """Convert a datetime to integer epoch seconds (naive means local time)."""
+    return int(value.timestamp())
+
+
+def from_epoch(seconds: int) -> datetime:
+    """Convert epoch seconds back to a naive local datetime."""
+    return datetime.fromtimestamp(seconds)
+
+
+def local_day_start(value: datetime) -> datetime:
+    """Midnight (local time) at the start of value's day."""
+    return datetime.combine(value.date(), time.min)
+
+
+# SQL expression for the epoch second of local midnight on a timestamp's day
+LOCAL_DAY_SQL = (
+    "CAST(strftime('%s', {column}, 'unixepoch', 'localtime', 'start of day', 'utc')"
+    " AS INTEGER)"
+)
+
+
+# Daily reading totals per local day for a [start, end) epoch range; days
+# are keyed on each reading's own local date, since an hour bucket can
+# straddle local midnight under a non-whole-hour UTC offset
+DAILY_USAGE_SQL = f"""
+    SELECT {LOCAL_DAY_SQL.format(column="timestamp")} AS day_start,
+           SUM(value) AS total_gallons,
+           COUNT(*) AS reading_count
+    FROM water_readings
+    WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp < ?
+    GROUP BY 1
+"""
+
+# Rollup tables: (table, key columns with the time bucket first, query
+# rebuilding the table's rows for a [start, end) epoch range from raw rows)
+ROLLUP_SOURCES: List[Tuple[str, Tuple[str, ...], str]] = [
+    (
+        "water_usage_hourly",
+        ("hour_start",),
+        """
+        SELECT (timestamp / 3600) * 3600 AS hour_start,
+               SUM(value) AS total_gallons,
+               COUNT(*) AS reading_count
+        FROM water_readings
+        WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp < ?
+        GROUP BY 1
+    """,
+    ),
+    ("water_usage_daily", ("day_start",), DAILY_USAGE_SQL),
+    (
+        "zone_usage_daily",
+        ("day_start", "zone_number", "zone_name"),
+        f"""
+        SELECT {LOCAL_DAY_SQL.format(column="start_time")} AS day_start,
+               zone_number,
+               zone_name,
+               COUNT(*) AS session_count,
+               SUM(COALESCE(duration_seconds, 0)) AS total_duration_seconds,
+               SUM(COALESCE(total_water_used, 0.0)) AS total_water_used,
+               SUM(COALESCE(average_flow_rate, 0.0)) AS flow_rate_sum
+        FROM zone_sessions
+        WHERE start_time >= ? AND start_time < ?
+        GROUP BY 1, 2, 3
+    """,
+    ),
+]
+
+# Tables moved to the archive tier, keyed by the column that dates each row
+ARCHIVE_TIME_COLUMNS: Dict[str, str] = {
+    "water_readings": "timestamp",
+    "watering_events": "event_date",
+    "zone_sessions": "start_time",
+}
+
+# Open-ended bounds for epoch range queries
+MIN_EPOCH = -(2**62)
+MAX_EPOCH = 2**62
+
+
+class IngestStats(BaseModel):
+    """Row counts from a bulk insert."""
+
+    inserted: int = 0
+    skipped: int = 0  # rows ignored as duplicates or past retention
+
+
+class RetentionPolicy(BaseModel):
+    """How long each resolution of reading data is kept."""
+
+    raw_days: int = 30  # minute readings, then hourly rollups only
+    hourly_days: int = 365  # hourly rollups, then daily rollups only
+    vacuum_pages: int = 0  # free pages released per run (0 = all)
+
+
+class MaintenanceReport(BaseModel):
+    """Outcome of one retention and compaction run."""
+
+    raw_cutoff: datetime
+    hourly_cutoff: datetime
+    readings_pruned: int = 0
+    hourly_rows_pruned: int = 0
+    cumulative_rows_pruned: int = 0
+    attribution_rows_pruned: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    bytes_reclaimed: int = 0
+    latency_before_ms: Dict[str, float] = {}
+    latency_after_ms: Dict[str, float] = {}
+
+
+class CumulativeUsage:
+    """In-memory prefix sums of water usage for batch interval queries.
+
+    Holds gallons used through the instants a batch of intervals needs,
+    loaded with load_at.
+    """
+
+    def __init__(self, timestamps: np.ndarray, cumulative: np.ndarray):
+        """Initialize from sorted timestamps and gallons used through each.
+
+        The first entry must be a sentinel carrying the total before the
+        loaded range, so every lookup lands on a valid index.
+        """
+        self.timestamps = timestamps
+        self.cumulative = cumulative
+
+    @classmethod
+    def load_at(
+        cls, conn: sqlite3.Connection, starts: np.ndarray, ends: np.ndarray
+    ) -> "CumulativeUsage":
+        """Load only the prefix sums at the boundaries of the given intervals.
+
+        Each boundary is one index seek, all issued in a single statement, so
+        sparse intervals over a long history never scan the whole range.
+        """
+        points = np.unique(np.concatenate([starts - 1, ends]))
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            """
+            SELECT point.value, COALESCE(
+                (SELECT cumulative_gallons FROM water_usage_cumulative
+                 WHERE timestamp <= point.value
+                 ORDER BY timestamp DESC LIMIT 1),
+                0.0
+            )
+            FROM json_each(?) AS point
+            ORDER BY point.value
+        """,
+            (json.dumps(points.tolist()),),
+        )
+        return cls._from_rows(0.0, cursor.fetchall())
+
+    @classmethod
+    def _from_rows(
+        cls, base: float, rows: List[Tuple[int, float]]
+    ) -> "CumulativeUsage":
+        """Build the arrays behind a leading sentinel holding base."""
+        timestamps = np.empty(len(rows) + 1, dtype=np.int64)
+        cumulative = np.empty(len(rows) + 1, dtype=np.float64)
+        timestamps[0], cumulative[0] = MIN_EPOCH, base
+        if rows:
+            timestamps[1:], cumulative[1:] = zip(*rows)
+        return cls(timestamps, cumulative)
+
+    def usage_between(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Gallons used in each inclusive [start, end] interval."""
+        # Timestamps are whole seconds, so "before start" is "through start - 1"
+        through_end = np.searchsorted(self.timestamps, ends, side="right") - 1
+        before_start = np.searchsorted(self.timestamps, starts - 1, side="right") - 1
+        return self.cumulative[through_end] - self.cumulative[before_start]
 
 
 class WaterTrackingDB:
     """SQLite database for storing water tracking data."""
 
+    SCHEMA_VERSION = 5
+
+    # Metadata keys for the incremental zone session high-water marks
+    SESSION_EVENT_WATERMARK = "zone_sessions.last_event_id"
+    SESSION_READING_WATERMARK = "zone_sessions.last_reading_id"
+
+    # Metadata keys for retention; readings before the cutoff are rollups only
+    RAW_RETENTION_CUTOFF = "retention.raw_cutoff"
+    LAST_MAINTENANCE = "retention.last_run"
+
+    # Metadata key for the archive tier; rows before it live only in Parquet
+    ARCHIVE_CUTOFF = "archive.cutoff"
+
+    # Metadata key for the flow attribution checkpoint and learned rates
+    ATTRIBUTION_STATE = "attribution.state"
+
+    # Metadata key for the anomaly detector checkpoint and flow statistics
+    ANOMALY_STATE = "anomaly.state"
+
+    # Tables whose highest row id marks how far ingest has progressed, dated
+    # by the same columns the archive partitions on
+    REPORT_CACHE_SOURCES = ARCHIVE_TIME_COLUMNS
+
+    # Late events and readings up to this long after a report window can
+    # still change sessions that started inside it
+    REPORT_CACHE_SLACK_SECONDS = 86400
+
+    # Metadata keys for how far each API has been polled, per source
+    COLLECTION_WATERMARKS: ClassVar[Dict[str, str]] = {
+        "rachio": "collector.rachio.collected_until",
+        "flume": "collector.flume.collected_until",
+    }
+
+    # Prepared bulk insert statements (row tuples follow the column order)
+    INSERT_WATERING_EVENT_SQL = """
+        INSERT OR IGNORE INTO watering_events
+        (event_date, zone_name, zone_number, event_type, duration_seconds)
+        VALUES (?, ?, ?, ?, ?)
+    """
+    INSERT_WATER_READING_SQL = """
+        INSERT OR IGNORE INTO water_readings
+        (timestamp, value, unit, device_id, bucket)
+        VALUES (?, ?, ?, ?, ?)
+    """
+
+    # Connection tuning
+    BUSY_TIMEOUT_SECONDS = 30.0
+    CACHE_SIZE_KIB = 32 * 1024
+    MMAP_SIZE_BYTES = 256 * 1024 * 1024
+
     def __init__(self, db_path: str = "water_tracking.db"):
         """Initialize database connection.
 
@@ -22,11 +262,22 @@ class WaterTrackingDB:
         """
         self.db_path = Path(db_path)
         self.logger = get_logger(__name__)
+
+        # One long-lived connection, shared by all threads under a lock
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._depth = 0
+
         self.logger.info(f"Initializing water tracking database at {self.db_path}")
         self.init_database()
 
     def init_database(self) -> None:
-        """Create database tables if they don't exist."""
+        """Create database tables and bring the schema up to date.
+
+        The schema version is tracked in SQLite's user_version pragma. New
+        databases run every migration against empty tables, so fresh and
+        upgraded databases always end up with the same schema.
+        """
         self.logger.debug("Initializing database tables")
         with self.get_connection() as conn:
             cursor = conn.cursor()
@@ -45,12 +296,12 @@ class WaterTrackingDB:
             """
             )
 
-            # Watering events table
+            # Watering events table (event_date in epoch seconds)
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS watering_events (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    event_date TIMESTAMP NOT NULL,
+                    event_date INTEGER NOT NULL,
                     zone_name TEXT NOT NULL,
                     zone_number INTEGER NOT NULL,
                     event_type TEXT NOT NULL,
@@ -60,28 +311,30 @@ class WaterTrackingDB:
             """
             )
 
-            # Water readings table
+            # Water readings table (timestamp in epoch seconds)
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS water_readings (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TIMESTAMP NOT NULL,
+                    timestamp INTEGER NOT NULL,
                     value REAL NOT NULL,
                     unit TEXT DEFAULT 'GAL',
+                    device_id TEXT NOT NULL DEFAULT '',
+                    bucket TEXT NOT NULL DEFAULT 'MIN',
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """
             )
 
-            # Zone sessions table (computed from events)
+            # Zone sessions table (computed from events, times in epoch seconds)
             cursor.execute(
                 """
                 CREATE TABLE IF NOT EXISTS zone_sessions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     zone_name TEXT NOT NULL,
                     zone_number INTEGER NOT NULL,
-                    start_time TIMESTAMP NOT NULL,
-                    end_time TIMESTAMP,
+                    start_time INTEGER NOT NULL,
+                    end_time INTEGER,
                     duration_seconds INTEGER,
                     total_water_used REAL DEFAULT 0.0,
                     average_flow_rate REAL DEFAULT 0.0,
@@ -91,216 +344,1548 @@ class WaterTrackingDB:
             """
             )
 
-            # Create indexes for better query performance
+            # Rollups of MIN-bucket readings per hour and per local day
             cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_watering_events_date ON watering_events(event_date)"
+                """
+                CREATE TABLE IF NOT EXISTS water_usage_hourly (
+                    hour_start INTEGER PRIMARY KEY,
+                    total_gallons REAL NOT NULL DEFAULT 0.0,
+                    reading_count INTEGER NOT NULL DEFAULT 0
+                )
+            """
             )
             cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_watering_events_zone ON watering_events(zone_number)"
+                """
+                CREATE TABLE IF NOT EXISTS water_usage_daily (
+                    day_start INTEGER PRIMARY KEY,
+                    total_gallons REAL NOT NULL DEFAULT 0.0,
+                    reading_count INTEGER NOT NULL DEFAULT 0
+                )
+            """
             )
+
+            # Rollup of zone sessions per zone and local day of session start
             cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_water_readings_timestamp ON water_readings(timestamp)"
+                """
+                CREATE TABLE IF NOT EXISTS zone_usage_daily (
+                    day_start INTEGER NOT NULL,
+                    zone_number INTEGER NOT NULL,
+                    zone_name TEXT NOT NULL,
+                    session_count INTEGER NOT NULL DEFAULT 0,
+                    total_duration_seconds INTEGER NOT NULL DEFAULT 0,
+                    total_water_used REAL NOT NULL DEFAULT 0.0,
+                    flow_rate_sum REAL NOT NULL DEFAULT 0.0,
+                    PRIMARY KEY (day_start, zone_number, zone_name)
+                )
+            """
             )
+
+            # Gallons of each reading minute attributed to each active zone
             cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_zone_sessions_times ON zone_sessions(start_time, end_time)"
+                """
+                CREATE TABLE IF NOT EXISTS zone_attribution (
+                    minute INTEGER NOT NULL,
+                    zone_number INTEGER NOT NULL,
+                    zone_name TEXT NOT NULL,
+                    gallons REAL NOT NULL DEFAULT 0.0,
+                    PRIMARY KEY (minute, zone_number)
+                )
+            """
             )
 
-            conn.commit()
+            # Leaks and broken heads flagged by the streaming anomaly detector
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS flow_alerts (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    alert_type TEXT NOT NULL,
+                    start_time INTEGER NOT NULL,
+                    detected_at INTEGER NOT NULL,
+                    zone_number INTEGER,
+                    zone_name TEXT,
+                    flow_rate_gpm REAL NOT NULL,
+                    expected_gpm REAL NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """
+            )
 
-    @contextmanager
-    def get_connection(self):
-        """Get database connection with automatic cleanup."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
-        try:
-            yield conn
-        finally:
-            conn.close()
-
-    def save_zones(self, zones: List[Zone]) -> None:
-        """Save or update zones in database."""
-        self.logger.info(f"Saving {len(zones)} zones to database")
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+            # Prefix sums of MIN-bucket usage: gallons through each timestamp
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS water_usage_cumulative (
+                    timestamp INTEGER PRIMARY KEY,
+                    cumulative_gallons REAL NOT NULL
+                )
+            """
+            )
 
-            for zone in zones:
-                cursor.execute(
-                    """
-                    INSERT OR REPLACE INTO zones (id, zone_number, name, enabled, updated_at)
-                    VALUES (?, ?, ?, ?, ?)
-                """,
-                    (
-                        zone.id,
-                        zone.zone_number,
-                        zone.name,
-                        zone.enabled,
-                        datetime.now(),
-                    ),
+            # Key/value metadata (watermarks, bookkeeping)
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
+            """
+            )
 
-            conn.commit()
-            self.logger.debug(f"Successfully saved {len(zones)} zones")
+            # API calls per API and UTC day, for budgets shared across processes
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS api_calls (
+                    api TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    calls INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (api, day)
+                )
+            """
+            )
 
-    def save_watering_events(self, events: List[WateringEvent]) -> None:
-        """Save watering events to database."""
-        if not events:
-            self.logger.debug("No watering events to save")
-            return
+            # Computed reports, valid until newer rows land in their window
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS report_cache (
+                    report_type TEXT NOT NULL,
+                    window_start INTEGER NOT NULL,
+                    window_end INTEGER NOT NULL,
+                    schema_version INTEGER NOT NULL,
+                    watermark TEXT NOT NULL,
+                    report TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (report_type, window_start, window_end, schema_version)
+                )
+            """
+            )
 
-        self.logger.info(f"Saving {len(events)} watering events to database")
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            for target_version, migrate in enumerate(self._migrations(), start=1):
+                if version < target_version:
+                    self.logger.info(f"Migrating database to schema v{target_version}")
+                    migrate(cursor)
 
-            for event in events:
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO watering_events 
-                    (event_date, zone_name, zone_number, event_type, duration_seconds)
-                    VALUES (?, ?, ?, ?, ?)
-                """,
-                    (
-                        event.event_date,
-                        event.zone_name,
-                        event.zone_number,
-                        event.event_type,
-                        event.duration_seconds,
-                    ),
-                )
+            # Create indexes for better query performance; the covering
+            # indexes let range scans and sums be answered from the index
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_watering_events_natural_key
+                ON watering_events(event_date, zone_number, event_type)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_watering_events_zone_type_date
+                ON watering_events(zone_number, event_type, event_date)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_water_readings_natural_key
+                ON water_readings(device_id, timestamp, bucket)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_water_readings_time_value
+                ON water_readings(timestamp, bucket, value)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_zone_sessions_times
+                ON zone_sessions(start_time, end_time)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_zone_sessions_zone_start
+                ON zone_sessions(zone_number, start_time)
+            """
+            )
+            cursor.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_flow_alerts_detected
+                ON flow_alerts(detected_at)
+            """
+            )
 
+            self._create_rollup_triggers(cursor)
+
+            cursor.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
             conn.commit()
 
-    def save_water_readings(self, readings: List[WaterReading]) -> None:
-        """Save water readings to database."""
-        if not readings:
-            self.logger.debug("No water readings to save")
-            return
+    def _migrations(self) -> List[Callable[[sqlite3.Cursor], None]]:
+        """Schema migrations in order; entry N upgrades to schema version N."""
+        return [
+            self._migrate_natural_keys,
+            self._migrate_epoch_timestamps,
+            self._migrate_rollups,
+            self._migrate_cumulative_usage,
+            self._migrate_daily_usage_local_days,
+        ]
 
-        self.logger.info(f"Saving {len(readings)} water readings to database")
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+    def _migrate_natural_keys(self, cursor: sqlite3.Cursor) -> None:
+        """v1: dedupe readings and events in place and enforce natural keys.
 
-            for reading in readings:
-                cursor.execute(
-                    """
-                    INSERT OR IGNORE INTO water_readings (timestamp, value, unit)
-                    VALUES (?, ?, ?)
-                """,
-                    (reading.timestamp, reading.value, reading.unit),
-                )
+        Readings are unique per (device_id, timestamp, bucket) and events per
+        (event_date, zone_number, event_type), so INSERT OR IGNORE drops
+        overlapping polls instead of storing them twice.
+        """
+        cursor.execute("PRAGMA table_info(water_readings)")
+        columns = {row["name"] for row in cursor.fetchall()}
+        if "device_id" not in columns:
+            cursor.execute(
+                """
+                ALTER TABLE water_readings
+                ADD COLUMN device_id TEXT NOT NULL DEFAULT ''
+            """
+            )
+        if "bucket" not in columns:
+            cursor.execute(
+                """
+                ALTER TABLE water_readings
+                ADD COLUMN bucket TEXT NOT NULL DEFAULT 'MIN'
+            """
+            )
 
-            conn.commit()
+        cursor.execute(
+            """
+            SELECT name FROM sqlite_master WHERE type = 'index'
+            AND name IN (
+                'idx_water_readings_natural_key', 'idx_watering_events_natural_key'
+            )
+        """
+        )
+        existing = {row["name"] for row in cursor.fetchall()}
 
-    def get_zone_sessions(
-        self, start_date: datetime, end_date: datetime
-    ) -> List[Dict[str, Any]]:
-        """Get zone watering sessions for a date range."""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        removed = 0
+        if "idx_water_readings_natural_key" not in existing:
+            cursor.execute(
+                """
+                DELETE FROM water_readings WHERE id NOT IN (
+                    SELECT MIN(id) FROM water_readings
+                    GROUP BY device_id, timestamp, bucket
+                )
+            """
+            )
+            removed += cursor.rowcount
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX idx_water_readings_natural_key
+                ON water_readings(device_id, timestamp, bucket)
+            """
+            )
 
+        if "idx_watering_events_natural_key" not in existing:
             cursor.execute(
                 """
-                SELECT * FROM zone_sessions 
-                WHERE start_time >= ? AND start_time <= ?
-                ORDER BY start_time
-            """,
-                (start_date, end_date),
+                DELETE FROM watering_events WHERE id NOT IN (
+                    SELECT MIN(id) FROM watering_events
+                    GROUP BY event_date, zone_number, event_type
+                )
+            """
+            )
+            removed += cursor.rowcount
+            cursor.execute(
+                """
+                CREATE UNIQUE INDEX idx_watering_events_natural_key
+                ON watering_events(event_date, zone_number, event_type)
+            """
             )
 
-            return [dict(row) for row in cursor.fetchall()]
+        # Older databases may hold duplicate sessions from repeated start
+        # events; drop them so sessions can be upserted by natural key
+        cursor.execute(
+            """
+            DELETE FROM zone_sessions WHERE id NOT IN (
+                SELECT MIN(id) FROM zone_sessions
+                GROUP BY zone_number, start_time
+            )
+        """
+        )
 
-    def compute_zone_sessions(self) -> None:
-        """Compute zone sessions from watering events."""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+        if removed:
+            # Session totals were inflated by the duplicates; rebuild them
+            self.logger.info(f"Removed {removed} duplicate readings and events")
+            self._reset_session_watermarks(cursor)
 
-            # Clear existing sessions
-            cursor.execute("DELETE FROM zone_sessions")
+    def _migrate_epoch_timestamps(self, cursor: sqlite3.Cursor) -> None:
+        """v2: store timestamps as integer epoch seconds, add covering indexes.
 
-            # Get all zone start events
-            cursor.execute(
-                """
-                SELECT * FROM watering_events 
-                WHERE event_type = 'ZONE_STARTED'
-                ORDER BY zone_number, event_date
+        ISO strings are parsed the same way new rows are converted (naive
+        values are local time). Rows that collapse onto an existing instant
+        are duplicates and are dropped.
+        """
+        for table, column in (
+            ("watering_events", "event_date"),
+            ("water_readings", "timestamp"),
+        ):
+            rows = cursor.execute(
+                f"SELECT id, {column} FROM {table} WHERE typeof({column}) = 'text'"
+            ).fetchall()
+            cursor.executemany(
+                f"UPDATE OR IGNORE {table} SET {column} = ? WHERE id = ?",
+                ((to_epoch(datetime.fromisoformat(value)), id_) for id_, value in rows),
+            )
+            cursor.execute(f"DELETE FROM {table} WHERE typeof({column}) = 'text'")
+            if rows:
+                self.logger.info(f"Converted {len(rows)} {table} timestamps to epoch")
+
+        # Sessions are derived data; recompute them from the converted events
+        cursor.execute("DELETE FROM zone_sessions")
+        self._reset_session_watermarks(cursor)
+
+        # Superseded by the covering and natural key indexes
+        cursor.execute("DROP INDEX IF EXISTS idx_watering_events_date")
+        cursor.execute("DROP INDEX IF EXISTS idx_watering_events_zone")
+        cursor.execute("DROP INDEX IF EXISTS idx_water_readings_timestamp")
+
+    def _migrate_rollups(self, cursor: sqlite3.Cursor) -> None:
+        """v3: backfill the hourly, daily and per-zone daily rollups."""
+        self._rebuild_rollups(cursor, None, None)
+
+    def _migrate_cumulative_usage(self, cursor: sqlite3.Cursor) -> None:
+        """v4: build the cumulative usage index from all readings."""
+        self._rebuild_cumulative_usage(cursor, MIN_EPOCH)
+
+    def _migrate_daily_usage_local_days(self, cursor: sqlite3.Cursor) -> None:
+        """v5: rekey daily reading totals on each reading's local day.
+
+        Days before the raw retention cutoff have no readings left to
+        recompute from and keep their totals.
+        """
+        cutoff = self._get_metadata(cursor, self.RAW_RETENTION_CUTOFF)
+        start = int(cutoff) if cutoff is not None else MIN_EPOCH
+        cursor.execute("DELETE FROM water_usage_daily WHERE day_start >= ?", (start,))
+        cursor.execute(
+            f"INSERT INTO water_usage_daily {DAILY_USAGE_SQL}", (start, MAX_EPOCH)
+        )
+
+    def _create_rollup_triggers(self, cursor: sqlite3.Cursor) -> None:
+        """Keep rollups current as readings and sessions are written.
+
+        Readings only ever add to their hourly bucket, so raw rows can later
+        be pruned without touching the rollups. Daily reading totals are
+        recomputed from the readings once per ingest batch instead (see
+        _refresh_daily_usage). Session triggers also handle upserts and
+        deletes, since sessions are recomputed in place.
+        """
+        cursor.execute(
             """
+            CREATE TRIGGER IF NOT EXISTS trg_water_readings_rollup
+            AFTER INSERT ON water_readings
+            WHEN NEW.bucket = 'MIN'
+            BEGIN
+                INSERT INTO water_usage_hourly
+                    (hour_start, total_gallons, reading_count)
+                VALUES ((NEW.timestamp / 3600) * 3600, NEW.value, 1)
+                ON CONFLICT(hour_start) DO UPDATE SET
+                    total_gallons = total_gallons + excluded.total_gallons,
+                    reading_count = reading_count + 1;
+            END
+        """
+        )
+
+        add_session = f"""
+            INSERT INTO zone_usage_daily (
+                day_start, zone_number, zone_name, session_count,
+                total_duration_seconds, total_water_used, flow_rate_sum
+            )
+            VALUES (
+                {LOCAL_DAY_SQL.format(column="NEW.start_time")},
+                NEW.zone_number,
+                NEW.zone_name,
+                1,
+                COALESCE(NEW.duration_seconds, 0),
+                COALESCE(NEW.total_water_used, 0.0),
+                COALESCE(NEW.average_flow_rate, 0.0)
             )
+            ON CONFLICT(day_start, zone_number, zone_name) DO UPDATE SET
+                session_count = session_count + 1,
+                total_duration_seconds =
+                    total_duration_seconds + excluded.total_duration_seconds,
+                total_water_used = total_water_used + excluded.total_water_used,
+                flow_rate_sum = flow_rate_sum + excluded.flow_rate_sum;
+        """
+        remove_session = f"""
+            UPDATE zone_usage_daily SET
+                session_count = session_count - 1,
+                total_duration_seconds =
+                    total_duration_seconds - COALESCE(OLD.duration_seconds, 0),
+                total_water_used =
+                    total_water_used - COALESCE(OLD.total_water_used, 0.0),
+                flow_rate_sum = flow_rate_sum - COALESCE(OLD.average_flow_rate, 0.0)
+            WHERE day_start = {LOCAL_DAY_SQL.format(column="OLD.start_time")}
+            AND zone_number = OLD.zone_number
+            AND zone_name = OLD.zone_name;
+        """
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_zone_sessions_rollup_insert
+            AFTER INSERT ON zone_sessions
+            BEGIN {add_session} END
+        """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_zone_sessions_rollup_update
+            AFTER UPDATE ON zone_sessions
+            BEGIN {remove_session} {add_session} END
+        """
+        )
+        cursor.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS trg_zone_sessions_rollup_delete
+            AFTER DELETE ON zone_sessions
+            BEGIN {remove_session} END
+        """
+        )
 
-            start_events = cursor.fetchall()
+    def _reset_session_watermarks(self, cursor: sqlite3.Cursor) -> None:
+        """Force the next compute_zone_sessions run to rebuild everything."""
+        cursor.execute(
+            "DELETE FROM metadata WHERE key IN (?, ?)",
+            (self.SESSION_EVENT_WATERMARK, self.SESSION_READING_WATERMARK),
+        )
 
-            for start_event in start_events:
-                # Find corresponding end event
-                cursor.execute(
-                    """
-                    SELECT * FROM watering_events 
-                    WHERE zone_number = ? 
-                    AND event_type IN ('ZONE_COMPLETED', 'ZONE_STOPPED')
-                    AND event_date > ?
-                    ORDER BY event_date
-                    LIMIT 1
-                """,
-                    (start_event["zone_number"], start_event["event_date"]),
-                )
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open the shared connection and apply performance pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
 
-                end_event = cursor.fetchone()
+        # Only takes effect on new files; run_maintenance converts old ones
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
 
-                if end_event:
-                    # Calculate session duration
-                    start_time = datetime.fromisoformat(start_event["event_date"])
-                    end_time = datetime.fromisoformat(end_event["event_date"])
-                    duration = int((end_time - start_time).total_seconds())
+        # WAL lets readers (e.g. the reporter) run while the collector writes
+        journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={self.MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        self.logger.debug(f"Opened database connection (journal_mode={journal_mode})")
+        return conn
 
-                    # Get water usage during this session
-                    water_used = self._get_water_usage_for_period(start_time, end_time)
+    @contextmanager
+    def get_connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow the shared database connection.
 
-                    # Calculate average flow rate
-                    avg_flow_rate = (
-                        (water_used / (duration / 60)) if duration > 0 else 0.0
-                    )
+        The connection is opened on first use and kept for the lifetime of
+        this object. Callers are serialized by a re-entrant lock; anything
+        left uncommitted when the outermost caller exits is rolled back.
+        """
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open_connection()
 
-                    # Insert session
-                    cursor.execute(
-                        """
-                        INSERT INTO zone_sessions 
-                        (zone_name, zone_number, start_time, end_time, duration_seconds, 
-                         total_water_used, average_flow_rate)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    """,
-                        (
-                            start_event["zone_name"],
-                            start_event["zone_number"],
-                            start_time,
-                            end_time,
-                            duration,
-                            water_used,
-                            avg_flow_rate,
-                        ),
-                    )
+            self._depth += 1
+            try:
+                yield self._conn
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._conn.in_transaction:
+                    self._conn.rollback()
+
+    def close(self) -> None:
+        """Close the shared database connection."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _get_metadata(self, cursor: sqlite3.Cursor, key: str) -> Optional[str]:
+        """Read a metadata value using an existing cursor."""
+        cursor.execute("SELECT value FROM metadata WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return row["value"] if row else None
+
+    def _set_metadata(self, cursor: sqlite3.Cursor, key: str, value: str) -> None:
+        """Write a metadata value using an existing cursor (caller commits)."""
+        cursor.execute(
+            """
+            INSERT INTO metadata (key, value, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value, updated_at = excluded.updated_at
+        """,
+            (key, value, datetime.now().isoformat()),
+        )
+
+    def get_metadata(self, key: str) -> Optional[str]:
+        """Get a metadata value, or None if it has never been set."""
+        with self.get_connection() as conn:
+            return self._get_metadata(conn.cursor(), key)
 
+    def set_metadata(self, key: str, value: str) -> None:
+        """Set a metadata value."""
+        with self.get_connection() as conn:
+            self._set_metadata(conn.cursor(), key, value)
             conn.commit()
 
-    def _get_water_usage_for_period(
-        self, start_time: datetime, end_time: datetime
-    ) -> float:
-        """Get total water usage for a time period."""
+    def get_api_calls(self, api: str, day: str) -> int:
+        """Calls recorded against an API on a UTC day (YYYY-MM-DD)."""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-
             cursor.execute(
-                """
-                SELECT SUM(value) as total FROM water_readings
-                WHERE timestamp >= ? AND timestamp <= ?
-            """,
-                (start_time, end_time),
+                "SELECT calls FROM api_calls WHERE api = ? AND day = ?", (api, day)
             )
+            row = cursor.fetchone()
+            return row["calls"] if row else 0
 
-            result = cursor.fetchone()
-            return result["total"] or 0.0
+    def record_api_call(
+        self, api: str, day: str, budget: Optional[int] = None
+    ) -> Optional[int]:
+        """Count one call against an API's day unless its budget is spent.
 
-    def get_weekly_zone_stats(self, start_date: datetime) -> List[Dict[str, Any]]:
-        """Get weekly statistics by zone."""
-        end_date = start_date + timedelta(days=7)
+        The check and the increment are one statement, so processes sharing
+        the database cannot both take the last call.
 
-        with self.get_connection() as conn:
+        Args:
+            api: API name
+            day: UTC day (YYYY-MM-DD)
+            budget: Calls allowed that day (None for no cap)
+
+        Returns:
+            The day's new total, or None if the budget was already spent
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO api_calls (api, day, calls)
+                SELECT :api, :day, 1 WHERE :budget IS NULL OR :budget > 0
+                ON CONFLICT(api, day) DO UPDATE SET calls = calls + 1
+                WHERE :budget IS NULL OR calls < :budget
+                RETURNING calls
+            """,
+                {"api": api, "day": day, "budget": budget},
+            )
+            row = cursor.fetchone()
+            conn.commit()
+            return row["calls"] if row else None
+
+    def get_report_cache_watermark(self) -> Dict[str, int]:
+        """Snapshot of ingest progress to store alongside a cached report.
+
+        Take it before computing the report, so rows that land meanwhile
+        invalidate the entry.
+
+        Returns:
+            Highest row id per REPORT_CACHE_SOURCES table, plus the archive
+            cutoff
+        """
+        with self.get_connection() as conn:
+            return self._report_cache_watermark(conn.cursor())
+
+    def get_cached_report(
+        self, report_type: str, window_start: int, window_end: int
+    ) -> Optional[Dict[str, Any]]:
+        """Get a cached report if no newer data touches its window.
+
+        Rows ingested since the entry was stored only invalidate it when they
+        are dated inside [window_start, window_end + REPORT_CACHE_SLACK_SECONDS);
+        otherwise the entry's watermark is advanced so later checks stay
+        cheap. Moving rows to the archive invalidates every entry.
+
+        Args:
+            report_type: Report kind and variant
+            window_start: Inclusive window start, epoch seconds
+            window_end: Exclusive window end, epoch seconds
+
+        Returns:
+            The cached report, or None on a miss
+        """
+        key = (report_type, window_start, window_end, self.SCHEMA_VERSION)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT watermark, report FROM report_cache
+                WHERE report_type = ? AND window_start = ? AND window_end = ?
+                AND schema_version = ?
+            """,
+                key,
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+
+            cached = json.loads(row["watermark"])
+            current = self._report_cache_watermark(cursor)
+            if cached != current:
+                touch_end = min(window_end + self.REPORT_CACHE_SLACK_SECONDS, MAX_EPOCH)
+                stale = (
+                    cached.keys() != current.keys()
+                    or cached["archive_cutoff"] != current["archive_cutoff"]
+                    or any(current[name] < cached[name] for name in current)
+                )
+                for table, time_column in self.REPORT_CACHE_SOURCES.items():
+                    if stale or current[table] == cached[table]:
+                        continue
+                    cursor.execute(
+                        f"""
+                        SELECT EXISTS (
+                            SELECT 1 FROM {table}
+                            WHERE id > ? AND {time_column} >= ? AND {time_column} < ?
+                        )
+                    """,
+                        (cached[table], window_start, touch_end),
+                    )
+                    stale = bool(cursor.fetchone()[0])
+
+                if stale:
+                    cursor.execute(
+                        """
+                        DELETE FROM report_cache
+                        WHERE report_type = ? AND window_start = ?
+                        AND window_end = ? AND schema_version = ?
+                    """,
+                        key,
+                    )
+                    conn.commit()
+                    return None
+
+                cursor.execute(
+                    """
+                    UPDATE report_cache SET watermark = ?
+                    WHERE report_type = ? AND window_start = ? AND window_end = ?
+                    AND schema_version = ?
+                """,
+                    (json.dumps(current), *key),
+                )
+                conn.commit()
+
+            return json.loads(row["report"])
+
+    def save_cached_report(
+        self,
+        report_type: str,
+        window_start: int,
+        window_end: int,
+        watermark: Dict[str, int],
+        report: Dict[str, Any],
+    ) -> None:
+        """Cache a computed report.
+
+        Args:
+            report_type: Report kind and variant
+            window_start: Inclusive window start, epoch seconds
+            window_end: Exclusive window end, epoch seconds
+            watermark: get_report_cache_watermark() from before computing it
+            report: JSON-serializable report
+        """
+        with self.get_connection() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO report_cache
+                (report_type, window_start, window_end, schema_version,
+                 watermark, report)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """,
+                (
+                    report_type,
+                    window_start,
+                    window_end,
+                    self.SCHEMA_VERSION,
+                    json.dumps(watermark),
+                    json.dumps(report),
+                ),
+            )
+            conn.commit()
+
+    def clear_report_cache(self) -> int:
+        """Drop every cached report.
+
+        Returns:
+            Number of entries removed
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM report_cache")
+            conn.commit()
+            return cursor.rowcount
+
+    def invalidate_report_cache(self, start: int, end: int) -> int:
+        """Drop cached reports whose window overlaps [start, end].
+
+        For changes that do not add rows, such as sessions whose totals were
+        rewritten in place.
+
+        Args:
+            start: First changed epoch second
+            end: Last changed epoch second
+
+        Returns:
+            Number of entries removed
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM report_cache WHERE window_start <= ? AND window_end > ?",
+                (end, start),
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def _report_cache_watermark(self, cursor: sqlite3.Cursor) -> Dict[str, int]:
+        """Highest row id per source table plus the archive cutoff."""
+        cursor.execute(
+            "SELECT "
+            + ", ".join(
+                f"(SELECT COALESCE(MAX(id), 0) FROM {table})"
+                for table in self.REPORT_CACHE_SOURCES
+            )
+        )
+        watermark = dict(zip(self.REPORT_CACHE_SOURCES, cursor.fetchone()))
+        cutoff = self._get_metadata(cursor, self.ARCHIVE_CUTOFF)
+        watermark["archive_cutoff"] = int(cutoff) if cutoff is not None else MIN_EPOCH
+        return watermark
+
+    def save_zones(self, zones: List[Zone]) -> int:
+        """Save zones that are new or changed since they were last saved.
+
+        Returns:
+            Number of zones written
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, zone_number, name, enabled FROM zones")
+            stored = {
+                row["id"]: (row["zone_number"], row["name"], bool(row["enabled"]))
+                for row in cursor.fetchall()
+            }
+            changed = [
+                zone
+                for zone in zones
+                if stored.get(zone.id) != (zone.zone_number, zone.name, zone.enabled)
+            ]
+            if not changed:
+                self.logger.debug(f"All {len(zones)} zones unchanged")
+                return 0
+
+            self.logger.info(f"Saving {len(changed)} changed zones to database")
+            for zone in changed:
+                cursor.execute(
+                    """
+                    INSERT OR REPLACE INTO zones (id, zone_number, name, enabled, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """,
+                    (
+                        zone.id,
+                        zone.zone_number,
+                        zone.name,
+                        zone.enabled,
+                        datetime.now(),
+                    ),
+                )
+
+            conn.commit()
+            self.logger.debug(f"Successfully saved {len(changed)} zones")
+            return len(changed)
+
+    def save_flow_alerts(self, alerts: List[FlowAlert]) -> int:
+        """Save alerts raised by the anomaly detector.
+
+        Returns:
+            Number of alerts written
+        """
+        with self.get_connection() as conn:
+            conn.executemany(
+                """
+                INSERT INTO flow_alerts
+                (alert_type, start_time, detected_at, zone_number, zone_name,
+                 flow_rate_gpm, expected_gpm, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+                [
+                    (
+                        alert.alert_type,
+                        to_epoch(alert.start_time),
+                        to_epoch(alert.detected_at),
+                        alert.zone_number,
+                        alert.zone_name,
+                        alert.flow_rate_gpm,
+                        alert.expected_gpm,
+                        alert.message,
+                    )
+                    for alert in alerts
+                ],
+            )
+            conn.commit()
+        return len(alerts)
+
+    def get_flow_alerts(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Get alerts detected in a date range, newest first.
+
+        start_time and detected_at are returned as epoch seconds.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT * FROM flow_alerts
+                WHERE detected_at >= ? AND detected_at <= ?
+                ORDER BY detected_at DESC, id DESC
+            """,
+                (to_epoch(start_date), to_epoch(end_date)),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_collection_watermark(self, source: str) -> Optional[datetime]:
+        """End of the last window collected from an API ("rachio" or "flume")."""
+        value = self.get_metadata(self.COLLECTION_WATERMARKS[source])
+        return datetime.fromisoformat(value) if value is not None else None
+
+    def save_watering_events(
+        self,
+        events: List[WateringEvent],
+        collected_until: Optional[datetime] = None,
+    ) -> IngestStats:
+        """Save watering events to database.
+
+        Args:
+            events: Events to insert
+            collected_until: End of the polled window, recorded as the Rachio
+                watermark in the same transaction as the events
+        """
+        if not events:
+            self.logger.debug("No watering events to save")
+            if collected_until is not None:
+                self._advance_collection_watermark("rachio", collected_until)
+            return IngestStats()
+
+        self.logger.info(f"Saving {len(events)} watering events to database")
+        return self.bulk_insert_watering_events(
+            (
+                (
+                    to_epoch(event.event_date),
+                    event.zone_name,
+                    event.zone_number,
+                    event.event_type,
+                    event.duration_seconds,
+                )
+                for event in events
+            ),
+            collected_until=collected_until,
+        )
+
+    def save_water_readings(
+        self,
+        readings: List[WaterReading],
+        collected_until: Optional[datetime] = None,
+        update_usage_index: bool = True,
+    ) -> IngestStats:
+        """Save water readings to database.
+
+        Args:
+            readings: Readings to insert
+            collected_until: End of the polled window, recorded as the Flume
+                watermark in the same transaction as the readings
+            update_usage_index: See bulk_insert_water_readings
+        """
+        if not readings:
+            self.logger.debug("No water readings to save")
+            if collected_until is not None:
+                self._advance_collection_watermark("flume", collected_until)
+            return IngestStats()
+
+        self.logger.info(f"Saving {len(readings)} water readings to database")
+        return self.bulk_insert_water_readings(
+            (
+                (
+                    to_epoch(reading.timestamp),
+                    reading.value,
+                    reading.unit,
+                    reading.device_id,
+                    reading.bucket,
+                )
+                for reading in readings
+            ),
+            collected_until=collected_until,
+            update_usage_index=update_usage_index,
+        )
+
+    def _advance_collection_watermark(
+        self,
+        source: str,
+        collected_until: datetime,
+        cursor: Optional[sqlite3.Cursor] = None,
+    ) -> None:
+        """Record an API's watermark, committing unless given the caller's cursor."""
+        key = self.COLLECTION_WATERMARKS[source]
+        if cursor is not None:
+            self._set_metadata(cursor, key, collected_until.isoformat())
+        else:
+            self.set_metadata(key, collected_until.isoformat())
+
+    def bulk_insert_watering_events(
+        self,
+        rows: Iterable[Tuple[Any, ...]],
+        collected_until: Optional[datetime] = None,
+    ) -> IngestStats:
+        """Insert raw watering event rows in a single transaction.
+
+        Args:
+            rows: (event_date, zone_name, zone_number, event_type,
+                duration_seconds) tuples, with event_date in epoch seconds
+            collected_until: Rachio watermark to commit with the rows
+
+        Returns:
+            Counts of inserted rows and rows skipped as duplicates
+        """
+
+        def advance_watermark(cursor: sqlite3.Cursor) -> None:
+            if collected_until is not None:
+                self._advance_collection_watermark("rachio", collected_until, cursor)
+
+        return self._bulk_insert(
+            self.INSERT_WATERING_EVENT_SQL, rows, after_insert=advance_watermark
+        )
+
+    def bulk_insert_water_readings(
+        self,
+        rows: Iterable[Tuple[Any, ...]],
+        collected_until: Optional[datetime] = None,
+        update_usage_index: bool = True,
+    ) -> IngestStats:
+        """Insert raw water reading rows in a single transaction.
+
+        Args:
+            rows: (timestamp, value, unit, device_id, bucket) tuples, with
+                timestamp in epoch seconds
+            collected_until: Flume watermark to commit with the rows
+            update_usage_index: Fold the rows into the cumulative usage index;
+                bulk loads can skip it and call rebuild_usage_index() once
+
+        Returns:
+            Counts of inserted rows and rows skipped as duplicates. Rows older
+            than the raw retention cutoff are skipped too, since their hourly
+            totals were kept when the originals were pruned.
+        """
+        cutoff = self.get_raw_retention_cutoff()
+        first_ts = MAX_EPOCH
+        last_ts = MIN_EPOCH
+        expired = 0
+
+        def tracked() -> Iterator[Tuple[Any, ...]]:
+            nonlocal first_ts, last_ts, expired
+            for row in rows:
+                if row[0] < cutoff:
+                    expired += 1
+                    continue
+                first_ts = min(first_ts, row[0])
+                last_ts = max(last_ts, row[0])
+                yield row
+
+        def refresh_derived(cursor: sqlite3.Cursor) -> None:
+            if first_ts <= last_ts:
+                self._refresh_daily_usage(cursor, first_ts, last_ts)
+                if update_usage_index:
+                    self._extend_cumulative_usage(cursor, first_ts, last_ts)
+            if collected_until is not None:
+                self._advance_collection_watermark("flume", collected_until, cursor)
+
+        stats = self._bulk_insert(
+            self.INSERT_WATER_READING_SQL, tracked(), after_insert=refresh_derived
+        )
+        if expired:
+            self.logger.warning(
+                f"Skipped {expired} water readings older than the retention cutoff"
+            )
+            stats.skipped += expired
+        return stats
+
+    def _extend_cumulative_usage(
+        self, cursor: sqlite3.Cursor, first_ts: int, last_ts: int
+    ) -> None:
+        """Fold a batch of readings in [first_ts, last_ts] into the prefix sums.
+
+        Only the batch's own timestamps are re-derived from the readings;
+        later prefix sums move by the batch's total in one UPDATE, which
+        touches no rows when the batch is appended at the end.
+        """
+        cursor.execute(
+            """
+            SELECT
+                (SELECT cumulative_gallons FROM water_usage_cumulative
+                 WHERE timestamp < ? ORDER BY timestamp DESC LIMIT 1),
+                (SELECT cumulative_gallons FROM water_usage_cumulative
+                 WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1)
+        """,
+            (first_ts, last_ts),
+        )
+        base, old_through_last = cursor.fetchone()
+        base = base or 0.0
+        old_through_last = old_through_last or 0.0
+
+        cursor.execute(
+            """
+            DELETE FROM water_usage_cumulative
+            WHERE timestamp >= ? AND timestamp <= ?
+        """,
+            (first_ts, last_ts),
+        )
+        cursor.execute(
+            """
+            INSERT INTO water_usage_cumulative (timestamp, cumulative_gallons)
+            SELECT timestamp, ? + SUM(SUM(value)) OVER (ORDER BY timestamp)
+            FROM water_readings
+            WHERE bucket = 'MIN' AND timestamp >= ? AND timestamp <= ?
+            GROUP BY timestamp
+        """,
+            (base, first_ts, last_ts),
+        )
+
+        cursor.execute(
+            """
+            SELECT cumulative_gallons FROM water_usage_cumulative
+            WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1
+        """,
+            (last_ts,),
+        )
+        row = cursor.fetchone()
+        shift = (row[0] if row else 0.0) - old_through_last
+        if shift:
+            cursor.execute(
+                """
+                UPDATE water_usage_cumulative
+                SET cumulative_gallons = cumulative_gallons + ?
+                WHERE timestamp > ?
+            """,
+                (shift, last_ts),
+            )
+
+    def _rebuild_cumulative_usage(self, cursor: sqlite3.Cursor, first_ts: int) -> None:
+        """Re-derive every prefix sum from first_ts onward from the readings."""
+        cursor.execute(
+            """
+            SELECT cumulative_gallons FROM water_usage_cumulative
+            WHERE timestamp < ? ORDER BY timestamp DESC LIMIT 1
+        """,
+            (first_ts,),
+        )
+        row = cursor.fetchone()
+        base = row[0] if row else 0.0
+
+        cursor.execute(
+            "DELETE FROM water_usage_cumulative WHERE timestamp >= ?", (first_ts,)
+        )
+        cursor.execute(
+            """
+            INSERT INTO water_usage_cumulative (timestamp, cumulative_gallons)
+            SELECT timestamp, ? + SUM(SUM(value)) OVER (ORDER BY timestamp)
+            FROM water_readings
+            WHERE bucket = 'MIN' AND timestamp >= ?
+            GROUP BY timestamp
+        """,
+            (base, first_ts),
+        )
+
+    def rebuild_usage_index(self, since: Optional[datetime] = None) -> None:
+        """Rebuild the cumulative usage index from the retained raw readings.
+
+        Args:
+            since: Only rebuild from here on (never below the raw retention
+                cutoff); defaults to all retained readings
+        """
+        first_ts = self.get_raw_retention_cutoff()
+        if since is not None:
+            first_ts = max(first_ts, to_epoch(since))
+        with self.get_connection() as conn:
+            self._rebuild_cumulative_usage(conn.cursor(), first_ts)
+            conn.commit()
+
+    def get_water_usage(self, start_time: datetime, end_time: datetime) -> float:
+        """Get gallons used in the inclusive range [start_time, end_time].
+
+        Answered from the cumulative usage index with two point lookups. The
+        index is kept when readings are archived or pruned, so ranges before
+        the archive cutoff resolve too, to the coarser points retention left.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT
+                    (SELECT cumulative_gallons FROM water_usage_cumulative
+                     WHERE timestamp <= ? ORDER BY timestamp DESC LIMIT 1),
+                    (SELECT cumulative_gallons FROM water_usage_cumulative
+                     WHERE timestamp < ? ORDER BY timestamp DESC LIMIT 1)
+            """,
+                (to_epoch(end_time), to_epoch(start_time)),
+            )
+            through_end, before_start = cursor.fetchone()
+            return (through_end or 0.0) - (before_start or 0.0)
+
+    def _refresh_daily_usage(
+        self, cursor: sqlite3.Cursor, first_ts: int, last_ts: int
+    ) -> None:
+        """Recompute daily reading totals for the local days touched by a batch.
+
+        The raw retention cutoff falls on local midnight, so every day a batch
+        can touch still has all of its readings.
+        """
+        start = to_epoch(local_day_start(from_epoch(first_ts)))
+        end = to_epoch(local_day_start(from_epoch(last_ts)) + timedelta(days=1))
+        cursor.execute(
+            f"INSERT OR REPLACE INTO water_usage_daily {DAILY_USAGE_SQL}", (start, end)
+        )
+
+    def _bulk_insert(
+        self,
+        sql: str,
+        rows: Iterable[Tuple[Any, ...]],
+        after_insert: Optional[Callable[[sqlite3.Cursor], None]] = None,
+    ) -> IngestStats:
+        """Run one prepared INSERT OR IGNORE over all rows and count outcomes.
+
+        after_insert runs in the same transaction, before the commit.
+        """
+        total = 0
+
+        def counted() -> Iterator[Tuple[Any, ...]]:
+            nonlocal total
+            for row in rows:
+                total += 1
+                yield row
+
+        with self.get_connection() as conn:
+            # rowcount excludes rows written by the rollup triggers
+            cursor = conn.executemany(sql, counted())
+            inserted = cursor.rowcount
+            if after_insert is not None:
+                after_insert(cursor)
+            conn.commit()
+
+        stats = IngestStats(inserted=inserted, skipped=total - inserted)
+        self.logger.debug(
+            f"Bulk insert: {stats.inserted} inserted, {stats.skipped} skipped"
+        )
+        return stats
+
+    def get_status(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """System status answered from stored data alone, without API calls.
+
+        The active zone and flow rate are as of the last collection: a zone
+        counts as active if its start is the latest watering event, and the
+        rate averages minute readings from the five minutes before now.
+
+        Returns:
+            Dict with active_zone, current_usage_rate_gpm (None without recent
+            readings), today_usage_gallons, recent_sessions_count, the last
+            day's recent_alerts and the
+            last_rachio_collection/last_flume_collection watermarks
+        """
+        now = now or datetime.now()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT zone_number, zone_name, event_type FROM watering_events
+                WHERE event_date <= ?
+                ORDER BY event_date DESC, id DESC LIMIT 1
+            """,
+                (to_epoch(now),),
+            )
+            latest_event = cursor.fetchone()
+
+            cursor.execute(
+                """
+                SELECT SUM(value), COUNT(*) FROM water_readings
+                WHERE bucket = 'MIN' AND timestamp > ? AND timestamp <= ?
+            """,
+                (to_epoch(now - timedelta(minutes=5)), to_epoch(now)),
+            )
+            recent_gallons, recent_count = cursor.fetchone()
+
+        active = latest_event is not None and (
+            latest_event["event_type"] == "ZONE_STARTED"
+        )
+        last_rachio = self.get_collection_watermark("rachio")
+        last_flume = self.get_collection_watermark("flume")
+
+        return {
+            "active_zone": {
+                "zone_number": latest_event["zone_number"] if active else None,
+                "zone_name": latest_event["zone_name"] if active else None,
+            },
+            "current_usage_rate_gpm": (
+                recent_gallons / recent_count if recent_count else None
+            ),
+            "today_usage_gallons": self.get_water_usage(local_day_start(now), now),
+            "recent_sessions_count": len(
+                self.get_zone_sessions(now - timedelta(hours=24), now)
+            ),
+            "recent_alerts": self.get_flow_alerts(now - timedelta(hours=24), now),
+            "last_rachio_collection": last_rachio.isoformat() if last_rachio else None,
+            "last_flume_collection": last_flume.isoformat() if last_flume else None,
+        }
+
+    def get_zone_sessions(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Get zone watering sessions for a date range.
+
+        Session start_time and end_time are returned as epoch seconds.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT * FROM zone_sessions 
+                WHERE start_time >= ? AND start_time <= ?
+                ORDER BY start_time
+            """,
+                (to_epoch(start_date), to_epoch(end_date)),
+            )
+
+            return [dict(row) for row in cursor.fetchall()]
+
+    def compute_zone_sessions(self, full_rebuild: bool = False) -> int:
+        """Compute zone sessions from watering events.
+
+        Runs incrementally by default: only start events affected by watering
+        events or water readings ingested since the last run are re-paired,
+        and their sessions are upserted. Starts that are still open are picked
+        up again once their end event arrives.
+
+        Args:
+            full_rebuild: Discard all sessions and recompute from scratch
+
+        Returns:
+            Number of sessions inserted or updated
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            last_event_id = self._get_metadata(cursor, self.SESSION_EVENT_WATERMARK)
+            last_reading_id = self._get_metadata(cursor, self.SESSION_READING_WATERMARK)
+
+            if full_rebuild or last_event_id is None or last_reading_id is None:
+                self.logger.info("Rebuilding all zone sessions")
+                cursor.execute("DELETE FROM zone_sessions")
+                # Rebuilt sessions carry raw totals until attributed again
+                cursor.execute(
+                    "DELETE FROM metadata WHERE key = ?", (self.ATTRIBUTION_STATE,)
+                )
+                last_event_id = last_reading_id = "0"
+
+            # Capture the high-water marks before reading so rows that land
+            # during this run are picked up by the next one
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM watering_events")
+            max_event_id = cursor.fetchone()[0]
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM water_readings")
+            max_reading_id = cursor.fetchone()[0]
+
+            start_events = self._get_affected_start_events(
+                cursor,
+                int(last_event_id),
+                max_event_id,
+                int(last_reading_id),
+                max_reading_id,
+            )
+
+            sessions = self._pair_start_events(conn, start_events, max_event_id)
+            water_totals = self._usage_for_periods(
+                conn,
+                [(start["event_date"], end["event_date"]) for start, end in sessions],
+            )
+
+            rows = []
+            for (start_event, end_event), water_used in zip(sessions, water_totals):
+                # Calculate session duration
+                duration = end_event["event_date"] - start_event["event_date"]
+
+                # Calculate average flow rate
+                avg_flow_rate = (water_used / (duration / 60)) if duration > 0 else 0.0
+
+                rows.append(
+                    (
+                        start_event["zone_name"],
+                        start_event["zone_number"],
+                        start_event["event_date"],
+                        end_event["event_date"],
+                        duration,
+                        water_used,
+                        avg_flow_rate,
+                    )
+                )
+
+            # Insert or refresh sessions
+            cursor.executemany(
+                """
+                INSERT INTO zone_sessions
+                (zone_name, zone_number, start_time, end_time, duration_seconds,
+                 total_water_used, average_flow_rate)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(zone_number, start_time) DO UPDATE SET
+                    zone_name = excluded.zone_name,
+                    end_time = excluded.end_time,
+                    duration_seconds = excluded.duration_seconds,
+                    total_water_used = excluded.total_water_used,
+                    average_flow_rate = excluded.average_flow_rate,
+                    updated_at = CURRENT_TIMESTAMP
+            """,
+                rows,
+            )
+
+            self._set_metadata(cursor, self.SESSION_EVENT_WATERMARK, str(max_event_id))
+            self._set_metadata(
+                cursor, self.SESSION_READING_WATERMARK, str(max_reading_id)
+            )
+            conn.commit()
+
+        self.logger.debug(
+            f"Re-evaluated {len(start_events)} start events, "
+            f"wrote {len(rows)} zone sessions"
+        )
+        return len(rows)
+
+    def _get_affected_start_events(
+        self,
+        cursor: sqlite3.Cursor,
+        last_event_id: int,
+        max_event_id: int,
+        last_reading_id: int,
+        max_reading_id: int,
+    ) -> List[sqlite3.Row]:
+        """Find start events whose sessions may have changed since the last run.
+
+        A new event in a zone can close (or re-close) every start in that zone
+        still open when it happened, so each zone is re-paired from the first
+        start after its last end event before the new ones. New readings
+        change the water totals of sessions overlapping them.
+        """
+        seen: Set[int] = set()
+        start_events: List[sqlite3.Row] = []
+
+        def collect(query: str, params: Tuple[Any, ...]) -> None:
+            cursor.execute(query, params)
+            for row in cursor.fetchall():
+                if row["id"] not in seen:
+                    seen.add(row["id"])
+                    start_events.append(row)
+
+        cursor.execute(
+            """
+            SELECT zone_number, MIN(event_date) AS first_date
+            FROM watering_events
+            WHERE id > ? AND id <= ?
+            GROUP BY zone_number
+        """,
+            (last_event_id, max_event_id),
+        )
+        for zone in cursor.fetchall():
+            collect(
+                """
+                SELECT * FROM watering_events
+                WHERE zone_number = ?
+                AND event_type = 'ZONE_STARTED'
+                AND id <= ?
+                AND event_date >= COALESCE(
+                    (SELECT MAX(event_date) FROM watering_events
+                     WHERE zone_number = ?
+                     AND event_type IN ('ZONE_COMPLETED', 'ZONE_STOPPED')
+                     AND event_date < ? AND id <= ?),
+                    ?
+                )
+            """,
+                (
+                    zone["zone_number"],
+                    max_event_id,
+                    zone["zone_number"],
+                    zone["first_date"],
+                    max_event_id,
+                    MIN_EPOCH,
+                ),
+            )
+
+        cursor.execute(
+            """
+            SELECT MIN(timestamp) AS first_ts, MAX(timestamp) AS last_ts
+            FROM water_readings
+            WHERE id > ? AND id <= ?
+        """,
+            (last_reading_id, max_reading_id),
+        )
+        readings = cursor.fetchone()
+        if readings["first_ts"] is not None:
+            collect(
+                """
+                SELECT e.* FROM zone_sessions s
+                JOIN watering_events e
+                    ON e.zone_number = s.zone_number
+                    AND e.event_date = s.start_time
+                    AND e.event_type = 'ZONE_STARTED'
+                WHERE s.end_time >= ? AND s.start_time <= ?
+            """,
+                (readings["first_ts"], readings["last_ts"]),
+            )
+
+        start_events.sort(key=lambda row: (row["zone_number"], row["event_date"]))
+        return start_events
+
+    def _pair_start_events(
+        self,
+        conn: sqlite3.Connection,
+        start_events: List[sqlite3.Row],
+        max_event_id: int,
+    ) -> List[Tuple[sqlite3.Row, sqlite3.Row]]:
+        """Pair start events with the next end event in their zone.
+
+        Walks the zones' events once in date order, holding pending starts per
+        zone until an end event strictly after them closes them.
+        """
+        if not start_events:
+            return []
+
+        wanted = {row["id"] for row in start_events}
+        zones = sorted({row["zone_number"] for row in start_events})
+        first_date = min(row["event_date"] for row in start_events)
+        placeholders = ", ".join("?" for _ in zones)
+
+        events = conn.execute(
+            f"""
+            SELECT id, zone_name, zone_number, event_type, event_date
+            FROM watering_events
+            WHERE id <= ? AND event_date >= ? AND zone_number IN ({placeholders})
+            ORDER BY event_date
+        """,
+            (max_event_id, first_date, *zones),
+        )
+
+        pending: Dict[int, List[sqlite3.Row]] = {}
+        pairs: List[Tuple[sqlite3.Row, sqlite3.Row]] = []
+        for event in events:
+            zone_pending = pending.setdefault(event["zone_number"], [])
+            if event["event_type"] == "ZONE_STARTED":
+                if event["id"] in wanted:
+                    zone_pending.append(event)
+            elif event["event_type"] in ("ZONE_COMPLETED", "ZONE_STOPPED"):
+                # Starts at the same instant cannot be closed by this event
+                still_open = []
+                for start_event in zone_pending:
+                    if start_event["event_date"] < event["event_date"]:
+                        pairs.append((start_event, event))
+                    else:
+                        still_open.append(start_event)
+                pending[event["zone_number"]] = still_open
+
+        return pairs
+
+    def _usage_for_periods(
+        self, conn: sqlite3.Connection, periods: List[Tuple[int, int]]
+    ) -> List[float]:
+        """Water used in each inclusive [start, end] period.
+
+        Samples the prefix sums at every period boundary in one statement and
+        answers each period with two array lookups.
+        """
+        if not periods:
+            return []
+
+        starts = np.fromiter((start for start, _ in periods), np.int64, len(periods))
+        ends = np.fromiter((end for _, end in periods), np.int64, len(periods))
+        usage = CumulativeUsage.load_at(conn, starts, ends)
+        return usage.usage_between(starts, ends).tolist()
+
+    def get_weekly_zone_stats(self, start_date: datetime) -> List[Dict[str, Any]]:
+        """Get weekly statistics by zone.
+
+        Weeks starting at local midnight are answered from the per-zone daily
+        rollup; other start times fall back to the raw sessions.
+        """
+        end_date = start_date + timedelta(days=7)
+
+        if start_date != local_day_start(start_date):
+            return self._get_zone_stats_from_sessions(start_date, end_date)
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                """
+                SELECT
+                    zone_name,
+                    zone_number,
+                    SUM(session_count) as session_count,
+                    SUM(total_duration_seconds) as total_duration_seconds,
+                    CAST(SUM(total_duration_seconds) AS REAL)
+                        / SUM(session_count) as avg_duration_seconds,
+                    SUM(total_water_used) as total_water_used,
+                    SUM(flow_rate_sum) / SUM(session_count) as avg_flow_rate
+                FROM zone_usage_daily
+                WHERE day_start >= ? AND day_start < ?
+                GROUP BY zone_name, zone_number
+                HAVING SUM(session_count) > 0
+                ORDER BY zone_number
+            """,
+                (to_epoch(start_date), to_epoch(end_date)),
+            )
+
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_period_zone_stats(self, boundaries: List[datetime]) -> List[Dict[str, Any]]:
+        """Get per-zone session totals for consecutive periods in one query.
+
+        Period i is [boundaries[i], boundaries[i + 1]). Boundaries must be
+        local midnights, since the periods are summed from the per-zone daily
+        rollup.
+
+        Returns:
+            Dicts with period (the period's index), zone_name, zone_number,
+            session_count, total_duration_seconds, total_water_used and
+            flow_rate_sum, ordered by period then zone number
+        """
+        if len(boundaries) < 2:
+            return []
+
+        edges = [to_epoch(edge) for edge in boundaries]
+        periods = [
+            value
+            for index, (start, end) in enumerate(zip(edges, edges[1:]))
+            for value in (index, start, end)
+        ]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                f"""
+                WITH periods(period, start, end) AS (
+                    VALUES {", ".join(["(?, ?, ?)"] * (len(edges) - 1))}
+                )
+                SELECT
+                    period,
+                    zone_name,
+                    zone_number,
+                    SUM(session_count) as session_count,
+                    SUM(total_duration_seconds) as total_duration_seconds,
+                    SUM(total_water_used) as total_water_used,
+                    SUM(flow_rate_sum) as flow_rate_sum
+                FROM periods
+                JOIN zone_usage_daily
+                    ON day_start >= periods.start AND day_start < periods.end
+                GROUP BY period, zone_name, zone_number
+                HAVING SUM(session_count) > 0
+                ORDER BY period, zone_number
+            """,
+                periods,
+            )
+
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _get_zone_stats_from_sessions(
+        self, start_date: datetime, end_date: datetime
+    ) -> List[Dict[str, Any]]:
+        """Get per-zone statistics straight from the raw sessions."""
+        with self.get_connection() as conn:
             cursor = conn.cursor()
 
             cursor.execute(
@@ -318,7 +1903,319 @@ class WaterTrackingDB:
                 GROUP BY zone_name, zone_number
                 ORDER BY zone_number
             """,
-                (start_date, end_date),
+                (to_epoch(start_date), to_epoch(end_date)),
             )
 
             return [dict(row) for row in cursor.fetchall()]
+
+    def rebuild_rollups(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> None:
+        """Recompute rollups for a date range from the raw rows.
+
+        The range is widened to whole local days. Omitting a bound rebuilds
+        everything on that side.
+        """
+        start, end = self._rollup_range(start_date, end_date)
+        self.logger.info(f"Rebuilding rollups for {start_date} to {end_date}")
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            self._rebuild_rollups(cursor, start, end)
+            # Rebuilt rollups may differ without any new rows arriving
+            cursor.execute("DELETE FROM report_cache")
+            conn.commit()
+
+    def check_rollups(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        """Compare rollups with the raw rows for a date range.
+
+        Returns:
+            Number of mismatched rollup rows per rollup table
+        """
+        start, end = self._rollup_range(start_date, end_date)
+        mismatches = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+
+            for table, key_columns, source_sql in ROLLUP_SOURCES:
+                key_count = len(key_columns)
+                key_column = key_columns[0]
+                expected = {
+                    row[:key_count]: row[key_count:]
+                    for row in cursor.execute(source_sql, (start, end))
+                }
+                actual = {
+                    row[:key_count]: row[key_count:]
+                    for row in cursor.execute(
+                        f"""
+                        SELECT * FROM {table}
+                        WHERE {key_column} >= ? AND {key_column} < ?
+                    """,
+                        (start, end),
+                    )
+                    if any(abs(value) > 1e-9 for value in row[key_count:])
+                }
+
+                mismatched = 0
+                for key in expected.keys() | actual.keys():
+                    want = expected.get(key)
+                    have = actual.get(key)
+                    if (
+                        want is None
+                        or have is None
+                        or any(abs(a - b) > 1e-6 for a, b in zip(want, have))
+                    ):
+                        mismatched += 1
+                mismatches[table] = mismatched
+
+        if any(mismatches.values()):
+            self.logger.warning(f"Rollup mismatches found: {mismatches}")
+        return mismatches
+
+    def _rollup_range(
+        self, start_date: Optional[datetime], end_date: Optional[datetime]
+    ) -> Tuple[int, int]:
+        """Widen a date range to whole local days, as epoch seconds.
+
+        The start never reaches below the raw retention cutoff, where the
+        rollups are the only remaining copy of the data.
+        """
+        start = self.get_raw_retention_cutoff()
+        if start_date is not None:
+            start = max(start, to_epoch(local_day_start(start_date)))
+
+        end = MAX_EPOCH
+        if end_date is not None:
+            end_day = local_day_start(end_date)
+            if end_day < end_date:
+                end_day += timedelta(days=1)
+            end = to_epoch(end_day)
+
+        return start, end
+
+    def _rebuild_rollups(
+        self, cursor: sqlite3.Cursor, start: Optional[int], end: Optional[int]
+    ) -> None:
+        """Replace rollup rows in [start, end) with fresh aggregates."""
+        start = MIN_EPOCH if start is None else start
+        end = MAX_EPOCH if end is None else end
+
+        for table, key_columns, source_sql in ROLLUP_SOURCES:
+            key_column = key_columns[0]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {key_column} >= ? AND {key_column} < ?",
+                (start, end),
+            )
+            cursor.execute(f"INSERT INTO {table} {source_sql}", (start, end))
+
+    def get_raw_retention_cutoff(self) -> int:
+        """Epoch second before which raw minute readings have been pruned."""
+        cutoff = self.get_metadata(self.RAW_RETENTION_CUTOFF)
+        return int(cutoff) if cutoff is not None else MIN_EPOCH
+
+    def run_maintenance(
+        self,
+        policy: Optional[RetentionPolicy] = None,
+        now: Optional[datetime] = None,
+    ) -> MaintenanceReport:
+        """Apply the retention policy and release the freed pages.
+
+        Minute readings older than policy.raw_days are deleted; their hourly
+        and daily rollups stay, and the cumulative usage index keeps one point
+        per hour so interval usage over old data resolves to whole hours.
+        Past policy.hourly_days only daily rollups and one index point per
+        local day remain. Per-minute zone attribution goes with the minute
+        readings. Zone sessions and watering events are kept.
+
+        Args:
+            policy: Retention settings (defaults to RetentionPolicy())
+            now: Reference time for the cutoffs (defaults to now)
+
+        Returns:
+            Rows pruned, database size and probe query latency before and after
+        """
+        policy = policy or RetentionPolicy()
+        now = now or datetime.now()
+        raw_cutoff = local_day_start(now - timedelta(days=policy.raw_days))
+        hourly_cutoff = local_day_start(
+            now - timedelta(days=max(policy.hourly_days, policy.raw_days))
+        )
+        report = MaintenanceReport(raw_cutoff=raw_cutoff, hourly_cutoff=hourly_cutoff)
+        self.logger.info(
+            f"Running maintenance: raw readings before {raw_cutoff}, "
+            f"hourly rollups before {hourly_cutoff}"
+        )
+
+        report.latency_before_ms = self._probe_query_latency(now)
+        report.bytes_before = self._database_size()
+
+        raw_epoch = max(to_epoch(raw_cutoff), self.get_raw_retention_cutoff())
+        hourly_epoch = to_epoch(hourly_cutoff)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute(
+                "DELETE FROM water_readings WHERE bucket = 'MIN' AND timestamp < ?",
+                (raw_epoch,),
+            )
+            report.readings_pruned = cursor.rowcount
+
+            cursor.execute(
+                "DELETE FROM water_usage_hourly WHERE hour_start < ?", (hourly_epoch,)
+            )
+            report.hourly_rows_pruned = cursor.rowcount
+
+            # Keep the last prefix sum of each hour, then of each local day
+            cursor.execute(
+                """
+                DELETE FROM water_usage_cumulative
+                WHERE timestamp < ? AND timestamp NOT IN (
+                    SELECT MAX(timestamp) FROM water_usage_cumulative
+                    WHERE timestamp < ? GROUP BY timestamp / 3600
+                )
+            """,
+                (raw_epoch, raw_epoch),
+            )
+            report.cumulative_rows_pruned = cursor.rowcount
+            cursor.execute(
+                f"""
+                DELETE FROM water_usage_cumulative
+                WHERE timestamp < ? AND timestamp NOT IN (
+                    SELECT MAX(timestamp) FROM water_usage_cumulative
+                    WHERE timestamp < ?
+                    GROUP BY {LOCAL_DAY_SQL.format(column="timestamp")}
+                )
+            """,
+                (hourly_epoch, hourly_epoch),
+            )
+            report.cumulative_rows_pruned += cursor.rowcount
+
+            # Per-minute attribution cannot be recomputed without the readings
+            cursor.execute(
+                "DELETE FROM zone_attribution WHERE minute < ?", (raw_epoch,)
+            )
+            report.attribution_rows_pruned = cursor.rowcount
+
+            self._set_metadata(cursor, self.RAW_RETENTION_CUTOFF, str(raw_epoch))
+            self._set_metadata(cursor, self.LAST_MAINTENANCE, now.isoformat())
+            conn.commit()
+
+            self._vacuum(conn, policy.vacuum_pages)
+
+        report.bytes_after = self._database_size()
+        report.bytes_reclaimed = report.bytes_before - report.bytes_after
+        report.latency_after_ms = self._probe_query_latency(now)
+        self.logger.info(
+            f"Maintenance pruned {report.readings_pruned} readings, "
+            f"{report.hourly_rows_pruned} hourly rollups and "
+            f"{report.cumulative_rows_pruned} index points; "
+            f"reclaimed {report.bytes_reclaimed} bytes"
+        )
+        return report
+
+    def maintenance_due(
+        self, interval: timedelta, now: Optional[datetime] = None
+    ) -> bool:
+        """Whether run_maintenance has not completed within the last interval."""
+        last_run = self.get_metadata(self.LAST_MAINTENANCE)
+        if last_run is None:
+            return True
+        return (now or datetime.now()) - datetime.fromisoformat(last_run) >= interval
+
+    def _vacuum(self, conn: sqlite3.Connection, pages: int) -> None:
+        """Return free pages to the filesystem.
+
+        Databases created before incremental auto-vacuum get one full VACUUM
+        to switch modes; after that only free pages are released.
+        """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.logger.info("Converting database to incremental auto-vacuum")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _database_size(self) -> int:
+        """Size of the database in bytes, excluding any unmerged WAL."""
+        with self.get_connection() as conn:
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            return page_count * page_size
+
+    def _probe_query_latency(self, now: datetime) -> Dict[str, float]:
+        """Best-of-three latency in milliseconds of typical read queries."""
+        week_start = local_day_start(now - timedelta(days=7))
+        month_ago = to_epoch(now - timedelta(days=30))
+
+        def scan(query: str) -> None:
+            with self.get_connection() as conn:
+                conn.execute(query, (month_ago,)).fetchall()
+
+        probes: Dict[str, Callable[[], Any]] = {
+            "usage_last_day": lambda: self.get_water_usage(
+                now - timedelta(days=1), now
+            ),
+            "weekly_zone_stats": lambda: self.get_weekly_zone_stats(week_start),
+            "readings_last_month": lambda: scan(
+                "SELECT COUNT(*), SUM(value) FROM water_readings "
+                "WHERE bucket = 'MIN' AND timestamp >= ?"
+            ),
+            "hourly_usage_last_month": lambda: scan(
+                "SELECT hour_start, total_gallons FROM water_usage_hourly "
+                "WHERE hour_start >= ?"
+            ),
+        }
+
+        latency = {}
+        for name, probe in probes.items():
+            timings = []
+            for _ in range(3):
+                started = timer.perf_counter()
+                probe()
+                timings.append(timer.perf_counter() - started)
+            latency[name] = round(min(timings) * 1000, 3)
+        return latency
+
+    def get_archive_cutoff(self) -> int:
+        """Epoch second before which rows have been moved to the archive."""
+        cutoff = self.get_metadata(self.ARCHIVE_CUTOFF)
+        return int(cutoff) if cutoff is not None else MIN_EPOCH
+
+    def drop_archived_rows(self, cutoff: int) -> Dict[str, int]:
+        """Delete rows dated before cutoff once the archive holds them.
+
+        Advances the archive cutoff in the same transaction, so readers never
+        see a row in both tiers. Session deletes flow through the rollup
+        triggers, per-minute zone attribution is dropped with the readings it
+        came from, and the raw retention cutoff moves up too so archived
+        readings are not ingested again.
+
+        Returns:
+            Number of rows deleted per table
+        """
+        deleted = {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for table, time_column in ARCHIVE_TIME_COLUMNS.items():
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE {time_column} < ?", (cutoff,)
+                )
+                deleted[table] = cursor.rowcount
+            cursor.execute("DELETE FROM zone_attribution WHERE minute < ?", (cutoff,))
+            deleted["zone_attribution"] = cursor.rowcount
+
+            for key in (self.ARCHIVE_CUTOFF, self.RAW_RETENTION_CUTOFF):
+                current = self._get_metadata(cursor, key)
+                if current is None or int(current) < cutoff:
+                    self._set_metadata(cursor, key, str(cutoff))
+            conn.commit()
+
+        self.logger.info(f"Dropped archived rows: {deleted}")
+        return deleted
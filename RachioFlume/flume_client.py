@@ -1,35 +1,57 @@
 """Flume API client for water consumption monitoring."""
 
+import base64
+import heapq
+import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 import requests
 from pydantic import BaseModel
 
+from http_utils import PooledSession, send_with_retries
 from logger import get_logger
+from models import Device, WaterReading
+from rate_limiter import ApiRateLimiter
 
 
-class WaterReading(BaseModel):
-    """Water consumption reading."""
+class UsageQuery(BaseModel):
+    """One query in a batched Flume usage request."""
 
-    timestamp: datetime
-    value: float  # gallons consumed
-    unit: str = "GAL"
+    request_id: str
+    since: datetime
+    until: datetime
+    bucket: str = "MIN"  # MIN, HR, DAY, MON, YR
 
-
-class Device(BaseModel):
-    """Flume device model."""
-
-    id: str
-    name: str
-    location: Optional[str] = None
-    active: bool = True
+    def to_payload(self) -> Dict[str, Any]:
+        """Query entry for the Flume API's queries array."""
+        return {
+            "request_id": self.request_id,
+            "bucket": self.bucket,
+            "since_datetime": self.since.strftime("%Y-%m-%d %H:%M:%S"),
+            "until_datetime": self.until.strftime("%Y-%m-%d %H:%M:%S"),
+        }
 
 
 class FlumeClient:
     """Client for Flume water monitoring API."""
 
     BASE_URL = "https://api.flumetech.com"
+    TOKEN_URL = "https://api.flumewater.com/oauth/token"
+
+    # Tokens are refreshed this many seconds before they expire
+    TOKEN_REFRESH_MARGIN = 300
+    # Assumed lifetime when the token response gives no expiry
+    DEFAULT_TOKEN_LIFETIME = 3600
+    DEFAULT_TOKEN_CACHE = os.path.join(
+        "~", ".cache", "rachio_flume", "flume_token.json"
+    )
+
+    # Queries packed into one POST to a device's query endpoint
+    MAX_QUERIES_PER_REQUEST = 10
 
     def __init__(
         self,
@@ -37,6 +59,10 @@ class FlumeClient:
         client_secret: Optional[str] = None,
         username: Optional[str] = None,
         password: Optional[str] = None,
+        max_concurrent_queries: int = 4,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[ApiRateLimiter] = None,
+        token_cache_path: Optional[str] = None,
     ):
         """Initialize Flume client.
 
@@ -45,10 +71,16 @@ class FlumeClient:
             client_secret: OAuth client secret (defaults to FLUME_CLIENT_SECRET env var)
             username: Flume email address (defaults to FLUME_USER_EMAIL env var)
             password: Flume password (defaults to FLUME_PASSWORD env var)
+            max_concurrent_queries: Most device usage queries in flight at once
+            session: HTTP session to share (defaults to a new PooledSession)
+            rate_limiter: Budget every API call is counted against (defaults
+                to an uncapped one counted in this process only)
+            token_cache_path: File caching OAuth tokens between runs (defaults
+                to FLUME_TOKEN_CACHE env var, then DEFAULT_TOKEN_CACHE)
         """
         # Setup logging first
         self.logger = get_logger(__name__)
-        
+
         # OAuth credentials
         self.client_id = client_id or os.getenv("FLUME_CLIENT_ID")
         self.client_secret = client_secret or os.getenv("FLUME_CLIENT_SECRET")
@@ -60,45 +92,193 @@ class FlumeClient:
                 "All OAuth credentials (client_id, client_secret, username, password) are required"
             )
 
-        self.access_token = self._get_access_token()
+        # Keep-alive connection pool with timeouts and retries
+        self.session = session or PooledSession(
+            pool_maxsize=max(10, max_concurrent_queries)
+        )
+        self.rate_limiter = rate_limiter or ApiRateLimiter("flume")
 
-        self.headers = {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json",
-        }
+        # OAuth tokens, reused across runs through the on-disk cache
+        self.token_cache_path = os.path.expanduser(
+            token_cache_path
+            or os.getenv("FLUME_TOKEN_CACHE")
+            or self.DEFAULT_TOKEN_CACHE
+        )
+        self._token: Dict[str, Any] = {}
+        self._token_lock = threading.Lock()
+        self._authorize(self._get_access_token())
 
         # Cache for device info
         self._devices: Optional[List[Device]] = None
 
-    def _get_access_token(self) -> str:
-        """Get access token using OAuth2 Resource Owner Credentials Grant."""
-        self.logger.info("Authenticating with Flume API using OAuth2")
-        url = "https://api.flumewater.com/oauth/token"
-
-        payload = {
-            "grant_type": "password",
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "email": self.username,  # Flume API expects email field, not username
-            "password": self.password,
-        }
+        self.max_concurrent_queries = max(1, max_concurrent_queries)
+
+    def _get_access_token(self, force_refresh: bool = False) -> str:
+        """Get a valid access token, authenticating only when needed.
 
+        A token still valid beyond TOKEN_REFRESH_MARGIN is reused from memory
+        or the token cache file. Otherwise the refresh token is exchanged, with
+        the password grant as the fallback, and the result is cached.
+
+        Args:
+            force_refresh: Skip cached access tokens (e.g. after a 401)
+        """
+        if not force_refresh:
+            cached = self._token or self._load_cached_token()
+            if cached and not self._token_expiring(cached):
+                self._token = cached
+                return cached["access_token"]
+
+        previous = self._token or self._load_cached_token()
+        token: Optional[Dict[str, Any]] = None
+        if previous.get("refresh_token"):
+            try:
+                token = self._request_token(
+                    {
+                        "grant_type": "refresh_token",
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "refresh_token": previous["refresh_token"],
+                    }
+                )
+            except requests.RequestException as e:
+                self.logger.warning(f"Flume token refresh failed, signing in: {e}")
+
+        if token is None:
+            self.logger.info("Authenticating with Flume API using OAuth2")
+            token = self._request_token(
+                {
+                    "grant_type": "password",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    # Flume API expects email field, not username
+                    "email": self.username,
+                    "password": self.password,
+                }
+            )
+
+        self._token = token
+        self._save_cached_token(token)
+        return token["access_token"]
+
+    def _request_token(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one OAuth2 grant and return the token with its expiry time."""
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
 
         try:
-            response = requests.post(url, data=payload, headers=headers)
+            self.rate_limiter.acquire()
+            response = self.session.post(self.TOKEN_URL, data=payload, headers=headers)
             response.raise_for_status()
 
-            token_data = response.json()
+            # Tokens arrive either bare or wrapped as {"data": [token]}
+            body = response.json()
+            token_data = body["data"][0] if body.get("data") else body
             self.logger.info("Successfully obtained access token from Flume API")
-            return token_data["access_token"]
         except requests.RequestException as e:
             self.logger.error(f"Failed to authenticate with Flume API: {e}")
-            if hasattr(e, 'response') and e.response is not None:
+            if hasattr(e, "response") and e.response is not None:
                 self.logger.error(f"Response status: {e.response.status_code}")
                 self.logger.error(f"Response body: {e.response.text}")
             raise
 
+        access_token = token_data["access_token"]
+        expires_in = token_data.get("expires_in")
+        expires_at = (
+            time.time() + float(expires_in)
+            if expires_in
+            else self._jwt_expiry(access_token)
+        )
+        return {
+            "access_token": access_token,
+            "refresh_token": token_data.get(
+                "refresh_token", payload.get("refresh_token")
+            ),
+            "expires_at": expires_at,
+        }
+
+    def _jwt_expiry(self, access_token: str) -> float:
+        """Expiry claim of a JWT access token, or DEFAULT_TOKEN_LIFETIME from now."""
+        try:
+            claims = access_token.split(".")[1]
+            claims += "=" * (-len(claims) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(claims))["exp"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            return time.time() + self.DEFAULT_TOKEN_LIFETIME
+
+    def _token_expiring(self, token: Dict[str, Any]) -> bool:
+        """Whether a token expires within TOKEN_REFRESH_MARGIN."""
+        return time.time() >= token["expires_at"] - self.TOKEN_REFRESH_MARGIN
+
+    def _load_cached_token(self) -> Dict[str, Any]:
+        """Token cached on disk for these credentials, or {} if none."""
+        try:
+            with open(self.token_cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if cached.get("client_id") != self.client_id or (
+            cached.get("username") != self.username
+        ):
+            return {}
+        return {
+            key: cached.get(key)
+            for key in ("access_token", "refresh_token", "expires_at")
+        }
+
+    def _save_cached_token(self, token: Dict[str, Any]) -> None:
+        """Write the token cache atomically, readable by the owner only."""
+        cached = dict(token, client_id=self.client_id, username=self.username)
+        temp_path = f"{self.token_cache_path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.token_cache_path) or ".", exist_ok=True)
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(cached, f)
+            os.replace(temp_path, self.token_cache_path)
+        except OSError as e:
+            # Caching is an optimization; carry on with the in-memory token
+            self.logger.warning(f"Could not cache Flume token: {e}")
+
+    def _authorize(self, access_token: str) -> None:
+        """Use an access token for subsequent API requests."""
+        self.access_token = access_token
+        self.headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+        }
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send an authorized API request.
+
+        Tokens close to expiry are refreshed first, and a 401 (token revoked
+        or expired early) is retried once with a fresh token. Threads that
+        get a 401 for the same token refresh it only once between them. 429
+        and 5xx responses are retried with backoff, each attempt counted
+        against the rate limiter.
+        """
+        with self._token_lock:
+            if self._token and self._token_expiring(self._token):
+                self._authorize(self._get_access_token())
+            headers = self.headers
+
+        send = self.session.get if method == "GET" else self.session.post
+        response = send_with_retries(
+            lambda: send(url, headers=headers, **kwargs), self.rate_limiter.acquire
+        )
+        if response.status_code == 401:
+            with self._token_lock:
+                # Another thread may have replaced the rejected token already
+                if self.headers is headers:
+                    self.logger.info("Flume API returned 401, refreshing access token")
+                    self._authorize(self._get_access_token(force_refresh=True))
+                headers = self.headers
+            response = send_with_retries(
+                lambda: send(url, headers=headers, **kwargs),
+                self.rate_limiter.acquire,
+            )
+        return response
+
     def get_devices(self) -> List[Device]:
         """Get all devices for the authenticated user."""
         if self._devices is not None:
@@ -106,7 +286,7 @@ class FlumeClient:
             return self._devices
 
         url = f"{self.BASE_URL}/users/me/devices"
-        response = requests.get(url, headers=self.headers)
+        response = self._request("GET", url)
         response.raise_for_status()
 
         devices_data = response.json()
@@ -148,74 +328,216 @@ class FlumeClient:
         Returns:
             List of water readings from all devices
         """
+        self.logger.info(
+            f"Querying {bucket} usage data for period {start_time} to {end_time}"
+        )
+        query = UsageQuery(
+            request_id="usage", since=start_time, until=end_time, bucket=bucket
+        )
+        all_readings = self.query_usage([query])["usage"]
+        self.logger.info(
+            f"Retrieved {len(all_readings)} total water readings across all devices"
+        )
+        return all_readings
+
+    def get_usage_windows(
+        self,
+        windows: List[Tuple[datetime, datetime]],
+        bucket: str = "MIN",
+        strict: bool = False,
+    ) -> List[WaterReading]:
+        """Get water usage for several time windows in batched requests.
+
+        Up to MAX_QUERIES_PER_REQUEST windows share one POST per device.
+
+        Args:
+            windows: (start, end) pairs, non-overlapping
+            bucket: Time bucket size (MIN, HR, DAY, MON, YR)
+            strict: Raise request errors instead of skipping the device
+
+        Returns:
+            Water readings from all windows and devices, in time order
+        """
+        queries = [
+            UsageQuery(
+                request_id=f"window_{index}", since=start, until=end, bucket=bucket
+            )
+            for index, (start, end) in enumerate(windows)
+        ]
+        results = self.query_usage(queries, strict=strict)
+        return list(
+            heapq.merge(
+                *(results[query.request_id] for query in queries),
+                key=lambda reading: reading.timestamp,
+            )
+        )
+
+    def query_usage(
+        self, queries: List[UsageQuery], strict: bool = False
+    ) -> Dict[str, List[WaterReading]]:
+        """Run usage queries across all devices with as few POSTs as possible.
+
+        Queries are packed MAX_QUERIES_PER_REQUEST at a time into one request
+        per device, the requests run concurrently up to max_concurrent_queries,
+        and each response is split back out by request_id.
+
+        Args:
+            queries: Queries with unique request_ids
+            strict: Raise request errors instead of skipping the device
+
+        Returns:
+            Time-ordered readings from all devices, keyed by request_id
+        """
+        request_ids = [query.request_id for query in queries]
+        if len(set(request_ids)) != len(request_ids):
+            raise ValueError("Batched usage queries need unique request_ids")
+
         devices = self.get_devices()
         if not devices:
             raise ValueError("No Flume devices found for this account")
 
-        all_readings = []
+        batches = [
+            queries[index : index + self.MAX_QUERIES_PER_REQUEST]
+            for index in range(0, len(queries), self.MAX_QUERIES_PER_REQUEST)
+        ]
+        jobs = [(device, batch) for device in devices for batch in batches]
+        self.logger.debug(
+            f"Sending {len(queries)} usage queries to {len(devices)} devices "
+            f"in {len(jobs)} requests"
+        )
 
-        # Format datetimes for Flume API
-        start_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
-        end_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
+        def run(job: Tuple[Device, List[UsageQuery]]) -> Dict[str, List[WaterReading]]:
+            return self._post_queries(*job, strict=strict)
+
+        # Fan out the requests, capped at max_concurrent_queries
+        workers = min(self.max_concurrent_queries, len(jobs))
+        if workers <= 1:
+            job_results = [run(job) for job in jobs]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="flume-query"
+            ) as executor:
+                job_results = list(executor.map(run, jobs))
+
+        per_query: Dict[str, List[List[WaterReading]]] = {
+            request_id: [] for request_id in request_ids
+        }
+        for job_result in job_results:
+            for request_id, readings in job_result.items():
+                per_query[request_id].append(readings)
+
+        # Each device's readings are time-ordered, so a k-way merge suffices
+        return {
+            request_id: list(
+                heapq.merge(*device_readings, key=lambda reading: reading.timestamp)
+            )
+            for request_id, device_readings in per_query.items()
+        }
 
-        self.logger.info(
-            f"Querying usage data from {len(devices)} devices for period {start_str} to {end_str}"
-        )
+    def _post_queries(
+        self, device: Device, queries: List[UsageQuery], strict: bool = False
+    ) -> Dict[str, List[WaterReading]]:
+        """Send one batched query request to a device and split the response.
 
-        for device in devices:
-            url = f"{self.BASE_URL}/users/me/devices/{device.id}/query"
+        Unless strict, errors are logged and yield no readings, so one failing
+        device does not lose the others' data.
 
-            payload = {
-                "queries": [
-                    {
-                        "request_id": f"query_{device.id}_{int(datetime.now().timestamp())}",
-                        "bucket": bucket,
-                        "since_datetime": start_str,
-                        "until_datetime": end_str,
-                    }
-                ]
-            }
+        Returns:
+            Time-ordered readings for each query, keyed by request_id
+        """
+        url = f"{self.BASE_URL}/users/me/devices/{device.id}/query"
+        payload = {"queries": [query.to_payload() for query in queries]}
+        by_id = {query.request_id: query for query in queries}
+        results: Dict[str, List[WaterReading]] = {
+            request_id: [] for request_id in by_id
+        }
 
-            try:
-                response = requests.post(url, json=payload, headers=self.headers)
-                response.raise_for_status()
+        try:
+            response = self._request("POST", url, json=payload)
+            response.raise_for_status()
 
-                data = response.json()
+            data = response.json()
 
-                # Parse response - structure may vary based on Flume API
-                for query_result in data.get("data", []):
-                    for reading in query_result.get("data", []):
-                        timestamp = datetime.fromisoformat(
-                            reading["datetime"].replace("Z", "+00:00")
+            # Results are keyed by request_id; a bare {"data": [...]} entry is
+            # matched to the query at the same position
+            for position, query_result in enumerate(data.get("data", [])):
+                if "data" in query_result:
+                    if position < len(queries):
+                        query = queries[position]
+                        results[query.request_id] = self._parse_readings(
+                            query_result["data"], device, query.bucket
                         )
-                        value = float(reading["value"])
+                    continue
 
-                        all_readings.append(
-                            WaterReading(timestamp=timestamp, value=value)
+                for request_id, rows in query_result.items():
+                    if request_id in by_id:
+                        results[request_id] = self._parse_readings(
+                            rows, device, by_id[request_id].bucket
                         )
 
-            except requests.RequestException as e:
-                # Log error but continue with other devices
-                self.logger.error(
-                    f"Failed to get usage for device {device.name} ({device.id}): {e}"
-                )
-                continue
+        except requests.RequestException as e:
+            # Log error but continue with other devices
+            self.logger.error(
+                f"Failed to get usage for device {device.name} ({device.id}): {e}"
+            )
+            if strict:
+                raise
+            return {}
 
-        # Sort readings by timestamp
-        all_readings.sort(key=lambda x: x.timestamp)
-        self.logger.info(
-            f"Retrieved {len(all_readings)} total water readings across all devices"
-        )
-        return all_readings
+        return results
+
+    def _parse_readings(
+        self, rows: List[Dict[str, Any]], device: Device, bucket: str
+    ) -> List[WaterReading]:
+        """Convert one query's result rows to readings in timestamp order."""
+        readings = [
+            WaterReading(
+                timestamp=datetime.fromisoformat(
+                    row["datetime"].replace("Z", "+00:00")
+                ),
+                value=float(row["value"]),
+                device_id=device.id,
+                bucket=bucket,
+            )
+            for row in rows
+        ]
+
+        # The API returns time-ordered results; only sort if it ever does not
+        if any(
+            later.timestamp < earlier.timestamp
+            for earlier, later in zip(readings, readings[1:])
+        ):
+            readings.sort(key=lambda reading: reading.timestamp)
+        return readings
 
     def get_current_usage_rate(self) -> Optional[float]:
         """Get current water usage rate across all devices in gallons per minute."""
-        # Get usage for last 5 minutes
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=5)
+        return self.get_usage_snapshot()["current_usage_rate_gpm"]
 
-        readings = self.get_usage(start_time, end_time, bucket="MIN")
+    def get_usage_snapshot(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Current flow rate and usage so far today in one request per device.
 
+        Returns:
+            Dict with current_usage_rate_gpm (None without recent readings)
+            and today_usage_gallons
+        """
+        now = now or datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        results = self.query_usage(
+            [
+                UsageQuery(
+                    request_id="rate", since=now - timedelta(minutes=5), until=now
+                ),
+                UsageQuery(request_id="today", since=midnight, until=now, bucket="HR"),
+            ]
+        )
+        return {
+            "current_usage_rate_gpm": self._usage_rate(results["rate"]),
+            "today_usage_gallons": sum(r.value for r in results["today"]),
+        }
+
+    def _usage_rate(self, readings: List[WaterReading]) -> Optional[float]:
+        """Average gallons per minute over a run of minute readings."""
         if not readings:
             return None
 
@@ -241,9 +563,13 @@ class FlumeClient:
     def get_daily_usage(self, date: datetime) -> List[WaterReading]:
         """Get hourly water usage for a specific day across all devices."""
         start_time = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_time = start_time + timedelta(days=1)
-
-        return self.get_usage(start_time, end_time, bucket="HR")
+        query = UsageQuery(
+            request_id="day",
+            since=start_time,
+            until=start_time + timedelta(days=1),
+            bucket="HR",
+        )
+        return self.query_usage([query])["day"]
 
     def get_recent_usage(self, hours: int = 24) -> List[WaterReading]:
         """Get water usage from the last N hours across all devices."""
@@ -0,0 +1,207 @@
+"""Pooled HTTP sessions with timeouts, retries and latency tracking."""
+
+import bisect
+import email.utils
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeout in seconds
+Timeout = Union[float, Tuple[float, float]]
+
+# Throttled or transiently failing responses worth sending again
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def send_with_retries(
+    send: Callable[[], requests.Response],
+    acquire: Callable[[], Any],
+    retries: int = 3,
+    backoff_factor: float = 0.5,
+    max_delay: float = 120.0,
+) -> requests.Response:
+    """Send a request, retrying 429 and 5xx responses with exponential backoff.
+
+    acquire runs before every attempt, so each retry is counted against the
+    caller's rate limiter. A Retry-After header overrides the backoff delay.
+
+    Args:
+        send: Sends the request once
+        acquire: Takes one call from the caller's budget
+        retries: Retries after the first attempt
+        backoff_factor: Base of the exponential backoff in seconds
+        max_delay: Longest wait between attempts in seconds
+
+    Returns:
+        The first response not retried, or the last one once retries run out
+    """
+    attempt = 0
+    while True:
+        acquire()
+        response = send()
+        if response.status_code not in RETRY_STATUSES or attempt >= retries:
+            return response
+
+        delay = _retry_after(response)
+        if delay is None:
+            delay = backoff_factor * 2**attempt
+        response.close()
+        time.sleep(min(delay, max_delay))
+        attempt += 1
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    """Seconds a Retry-After header asks to wait, or None without one."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class LatencyHistogram:
+    """Request latencies counted in fixed millisecond buckets."""
+
+    BUCKET_BOUNDS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(self.BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one request latency."""
+        elapsed_ms = seconds * 1000
+        with self._lock:
+            self.counts[bisect.bisect_left(self.BUCKET_BOUNDS_MS, elapsed_ms)] += 1
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound in milliseconds of the bucket holding a percentile."""
+        with self._lock:
+            if not self.count:
+                return 0.0
+
+            rank = fraction * self.count
+            seen = 0
+            for bound, bucket_count in zip(self.BUCKET_BOUNDS_MS, self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return float(min(bound, self.max_ms))
+            return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, p50/p95 estimates, max and per-bucket counts."""
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in self.BUCKET_BOUNDS_MS]
+            labels.append(f">{self.BUCKET_BOUNDS_MS[-1]}ms")
+            return {
+                "count": self.count,
+                "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+                "p50_ms": p50,
+                "p95_ms": p95,
+                "max_ms": round(self.max_ms, 1),
+                "buckets": dict(zip(labels, self.counts)),
+            }
+
+
+class PooledSession(requests.Session):
+    """Keep-alive session with bounded pools, retries and latency histograms.
+
+    Requests without an explicit timeout get the session default.
+    Connection failures are retried here with exponential backoff, since
+    those requests never reached the API. 429 and 5xx responses are retried
+    by the clients through send_with_retries, so each attempt is counted
+    against their rate limiter. Latency is recorded per method and URL path.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 10,
+        timeout: Timeout = (3.05, 30.0),
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+    ):
+        """Initialize the session.
+
+        Args:
+            pool_connections: Hosts to keep connection pools for
+            pool_maxsize: Connections kept alive per host
+            timeout: Default (connect, read) timeout in seconds
+            retries: Retries per request on connection errors
+            backoff_factor: Base of the exponential backoff in seconds
+        """
+        super().__init__()
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            allowed_methods=None,  # Usage queries are POSTs but read-only
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self._latency_lock = threading.Lock()
+        self.latency: Dict[str, LatencyHistogram] = {}
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send a request with the default timeout, recording its latency."""
+        kwargs.setdefault("timeout", self.timeout)
+        started = time.perf_counter()
+        try:
+            return super().request(method, url, **kwargs)
+        finally:
+            self._histogram(method, url).observe(time.perf_counter() - started)
+
+    def latency_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Latency summary per endpoint, keyed by "METHOD host/path"."""
+        with self._latency_lock:
+            histograms = dict(self.latency)
+        return {
+            endpoint: histogram.summary()
+            for endpoint, histogram in sorted(histograms.items())
+        }
+
+    def _histogram(self, method: str, url: str) -> LatencyHistogram:
+        """Get or create the histogram for an endpoint."""
+        parts = urlsplit(url)
+        endpoint = f"{method.upper()} {parts.netloc}{parts.path}"
+        with self._latency_lock:
+            histogram = self.latency.get(endpoint)
+            if histogram is None:
+                histogram = self.latency[endpoint] = LatencyHistogram()
+            return histogram
@@ -1,15 +1,50 @@
 #!/usr/bin/env python3
 """Main entry point for Rachio-Flume water tracking integration."""
 
-import asyncio
 import argparse
 import sys
-
-from collector import WaterTrackingCollector
+from datetime import datetime, timedelta
+from typing import Tuple
+
+# Only database-backed modules are imported up front; the API clients (and
+# requests), asyncio and pyarrow load inside the commands that use them, so
+# report and status start without network I/O or heavy imports
+from data_storage import RetentionPolicy, WaterTrackingDB
+from rate_limiter import ApiRateLimiter
 from reporter import WeeklyReporter
 from logger import WaterTrackingLogger, get_logger
 
 
+def parse_week_range(value: str) -> Tuple[datetime, datetime]:
+    """Parse "START..END" months or dates into a [start, end) range.
+
+    Each side is YYYY-MM or YYYY-MM-DD, and the end is inclusive: a month
+    covers the whole month and a date the whole day. A single value covers
+    just that month or day.
+    """
+
+    def parse(side: str, end: bool) -> datetime:
+        try:
+            if len(side) == 7:
+                start = datetime.strptime(side, "%Y-%m")
+                if not end:
+                    return start
+                month_index = start.year * 12 + start.month
+                return datetime(month_index // 12, month_index % 12 + 1, 1)
+            day = datetime.strptime(side, "%Y-%m-%d")
+            return day + timedelta(days=1) if end else day
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"invalid week range {value!r}: use YYYY-MM[-DD][..YYYY-MM[-DD]]"
+            )
+
+    first, _, last = value.partition("..")
+    start, end = parse(first, False), parse(last or first, True)
+    if end <= start:
+        raise argparse.ArgumentTypeError(f"week range {value!r} is empty")
+    return start, end
+
+
 def main():
     """Main entry point with command line interface."""
     # Setup logging first
@@ -38,12 +73,23 @@ def main():
         default=300,
         help="Collection interval in seconds (default: 300)",
     )
+    collect_parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Poll as often as the daily API budgets allow instead of --interval",
+    )
     collect_parser.add_argument(
         "--db", default="water_tracking.db", help="Database file path"
     )
 
     # Status command
     status_parser = subparsers.add_parser("status", help="Show current system status")
+    status_parser.add_argument(
+        "--live",
+        action="store_true",
+        help="Query the APIs for the active zone and flow rate instead of "
+        "answering from the database",
+    )
     status_parser.add_argument(
         "--db", default="water_tracking.db", help="Database file path"
     )
@@ -60,10 +106,145 @@ def main():
     report_group.add_argument(
         "--efficiency", action="store_true", help="Generate efficiency analysis"
     )
+    report_group.add_argument(
+        "--weeks",
+        type=parse_week_range,
+        metavar="START..END",
+        help="Save a report for every week in a range of months or dates "
+        "(e.g. 2024-01..2024-12)",
+    )
     report_parser.add_argument(
         "--save", action="store_true", help="Save report to file"
     )
     report_parser.add_argument(
+        "--output-dir",
+        default=".",
+        help="Directory for --weeks report files (default: current directory)",
+    )
+    report_parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="Worker processes for --weeks (default: 1)",
+    )
+    report_parser.add_argument(
+        "--db", default="water_tracking.db", help="Database file path"
+    )
+    report_parser.add_argument(
+        "--archive-dir", help="Parquet archive to include in reports"
+    )
+    report_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompute reports instead of serving them from the report cache",
+    )
+
+    # Maintenance command
+    maintenance_parser = subparsers.add_parser(
+        "maintenance", help="Apply data retention and compact the database"
+    )
+    maintenance_parser.add_argument(
+        "--raw-days",
+        type=int,
+        default=30,
+        help="Days of minute readings to keep (default: 30)",
+    )
+    maintenance_parser.add_argument(
+        "--hourly-days",
+        type=int,
+        default=365,
+        help="Days of hourly rollups to keep (default: 365)",
+    )
+    maintenance_parser.add_argument(
+        "--vacuum-pages",
+        type=int,
+        default=0,
+        help="Free pages to release, 0 for all (default: 0)",
+    )
+    maintenance_parser.add_argument(
+        "--clear-report-cache",
+        action="store_true",
+        help="Drop every cached report before compacting",
+    )
+    maintenance_parser.add_argument(
+        "--db", default="water_tracking.db", help="Database file path"
+    )
+
+    # Archive command
+    archive_parser = subparsers.add_parser(
+        "archive", help="Move older months to the Parquet archive"
+    )
+    archive_parser.add_argument(
+        "--keep-months",
+        type=int,
+        default=3,
+        help="Whole months to keep in SQLite besides the current one (default: 3)",
+    )
+    archive_parser.add_argument(
+        "--archive-dir", default="archive", help="Parquet archive directory"
+    )
+    archive_parser.add_argument(
+        "--db", default="water_tracking.db", help="Database file path"
+    )
+
+    # Backfill command
+    backfill_parser = subparsers.add_parser(
+        "backfill", help="Fetch historical data in resumable windows"
+    )
+    backfill_parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        required=True,
+        help="Start of the history to fetch (YYYY-MM-DD)",
+    )
+    backfill_parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="End of the history to fetch (default: now)",
+    )
+    backfill_parser.add_argument(
+        "--source",
+        choices=["all", "rachio", "flume"],
+        default="all",
+        help="API to backfill (default: all)",
+    )
+    backfill_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Requests in flight per API (default: 4)",
+    )
+    backfill_parser.add_argument(
+        "--rachio-rpm",
+        type=float,
+        default=1.0,
+        help="Rachio requests per minute (default: 1)",
+    )
+    backfill_parser.add_argument(
+        "--flume-rpm",
+        type=float,
+        default=2.0,
+        help="Flume requests per minute (default: 2)",
+    )
+    backfill_parser.add_argument(
+        "--db", default="water_tracking.db", help="Database file path"
+    )
+
+    # Attribute command
+    attribute_parser = subparsers.add_parser(
+        "attribute", help="Split metered usage among concurrently running zones"
+    )
+    attribute_parser.add_argument(
+        "--since",
+        type=datetime.fromisoformat,
+        help="Start of the range (default: minutes touched since the last run)",
+    )
+    attribute_parser.add_argument(
+        "--until",
+        type=datetime.fromisoformat,
+        help="End of the range (default: the last reading)",
+    )
+    attribute_parser.add_argument(
         "--db", default="water_tracking.db", help="Database file path"
     )
 
@@ -79,19 +260,39 @@ def main():
         return show_status(args)
     elif args.command == "report":
         return generate_report(args)
+    elif args.command == "maintenance":
+        return run_maintenance(args)
+    elif args.command == "archive":
+        return run_archive(args)
+    elif args.command == "backfill":
+        return run_backfill(args)
+    elif args.command == "attribute":
+        return run_attribution(args)
 
     return 0
 
 
 def run_collection(args):
     """Run data collection."""
+    import asyncio
+
+    from collector import WaterTrackingCollector
+
     try:
-        collector = WaterTrackingCollector(args.db, args.interval)
+        collector = WaterTrackingCollector(
+            args.db, args.interval, adaptive_polling=args.adaptive
+        )
 
         if args.once:
             print("Running single data collection cycle...")
             asyncio.run(collector.collect_once())
-            print("Collection completed.")
+            timings = collector.last_cycle_timings
+            print(
+                f"Collection completed in {timings['cycle']:.2f}s "
+                f"(Rachio {timings['rachio']:.2f}s, Flume {timings['flume']:.2f}s, "
+                f"both APIs {timings['collect']:.2f}s)."
+            )
+            collector.close()
         elif args.continuous:
             print(f"Starting continuous collection every {args.interval} seconds...")
             print("Press Ctrl+C to stop.")
@@ -110,8 +311,20 @@ def run_collection(args):
 def show_status(args):
     """Show current system status."""
     try:
-        collector = WaterTrackingCollector(args.db)
-        status = collector.get_current_status()
+        if args.live:
+            from collector import WaterTrackingCollector
+
+            collector = WaterTrackingCollector(args.db)
+            status = collector.get_current_status()
+            collector.close()
+        else:
+            db = WaterTrackingDB(args.db)
+            status = db.get_status()
+            status["api_budget"] = {
+                api: ApiRateLimiter(api, store=db).budget_summary()
+                for api in ("rachio", "flume")
+            }
+            db.close()
 
         print("\\n" + "=" * 50)
         print("WATER TRACKING SYSTEM STATUS")
@@ -134,8 +347,17 @@ def show_status(args):
         else:
             print("Current Usage Rate: Not available")
 
+        print(f"Water Used Today: {status['today_usage_gallons']:.1f} gallons")
+
         print(f"Recent Sessions (24h): {status['recent_sessions_count']}")
 
+        alerts = status.get("recent_alerts", [])
+        print(f"Alerts (24h): {len(alerts)}")
+        for alert in alerts:
+            print(
+                f"  {datetime.fromtimestamp(alert['detected_at'])}: {alert['message']}"
+            )
+
         if status["last_rachio_collection"]:
             print(f"Last Rachio Collection: {status['last_rachio_collection']}")
         else:
@@ -146,6 +368,16 @@ def show_status(args):
         else:
             print("Last Flume Collection: Never")
 
+        for api, budget in status["api_budget"].items():
+            if budget["daily_budget"] is None:
+                print(f"{api.title()} API Calls Today: {budget['calls_today']}")
+            else:
+                print(
+                    f"{api.title()} API Calls Today: {budget['calls_today']}"
+                    f"/{budget['daily_budget']} "
+                    f"({budget['remaining_today']} remaining)"
+                )
+
         print("=" * 50 + "\\n")
         return 0
 
@@ -157,7 +389,9 @@ def show_status(args):
 def generate_report(args):
     """Generate reports."""
     try:
-        reporter = WeeklyReporter(args.db)
+        reporter = WeeklyReporter(
+            args.db, args.archive_dir, use_cache=not args.no_cache
+        )
 
         if args.current_week:
             report = reporter.generate_current_week_report()
@@ -177,6 +411,25 @@ def generate_report(args):
                 reporter.save_report_to_file(report, filename)
                 print(f"Report saved to {filename}")
 
+        elif args.weeks:
+            start, end = args.weeks
+            reports = reporter.generate_weekly_reports(start, end, args.processes)
+            filenames = reporter.save_reports_to_directory(reports, args.output_dir)
+
+            print(
+                f"{'Week':<12} {'Sessions':<9} {'Duration(h)':<12} {'Water(gal)':<12}"
+            )
+            print("-" * 45)
+            for report in reports:
+                summary = report["summary"]
+                print(
+                    f"{report['week_start'][:10]:<12} "
+                    f"{summary['total_watering_sessions']:<9} "
+                    f"{summary['total_duration_hours']:<12} "
+                    f"{summary['total_water_used_gallons']:<12}"
+                )
+            print(f"Saved {len(filenames)} reports to {args.output_dir}")
+
         elif args.efficiency:
             analysis = reporter.get_zone_efficiency_analysis()
             print("\\n" + "=" * 60)
@@ -198,6 +451,11 @@ def generate_report(args):
                 print(
                     f"  Duration per session: {data['duration_per_session_minutes']} minutes"
                 )
+                percentiles = data["flow_rate_percentiles_gpm"]
+                print(
+                    f"  Flow rate p10/p50/p90: {percentiles['p10']}/"
+                    f"{percentiles['p50']}/{percentiles['p90']} GPM"
+                )
 
             print("\\n" + "=" * 60 + "\\n")
 
@@ -208,5 +466,146 @@ def generate_report(args):
         return 1
 
 
+def run_maintenance(args):
+    """Apply the retention policy and print what it reclaimed."""
+    try:
+        db = WaterTrackingDB(args.db)
+        cleared = db.clear_report_cache() if args.clear_report_cache else None
+        report = db.run_maintenance(
+            RetentionPolicy(
+                raw_days=args.raw_days,
+                hourly_days=args.hourly_days,
+                vacuum_pages=args.vacuum_pages,
+            )
+        )
+
+        print("\n" + "=" * 50)
+        print("DATABASE MAINTENANCE")
+        print("=" * 50)
+        print(f"Raw readings kept from: {report.raw_cutoff}")
+        print(f"Hourly rollups kept from: {report.hourly_cutoff}")
+        print(f"Readings pruned: {report.readings_pruned}")
+        print(f"Hourly rollups pruned: {report.hourly_rows_pruned}")
+        print(f"Usage index points pruned: {report.cumulative_rows_pruned}")
+        print(f"Zone attribution rows pruned: {report.attribution_rows_pruned}")
+        if cleared is not None:
+            print(f"Cached reports cleared: {cleared}")
+        print(
+            f"Size: {report.bytes_before / 1024:.1f} KiB -> "
+            f"{report.bytes_after / 1024:.1f} KiB "
+            f"({report.bytes_reclaimed / 1024:.1f} KiB reclaimed)"
+        )
+        print("Query latency (ms, before -> after):")
+        for name, before in report.latency_before_ms.items():
+            after = report.latency_after_ms.get(name, 0.0)
+            print(f"  {name}: {before:.3f} -> {after:.3f}")
+        print("=" * 50 + "\n")
+        return 0
+
+    except Exception as e:
+        print(f"Error running maintenance: {e}")
+        return 1
+
+
+def run_archive(args):
+    """Move months older than the hot window into the Parquet archive."""
+    from archive import ParquetArchive, month_start
+
+    try:
+        db = WaterTrackingDB(args.db)
+        archive = ParquetArchive(args.archive_dir)
+        before = month_start(datetime.now(), -args.keep_months)
+
+        print(f"Archiving data before {before.date()} to {args.archive_dir}...")
+        archived = archive.archive_before(db, before)
+        for table, count in archived.items():
+            print(f"  {table}: {count} rows")
+        return 0
+
+    except Exception as e:
+        print(f"Error archiving data: {e}")
+        return 1
+
+
+def run_backfill(args):
+    """Fetch history from the APIs, resuming any interrupted run."""
+    from backfill import BackfillEngine
+    from flume_client import FlumeClient
+    from http_utils import PooledSession
+    from rachio_client import RachioClient
+
+    try:
+        db = WaterTrackingDB(args.db)
+        http = PooledSession(pool_maxsize=args.concurrency + 4)
+
+        # Backfill calls count against the same daily budgets as the collector
+        def limiter(api: str, requests_per_minute: float) -> ApiRateLimiter:
+            return ApiRateLimiter(
+                api, rate=requests_per_minute / 60, burst=args.concurrency, store=db
+            )
+
+        engine = BackfillEngine(
+            db,
+            rachio_client=(
+                RachioClient(
+                    session=http, rate_limiter=limiter("rachio", args.rachio_rpm)
+                )
+                if args.source in ("all", "rachio")
+                else None
+            ),
+            flume_client=(
+                FlumeClient(
+                    max_concurrent_queries=args.concurrency,
+                    session=http,
+                    rate_limiter=limiter("flume", args.flume_rpm),
+                )
+                if args.source in ("all", "flume")
+                else None
+            ),
+            max_concurrency=args.concurrency,
+        )
+
+        print(f"Backfilling {args.source} data since {args.since}...")
+        for result in engine.run(args.since, args.until):
+            resumed = (
+                f" (resumed from {result.resumed_from})" if result.resumed_from else ""
+            )
+            print(
+                f"  {result.source}: {result.inserted} rows inserted, "
+                f"{result.skipped} skipped, {result.requests} requests{resumed}"
+            )
+        http.close()
+        db.close()
+        return 0
+
+    except KeyboardInterrupt:
+        print("\nBackfill interrupted; run again to resume.")
+        return 1
+    except Exception as e:
+        print(f"Error during backfill: {e}")
+        return 1
+
+
+def run_attribution(args):
+    """Attribute minute usage to zones and refresh the sessions' totals."""
+    from attribution import AttributionEngine
+
+    try:
+        db = WaterTrackingDB(args.db)
+        result = AttributionEngine(db).run(args.since, args.until)
+
+        print(f"Attributed water from {result.start} to {result.end}:")
+        print(f"  Minutes walked: {result.minutes}")
+        print(f"  Irrigated minutes: {result.irrigated_minutes}")
+        print(f"  Attributed to zones: {result.attributed_gallons:.1f} gallons")
+        print(f"  Household baseline: {result.household_gallons:.1f} gallons")
+        print(f"  Sessions updated: {result.sessions_updated}")
+        return 0
+
+    except Exception as e:
+        print(f"Error attributing water usage: {e}")
+        return 1
+
+
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,61 @@
+"""Data models shared by the API clients, storage and reporting.
+
+Kept free of HTTP dependencies so database-only code paths can import them
+without loading the API clients.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class Zone(BaseModel):
+    """Rachio zone model."""
+
+    id: str
+    zone_number: int
+    name: str
+    enabled: bool
+
+
+class WateringEvent(BaseModel):
+    """Rachio watering event model."""
+
+    event_date: datetime
+    zone_name: str
+    zone_number: int
+    event_type: str  # ZONE_STARTED, ZONE_COMPLETED, ZONE_STOPPED
+    duration_seconds: Optional[int] = None
+
+
+class WaterReading(BaseModel):
+    """Water consumption reading."""
+
+    timestamp: datetime
+    value: float  # gallons consumed
+    unit: str = "GAL"
+    device_id: str = ""
+    bucket: str = "MIN"
+
+
+class Device(BaseModel):
+    """Flume device model."""
+
+    id: str
+    name: str
+    location: Optional[str] = None
+    active: bool = True
+
+
+class FlowAlert(BaseModel):
+    """Anomalous flow flagged while readings are ingested."""
+
+    alert_type: str  # leak, broken_head
+    start_time: datetime  # first minute of the anomalous run
+    detected_at: datetime  # minute that confirmed it
+    zone_number: Optional[int] = None  # None for flow with no zone running
+    zone_name: Optional[str] = None
+    flow_rate_gpm: float
+    expected_gpm: float
+    message: str
@@ -1,31 +1,16 @@
 """Rachio API client for zone monitoring and watering events."""
 
 import os
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 import requests
-from pydantic import BaseModel
 
+from http_utils import PooledSession, send_with_retries
 from logger import get_logger
-
-
-class Zone(BaseModel):
-    """Rachio zone model."""
-
-    id: str
-    zone_number: int
-    name: str
-    enabled: bool
-
-
-class WateringEvent(BaseModel):
-    """Rachio watering event model."""
-
-    event_date: datetime
-    zone_name: str
-    zone_number: int
-    event_type: str  # ZONE_STARTED, ZONE_COMPLETED, ZONE_STOPPED
-    duration_seconds: Optional[int] = None
+from models import WateringEvent, Zone
+from rate_limiter import ApiRateLimiter
 
 
 class RachioClient:
@@ -33,12 +18,28 @@ class RachioClient:
 
     BASE_URL = "https://api.rach.io/1/public"
 
-    def __init__(self, api_key: Optional[str] = None, device_id: Optional[str] = None):
+    # Zones rarely change, but the running zone does; seconds of cache allowed
+    DEVICE_INFO_TTL = 3600.0
+    ACTIVE_ZONE_MAX_AGE = 60.0
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        device_id: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        rate_limiter: Optional[ApiRateLimiter] = None,
+        device_info_ttl: float = DEVICE_INFO_TTL,
+    ):
         """Initialize Rachio client.
 
         Args:
             api_key: Rachio API key (defaults to RACHIO_API_KEY env var)
             device_id: Rachio device ID (defaults to RACHIO_ID env var)
+            session: HTTP session to share (defaults to a new PooledSession)
+            rate_limiter: Budget every API call is counted against (defaults
+                to the 1,700 calls/day limit, counted in this process only)
+            device_info_ttl: Seconds device info and zones are served from
+                cache before being revalidated
         """
         self.api_key = api_key or os.getenv("RACHIO_API_KEY")
         self.device_id = device_id or os.getenv("RACHIO_ID")
@@ -53,21 +54,79 @@ class RachioClient:
             "Content-Type": "application/json",
         }
 
+        # Keep-alive connection pool with timeouts and retries
+        self.session = session or PooledSession()
+        self.rate_limiter = rate_limiter or ApiRateLimiter("rachio")
+
+        # Cached device info with its fetch time and HTTP validators
+        self.device_info_ttl = device_info_ttl
+        self._device_info: Optional[Dict[str, Any]] = None
+        self._device_info_fetched = 0.0
+        self._device_info_validators: Dict[str, str] = {}
+        self._device_info_lock = threading.Lock()
+
         # Setup logging
         self.logger = get_logger(__name__)
         self.logger.info(f"Rachio client initialized for device {self.device_id}")
 
-    def get_device_info(self) -> Dict[str, Any]:
-        """Get device information including zones."""
-        self.logger.debug(f"Fetching device info for {self.device_id}")
-        url = f"{self.BASE_URL}/device/{self.device_id}"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
-        device_info = response.json()
-        self.logger.info(
-            f"Retrieved device info for {device_info.get('name', 'Unknown Device')}"
-        )
-        return device_info
+    def get_device_info(self, max_age: Optional[float] = None) -> Dict[str, Any]:
+        """Get device information including zones.
+
+        Served from cache while younger than max_age. Stale entries are
+        revalidated with If-None-Match/If-Modified-Since when the API sent an
+        ETag or Last-Modified, so an unchanged device costs a 304 without a
+        body.
+
+        Args:
+            max_age: Oldest cached copy to accept in seconds (defaults to
+                device_info_ttl, 0 to always revalidate)
+        """
+        max_age = self.device_info_ttl if max_age is None else max_age
+        with self._device_info_lock:
+            age = time.monotonic() - self._device_info_fetched
+            if self._device_info is not None and age < max_age:
+                self.logger.debug(f"Using device info cached {age:.0f}s ago")
+                return self._device_info
+
+            self.logger.debug(f"Fetching device info for {self.device_id}")
+            url = f"{self.BASE_URL}/device/{self.device_id}"
+            headers = dict(self.headers)
+            if self._device_info is not None:
+                headers.update(self._device_info_validators)
+
+            response = send_with_retries(
+                lambda: self.session.get(url, headers=headers),
+                self.rate_limiter.acquire,
+            )
+            if response.status_code == 304 and self._device_info is not None:
+                self.logger.debug("Device info not modified")
+                self._device_info_fetched = time.monotonic()
+                return self._device_info
+
+            response.raise_for_status()
+            device_info = response.json()
+            self.logger.info(
+                f"Retrieved device info for {device_info.get('name', 'Unknown Device')}"
+            )
+
+            self._device_info = device_info
+            self._device_info_fetched = time.monotonic()
+            self._device_info_validators = {}
+            for header, validator in (
+                ("ETag", "If-None-Match"),
+                ("Last-Modified", "If-Modified-Since"),
+            ):
+                value = response.headers.get(header)
+                if value:
+                    self._device_info_validators[validator] = value
+            return device_info
+
+    def invalidate_device_info(self) -> None:
+        """Drop cached device info so the next call fetches it in full."""
+        with self._device_info_lock:
+            self._device_info = None
+            self._device_info_fetched = 0.0
+            self._device_info_validators = {}
 
     def get_zones(self) -> List[Zone]:
         """Get all zones for the device."""
@@ -88,7 +147,7 @@ class RachioClient:
 
     def get_active_zone(self) -> Optional[Zone]:
         """Get currently active watering zone."""
-        device_info = self.get_device_info()
+        device_info = self.get_device_info(max_age=self.ACTIVE_ZONE_MAX_AGE)
 
         # Check if any schedule is running
         for schedule in device_info.get("scheduleRules", []):
@@ -127,7 +186,10 @@ class RachioClient:
             "topic": "WATERING",
         }
 
-        response = requests.get(url, headers=self.headers, params=params)
+        response = send_with_retries(
+            lambda: self.session.get(url, headers=self.headers, params=params),
+            self.rate_limiter.acquire,
+        )
         response.raise_for_status()
 
         events = []
@@ -0,0 +1,193 @@
+"""Client-side request rate limiting for the Rachio and Flume APIs."""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, ClassVar, Dict, Optional, Tuple
+
+
+class RateLimiter:
+    """Thread-safe token bucket.
+
+    Tokens refill continuously at `rate` per second up to `burst`; each
+    request takes one, blocking until one is available.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """Initialize the limiter with a full bucket.
+
+        Args:
+            rate: Sustained requests per second
+            burst: Requests allowed back to back after an idle period
+        """
+        if rate <= 0:
+            raise ValueError("Rate must be positive")
+
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until it is available.
+
+        Returns:
+            Seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class BudgetExhaustedError(Exception):
+    """Raised instead of calling an API whose daily budget is spent."""
+
+
+class _MemoryCallCounter:
+    """Per-process call counts, used when no database is shared."""
+
+    def __init__(self):
+        """Initialize empty counts."""
+        self._calls: Dict[Tuple[str, str], int] = {}
+
+    def get_api_calls(self, api: str, day: str) -> int:
+        """Calls recorded against an API on a day."""
+        return self._calls.get((api, day), 0)
+
+    def record_api_call(
+        self, api: str, day: str, budget: Optional[int] = None
+    ) -> Optional[int]:
+        """Count one call and return the day's total, or None if over budget."""
+        calls = self._calls.get((api, day), 0)
+        if budget is not None and calls >= budget:
+            return None
+        self._calls[(api, day)] = calls + 1
+        return calls + 1
+
+
+class ApiRateLimiter:
+    """Request budget for one API: a token bucket plus a daily call cap.
+
+    Every call takes a token, which smooths bursts, and is counted against
+    the API's budget for the current UTC day. Counts live in the store, so
+    pollers sharing a WaterTrackingDB share one budget across processes and
+    restarts. Once the day's budget is spent, calls fail fast with
+    BudgetExhaustedError rather than getting the account locked out.
+    """
+
+    # Default daily call caps; Flume publishes no fixed daily cap
+    DAILY_BUDGETS: ClassVar[Dict[str, Optional[int]]] = {"rachio": 1700, "flume": None}
+
+    def __init__(
+        self,
+        api: str,
+        daily_budget: Optional[int] = None,
+        rate: float = 1.0,
+        burst: int = 5,
+        store: Optional[Any] = None,
+    ):
+        """Initialize the limiter.
+
+        Args:
+            api: API name used for accounting ("rachio" or "flume")
+            daily_budget: Calls allowed per UTC day (defaults to DAILY_BUDGETS,
+                None for no cap)
+            rate: Sustained calls per second
+            burst: Calls allowed back to back after an idle period
+            store: Call counter with get_api_calls/record_api_call, such as a
+                WaterTrackingDB (defaults to per-process counts)
+        """
+        self.api = api
+        self.daily_budget = (
+            daily_budget if daily_budget is not None else self.DAILY_BUDGETS.get(api)
+        )
+        self.bucket = RateLimiter(rate, burst)
+        self.store = store if store is not None else _MemoryCallCounter()
+        self.calls_made = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, now: Optional[datetime] = None) -> None:
+        """Account for one call, waiting for a token first.
+
+        Raises:
+            BudgetExhaustedError: If today's budget is already spent
+        """
+        self.bucket.acquire()
+        day = self._day(now)
+        with self._lock:
+            # Checked and counted in one step, so a process sharing the store
+            # cannot take the same last call
+            if self.store.record_api_call(self.api, day, self.daily_budget) is None:
+                raise BudgetExhaustedError(
+                    f"{self.api} daily budget of {self.daily_budget} calls is "
+                    f"spent; resets in {self.seconds_until_reset(now):.0f}s"
+                )
+            self.calls_made += 1
+
+    def calls_today(self, now: Optional[datetime] = None) -> int:
+        """Calls counted against today's budget."""
+        return self.store.get_api_calls(self.api, self._day(now))
+
+    def remaining_today(self, now: Optional[datetime] = None) -> Optional[int]:
+        """Calls left in today's budget, or None if uncapped."""
+        if self.daily_budget is None:
+            return None
+        return max(0, self.daily_budget - self.calls_today(now))
+
+    def seconds_until_reset(self, now: Optional[datetime] = None) -> float:
+        """Seconds until the budget resets at UTC midnight."""
+        now = self._utc(now)
+        midnight = datetime.combine(
+            now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc
+        )
+        return (midnight - now).total_seconds()
+
+    def suggested_interval(
+        self, calls_per_cycle: int, now: Optional[datetime] = None
+    ) -> float:
+        """Shortest poll interval that spreads the remaining budget to midnight.
+
+        Args:
+            calls_per_cycle: Calls one collection cycle makes to this API
+
+        Returns:
+            Seconds between cycles, 0 if the budget does not constrain polling
+        """
+        remaining = self.remaining_today(now)
+        if remaining is None or calls_per_cycle <= 0:
+            return 0.0
+
+        seconds_left = self.seconds_until_reset(now)
+        cycles_left = remaining // calls_per_cycle
+        if cycles_left == 0:
+            return seconds_left
+        return seconds_left / cycles_left
+
+    def budget_summary(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Today's budget, calls used and calls remaining."""
+        return {
+            "daily_budget": self.daily_budget,
+            "calls_today": self.calls_today(now),
+            "remaining_today": self.remaining_today(now),
+        }
+
+    def _day(self, now: Optional[datetime]) -> str:
+        """UTC day key for budget accounting."""
+        return self._utc(now).date().isoformat()
+
+    def _utc(self, now: Optional[datetime]) -> datetime:
+        """The given time (naive means local) or now, in UTC."""
+        return (now or datetime.now()).astimezone(timezone.utc)
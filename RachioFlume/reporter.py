@@ -1,24 +1,61 @@
 """Weekly reporting system for water tracking data."""
 
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from pathlib import Path
 
-from data_storage import WaterTrackingDB
+from analytics import SessionAnalytics
+from data_storage import MAX_EPOCH, WaterTrackingDB, local_day_start, to_epoch
 from logger import get_logger
 
 
+def week_start_of(value: datetime) -> datetime:
+    """Local midnight on the Monday of value's week."""
+    monday = value.date() - timedelta(days=value.weekday())
+    return datetime.combine(monday, datetime.min.time())
+
+
+def _generate_weekly_reports(
+    db_path: str,
+    archive_dir: Optional[str],
+    use_cache: bool,
+    week_starts: List[datetime],
+) -> List[Dict[str, Any]]:
+    """Process pool entry point: one reporter and one query per chunk of weeks."""
+    return WeeklyReporter(db_path, archive_dir, use_cache)._weekly_reports(week_starts)
+
+
 class WeeklyReporter:
     """Generate weekly water usage reports by zone."""
 
-    def __init__(self, db_path: str = "water_tracking.db"):
+    def __init__(
+        self,
+        db_path: str = "water_tracking.db",
+        archive_dir: Optional[str] = None,
+        use_cache: bool = True,
+    ):
         """Initialize the reporter.
 
         Args:
             db_path: Path to SQLite database
+            archive_dir: Parquet archive of older months, merged into reports
+            use_cache: Serve and store reports through the database's report
+                cache, which drops entries once newer data lands in their window
         """
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.use_cache = use_cache
         self.db = WaterTrackingDB(db_path)
+        self.archive = None
+        if archive_dir:
+            # Imported here so reports without an archive skip loading pyarrow
+            from archive import ParquetArchive
+
+            self.archive = ParquetArchive(archive_dir)
+        self.analytics = SessionAnalytics(self.db, self.archive)
         self.logger = get_logger(__name__)
         self.logger.info("Weekly reporter initialized")
 
@@ -36,8 +73,142 @@ class WeeklyReporter:
             f"Generating weekly report for {week_start.date()} to {week_end.date()}"
         )
 
-        # Get zone statistics
-        zone_stats = self.db.get_weekly_zone_stats(week_start)
+        return self._weekly_reports([week_start])[0]
+
+    def generate_weekly_reports(
+        self, start: datetime, end: datetime, processes: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Generate a report for every week overlapping [start, end).
+
+        All weeks are computed from one grouped query over the per-zone daily
+        rollup (plus one archive scan). With several processes, the weeks are
+        split into contiguous chunks and each worker queries its own chunk.
+
+        Args:
+            start: Start of the range; the first report starts on its Monday
+            end: Exclusive end of the range
+            processes: Worker processes to spread the weeks over
+
+        Returns:
+            Reports shaped like generate_weekly_report(), in week order
+        """
+        week_starts = []
+        week_start = week_start_of(start)
+        while week_start < end:
+            week_starts.append(week_start)
+            week_start += timedelta(days=7)
+
+        self.logger.info(
+            f"Generating {len(week_starts)} weekly reports from {start.date()} "
+            f"to {end.date()}"
+        )
+
+        workers = min(max(1, processes), len(week_starts))
+        if workers <= 1:
+            return self._weekly_reports(week_starts)
+
+        chunk_size = -(-len(week_starts) // workers)
+        chunks = [
+            week_starts[i : i + chunk_size]
+            for i in range(0, len(week_starts), chunk_size)
+        ]
+        # Spawned workers open their own connections instead of inheriting
+        # this process's locks and threads through fork
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            parts = executor.map(
+                _generate_weekly_reports,
+                [self.db_path] * len(chunks),
+                [self.archive_dir] * len(chunks),
+                [self.use_cache] * len(chunks),
+                chunks,
+            )
+            return [report for part in parts for report in part]
+
+    def _weekly_reports(self, week_starts: List[datetime]) -> List[Dict[str, Any]]:
+        """Reports for consecutive weeks, computing uncached ones in one query."""
+        reports: Dict[datetime, Dict[str, Any]] = {}
+        for week_start in week_starts:
+            cached = self._cached_report(
+                "weekly", week_start, week_start + timedelta(days=7)
+            )
+            if cached is not None:
+                reports[week_start] = cached
+
+        missing = [
+            week_start for week_start in week_starts if week_start not in reports
+        ]
+        if missing:
+            watermark = self.db.get_report_cache_watermark()
+            boundaries = [missing[0]]
+            while boundaries[-1] <= missing[-1]:
+                boundaries.append(boundaries[-1] + timedelta(days=7))
+
+            pending = set(missing)
+            period_stats = self.analytics.period_zone_totals(boundaries)
+            for week_start, zone_stats in zip(boundaries, period_stats):
+                if week_start not in pending:
+                    continue
+                report = self._format_weekly_report(week_start, zone_stats)
+                self._cache_report(
+                    "weekly",
+                    week_start,
+                    week_start + timedelta(days=7),
+                    watermark,
+                    report,
+                )
+                reports[week_start] = report
+
+        return [reports[week_start] for week_start in week_starts]
+
+    def _report_type(self, kind: str) -> str:
+        """Cache key for a report kind; archive-backed reports differ."""
+        return f"{kind}:archive" if self.archive is not None else kind
+
+    def _cached_report(
+        self, kind: str, start: datetime, end: Optional[datetime]
+    ) -> Optional[Dict[str, Any]]:
+        """A still-valid cached report for [start, end), if caching is on.
+
+        An end of None means the window is open, so any newer data in or
+        after it invalidates the entry.
+        """
+        if not self.use_cache:
+            return None
+
+        report = self.db.get_cached_report(
+            self._report_type(kind),
+            to_epoch(start),
+            to_epoch(end) if end is not None else MAX_EPOCH,
+        )
+        if report is not None:
+            self.logger.debug(f"Serving cached {kind} report from {start}")
+        return report
+
+    def _cache_report(
+        self,
+        kind: str,
+        start: datetime,
+        end: Optional[datetime],
+        watermark: Dict[str, int],
+        report: Dict[str, Any],
+    ) -> None:
+        """Store a computed report if caching is on."""
+        if self.use_cache:
+            self.db.save_cached_report(
+                self._report_type(kind),
+                to_epoch(start),
+                to_epoch(end) if end is not None else MAX_EPOCH,
+                watermark,
+                report,
+            )
+
+    def _format_weekly_report(
+        self, week_start: datetime, zone_stats: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Build a weekly report from the week's per-zone statistics."""
+        week_end = week_start + timedelta(days=7)
 
         # Calculate total statistics
         total_sessions = sum(stat["session_count"] for stat in zone_stats)
@@ -82,22 +253,11 @@ class WeeklyReporter:
 
     def generate_current_week_report(self) -> Dict[str, Any]:
         """Generate report for the current week (Monday to Sunday)."""
-        today = datetime.now().date()
-
-        # Find the Monday of current week
-        days_since_monday = today.weekday()
-        monday = today - timedelta(days=days_since_monday)
-        week_start = datetime.combine(monday, datetime.min.time())
-
-        return self.generate_weekly_report(week_start)
+        return self.generate_weekly_report(week_start_of(datetime.now()))
 
     def generate_last_week_report(self) -> Dict[str, Any]:
         """Generate report for last week."""
-        current_week_report = self.generate_current_week_report()
-        last_week_start = datetime.fromisoformat(
-            current_week_report["week_start"]
-        ) - timedelta(days=7)
-
+        last_week_start = week_start_of(datetime.now()) - timedelta(days=7)
         return self.generate_weekly_report(last_week_start)
 
     def save_report_to_file(self, report: Dict[str, Any], filename: str) -> None:
@@ -113,6 +273,27 @@ class WeeklyReporter:
         with open(output_path, "w") as f:
             json.dump(report, f, indent=2, default=str)
 
+    def save_reports_to_directory(
+        self, reports: List[Dict[str, Any]], output_dir: str
+    ) -> List[str]:
+        """Save each weekly report as weekly_report_<week start>.json.
+
+        Args:
+            reports: Weekly reports
+            output_dir: Directory for the JSON files
+
+        Returns:
+            Paths written, in report order
+        """
+        filenames = []
+        for report in reports:
+            filename = str(
+                Path(output_dir) / f"weekly_report_{report['week_start'][:10]}.json"
+            )
+            self.save_report_to_file(report, filename)
+            filenames.append(filename)
+        return filenames
+
     def print_report(self, report: Dict[str, Any]) -> None:
         """Print report in a readable format."""
         print("\\n" + "=" * 60)
@@ -153,52 +334,57 @@ class WeeklyReporter:
             Efficiency analysis by zone
         """
         end_date = datetime.now()
-        start_date = end_date - timedelta(weeks=weeks_back)
-
-        # Get all sessions in the period
-        sessions = self.db.get_zone_sessions(start_date, end_date)
-
-        # Group by zone
-        zone_data = {}
-        for session in sessions:
-            zone_name = session["zone_name"]
-            if zone_name not in zone_data:
-                zone_data[zone_name] = {
-                    "sessions": [],
-                    "total_water": 0,
-                    "total_duration": 0,
-                }
-
-            zone_data[zone_name]["sessions"].append(session)
-            zone_data[zone_name]["total_water"] += session.get("total_water_used", 0)
-            zone_data[zone_name]["total_duration"] += session.get("duration_seconds", 0)
+        # Starting at midnight keeps the window, and so the cache entry,
+        # stable for the day
+        start_date = local_day_start(end_date - timedelta(weeks=weeks_back))
+
+        kind = f"efficiency:{weeks_back}"
+        cached = self._cached_report(kind, start_date, None)
+        if cached is not None:
+            return cached
+        watermark = self.db.get_report_cache_watermark()
+
+        # Per-zone aggregates and flow rate distributions for the period
+        zone_totals = self.analytics.zone_statistics(
+            start_date,
+            end_date + timedelta(seconds=1),
+            by=("zone_name",),
+        )
 
         # Calculate efficiency metrics
         efficiency_analysis = {}
-        for zone_name, data in zone_data.items():
-            if data["total_duration"] > 0:
-                avg_flow_rate = data["total_water"] / (
-                    data["total_duration"] / 60
-                )  # GPM
-                water_per_session = data["total_water"] / len(data["sessions"])
-                duration_per_session = (
-                    data["total_duration"] / len(data["sessions"]) / 60
-                )  # minutes
-
-                efficiency_analysis[zone_name] = {
-                    "total_sessions": len(data["sessions"]),
+        for totals in zone_totals:
+            total_water = totals["total_water_used"] or 0
+            total_duration = totals["total_duration_seconds"] or 0
+            session_count = totals["session_count"]
+
+            if total_duration > 0:
+                avg_flow_rate = total_water / (total_duration / 60)  # GPM
+                water_per_session = total_water / session_count
+                duration_per_session = total_duration / session_count / 60  # minutes
+
+                efficiency_analysis[totals["zone_name"]] = {
+                    "total_sessions": session_count,
                     "average_flow_rate_gpm": round(avg_flow_rate, 2),
                     "water_per_session_gallons": round(water_per_session, 1),
                     "duration_per_session_minutes": round(duration_per_session, 1),
-                    "total_water_gallons": round(data["total_water"], 1),
-                    "total_duration_hours": round(data["total_duration"] / 3600, 2),
+                    "total_water_gallons": round(total_water, 1),
+                    "total_duration_hours": round(total_duration / 3600, 2),
+                    "flow_rate_percentiles_gpm": {
+                        name: round(value, 2)
+                        for name, value in totals["flow_rate_percentiles"].items()
+                    },
+                    "flow_rate_distribution": totals["flow_rate_histogram"],
                 }
 
-        return {
+        analysis = {
             "analysis_period": f"{start_date.date()} to {end_date.date()}",
             "weeks_analyzed": weeks_back,
             "zones": efficiency_analysis,
+            "daily_usage": self.analytics.daily_usage(start_date, end_date),
         }
+        self._cache_report(kind, start_date, None, watermark, analysis)
+        return analysis
 
 
 def main():
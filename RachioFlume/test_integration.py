@@ -1,16 +1,34 @@
 """Tests for the Rachio-Flume water tracking integration."""
 
+import argparse
+import asyncio
+import json
+import numpy as np
 import pytest
+import requests
+import sqlite3
+import subprocess
+import sys
 import tempfile
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch
 import os
 
 from rachio_client import RachioClient, Zone, WateringEvent
-from flume_client import FlumeClient, WaterReading
-from data_storage import WaterTrackingDB
+from flume_client import Device, FlumeClient, UsageQuery, WaterReading
+from data_storage import RetentionPolicy, WaterTrackingDB, to_epoch
+from http_utils import PooledSession
 from collector import WaterTrackingCollector
 from reporter import WeeklyReporter
+from analytics import SessionAnalytics
+from anomaly_detector import AnomalyDetector
+from attribution import AttributionEngine
+from archive import ParquetArchive
+from rate_limiter import ApiRateLimiter, BudgetExhaustedError
+from backfill import BackfillEngine
 
 
 class TestRachioClient:
@@ -31,7 +49,7 @@ class TestRachioClient:
             with pytest.raises(ValueError, match="Rachio API key required"):
                 RachioClient()
 
-    @patch("rachio_client.requests.get")
+    @patch("requests.Session.get")
     def test_get_zones(self, mock_get):
         """Test getting zones from device."""
         mock_response = Mock()
@@ -57,6 +75,30 @@ class TestRachioClient:
             assert zones[1].name == "Back Yard"
             assert zones[1].enabled is False
 
+    @patch("requests.Session.get")
+    def test_device_info_cache(self, mock_get):
+        """Test device info is cached, revalidated by ETag and invalidated."""
+        full = Mock(status_code=200, headers={"ETag": '"v1"'})
+        full.json.return_value = {"name": "Controller", "zones": []}
+        full.raise_for_status.return_value = None
+        not_modified = Mock(status_code=304, headers={})
+        mock_get.side_effect = [full, not_modified, full]
+
+        client = RachioClient("key", "device")
+        client.get_zones()
+        client.get_zones()
+        assert mock_get.call_count == 1
+
+        # A stale copy is revalidated and reused when unchanged
+        assert client.get_device_info(max_age=0)["name"] == "Controller"
+        assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+
+        client.invalidate_device_info()
+        client.get_device_info()
+        assert mock_get.call_count == 3
+        assert "If-None-Match" not in mock_get.call_args.kwargs["headers"]
+        assert client.rate_limiter.calls_made == 3
+
 
 class TestFlumeClient:
     """Test Flume API client."""
@@ -80,8 +122,8 @@ class TestFlumeClient:
             with pytest.raises(ValueError, match="access_token required"):
                 FlumeClient()
 
-    @patch("flume_client.requests.get")
-    @patch("flume_client.requests.post")
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
     def test_get_usage(self, mock_post, mock_get):
         """Test getting water usage data."""
         # Mock device list response
@@ -123,7 +165,7 @@ class TestFlumeClient:
             assert readings[0].value == 1.5
             assert readings[1].value == 2.0
 
-    @patch("flume_client.requests.get")
+    @patch("requests.Session.get")
     def test_get_devices(self, mock_get):
         """Test getting user devices."""
         mock_response = Mock()
@@ -152,7 +194,7 @@ class TestFlumeClient:
             assert devices[1].active is False
             assert devices[1].location == "Pool"
 
-    @patch("flume_client.requests.get")
+    @patch("requests.Session.get")
     def test_get_device_id_auto_selection(self, mock_get):
         """Test automatic device ID selection."""
         mock_response = Mock()
@@ -169,6 +211,264 @@ class TestFlumeClient:
 
             assert device_id == "active_device"
 
+    @patch("requests.Session.get")
+    @patch("requests.Session.post")
+    def test_token_cache_refresh_and_retry(self, mock_post, mock_get):
+        """Test tokens are cached on disk, refreshed near expiry and on 401."""
+        grants = []
+
+        def token_grant(url, data, headers, **kwargs):
+            grants.append(data["grant_type"])
+            response = Mock(status_code=200)
+            response.raise_for_status.return_value = None
+            response.json.return_value = {
+                "data": [
+                    {
+                        "access_token": f"access{len(grants)}",
+                        "refresh_token": f"refresh{len(grants)}",
+                        "expires_in": 3600,
+                    }
+                ]
+            }
+            return response
+
+        mock_post.side_effect = token_grant
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "token.json")
+
+            def new_client():
+                return FlumeClient(
+                    "id",
+                    "secret",
+                    "user@example.com",
+                    "pw",
+                    token_cache_path=cache_path,
+                )
+
+            client = new_client()
+            assert grants == ["password"]
+            assert os.stat(cache_path).st_mode & 0o777 == 0o600
+
+            # A second run reuses the cached token without signing in
+            assert new_client().access_token == "access1"
+            assert grants == ["password"]
+
+            # A token about to expire is exchanged with the refresh token
+            with open(cache_path) as f:
+                cached = json.load(f)
+            cached["expires_at"] = time.time() + 60
+            with open(cache_path, "w") as f:
+                json.dump(cached, f)
+            client = new_client()
+            assert grants == ["password", "refresh_token"]
+            assert mock_post.call_args.kwargs["data"]["refresh_token"] == "refresh1"
+            assert client.access_token == "access2"
+
+            # A 401 refreshes the token and retries the request once
+            unauthorized = Mock(status_code=401)
+            devices = Mock(status_code=200)
+            devices.raise_for_status.return_value = None
+            devices.json.return_value = [{"id": "meter1", "name": "Main Meter"}]
+            mock_get.side_effect = [unauthorized, devices]
+
+            assert [device.id for device in client.get_devices()] == ["meter1"]
+            assert grants == ["password", "refresh_token", "refresh_token"]
+            assert (
+                mock_get.call_args.kwargs["headers"]["Authorization"]
+                == "Bearer access3"
+            )
+
+            # Threads rejected with the same token refresh it only once
+            rejected = threading.Barrier(2)
+
+            def get(url, headers, **kwargs):
+                if headers["Authorization"] == "Bearer access3":
+                    rejected.wait(timeout=5)
+                    return unauthorized
+                return devices
+
+            mock_get.side_effect = get
+            url = f"{client.BASE_URL}/users/me/devices"
+            workers = [
+                threading.Thread(target=client._request, args=("GET", url))
+                for _ in range(2)
+            ]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            assert grants.count("refresh_token") == 3
+            assert client.access_token == "access4"
+
+    @patch("flume_client.FlumeClient._get_access_token", return_value="token789")
+    @patch("requests.Session.post")
+    def test_get_usage_queries_devices_concurrently(self, mock_post, mock_token):
+        """Test device queries run in parallel and merge in time order."""
+
+        def device_usage(url, json, headers, **kwargs):
+            time.sleep(0.3)
+            offset = {"meter1": 0, "meter2": 1, "meter3": 2}[url.split("/")[-2]]
+            response = Mock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = {
+                "data": [
+                    {
+                        "data": [
+                            {
+                                "datetime": f"2023-01-01T10:{minute:02d}:00Z",
+                                "value": offset,
+                            }
+                            for minute in range(offset, 9, 3)
+                        ]
+                    }
+                ]
+            }
+            return response
+
+        mock_post.side_effect = device_usage
+
+        client = FlumeClient("id", "secret", "user@example.com", "password")
+        client._devices = [
+            Device(id=f"meter{number}", name=f"Meter {number}") for number in (1, 2, 3)
+        ]
+
+        started = time.perf_counter()
+        readings = client.get_usage(datetime(2023, 1, 1, 10), datetime(2023, 1, 1, 11))
+        elapsed = time.perf_counter() - started
+
+        assert mock_post.call_count == 3
+        assert elapsed < 0.6
+        assert [reading.timestamp.minute for reading in readings] == list(range(9))
+        assert [reading.device_id for reading in readings[:3]] == [
+            "meter1",
+            "meter2",
+            "meter3",
+        ]
+
+    @patch("flume_client.FlumeClient._get_access_token", return_value="token789")
+    @patch("requests.Session.post")
+    def test_batched_queries_demultiplex(self, mock_post, mock_token):
+        """Test queries share POSTs and results split back out by request_id."""
+
+        def batched_usage(url, json, headers, **kwargs):
+            response = Mock()
+            response.raise_for_status.return_value = None
+            response.json.return_value = {
+                "data": [
+                    {
+                        query["request_id"]: [
+                            {"datetime": query["since_datetime"], "value": 1.0}
+                        ]
+                        for query in json["queries"]
+                    }
+                ]
+            }
+            return response
+
+        mock_post.side_effect = batched_usage
+
+        client = FlumeClient("id", "secret", "user@example.com", "password")
+        client._devices = [Device(id="meter1", name="Main Meter")]
+
+        windows = [
+            (datetime(2023, 1, 1, hour), datetime(2023, 1, 1, hour, 59))
+            for hour in range(12)
+        ]
+        readings = client.get_usage_windows(windows)
+
+        # Twelve windows fit in two requests of up to ten queries
+        assert mock_post.call_count == 2
+        assert [
+            len(call.kwargs["json"]["queries"]) for call in mock_post.call_args_list
+        ] == [10, 2]
+        assert [reading.timestamp.hour for reading in readings] == list(range(12))
+
+        mock_post.reset_mock()
+        snapshot = client.get_usage_snapshot(now=datetime(2023, 1, 1, 12, 0))
+        assert mock_post.call_count == 1
+        assert snapshot == {"current_usage_rate_gpm": 1.0, "today_usage_gallons": 1.0}
+
+        # The single-purpose helpers each cost one request too
+        mock_post.reset_mock()
+        assert client.get_current_usage_rate() == 1.0
+        day = client.get_daily_usage(datetime(2023, 1, 1, 15, 30))
+        assert mock_post.call_count == 2
+        assert [reading.timestamp for reading in day] == [datetime(2023, 1, 1)]
+        assert mock_post.call_args.kwargs["json"]["queries"][0]["bucket"] == "HR"
+
+        with pytest.raises(ValueError, match="unique request_ids"):
+            client.query_usage(
+                [
+                    UsageQuery(
+                        request_id="a", since=windows[0][0], until=windows[0][1]
+                    ),
+                    UsageQuery(
+                        request_id="a", since=windows[1][0], until=windows[1][1]
+                    ),
+                ]
+            )
+
+
+class TestPooledSession:
+    """Test the shared HTTP session."""
+
+    def test_retries_keep_alive_and_latency(self):
+        """Test 5xx is not retried, one connection is reused, latency is recorded."""
+        seen = {"requests": 0, "clients": set()}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                seen["requests"] += 1
+                seen["clients"].add(self.client_address)
+                if self.path == "/slow":
+                    time.sleep(0.5)
+                status = 503 if seen["requests"] == 1 else 200
+                body = b'{"ok": true}'
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except BrokenPipeError:
+                    pass  # The client gave up waiting
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        try:
+            session = PooledSession(retries=3, backoff_factor=0.01)
+
+            # A 503 is left to the rate-limited client layer, not re-sent
+            assert session.get(f"{base_url}/usage").status_code == 503
+            assert seen["requests"] == 1
+            response = session.get(f"{base_url}/usage")
+            assert response.status_code == 200
+            assert response.json() == {"ok": True}
+            assert len(seen["clients"]) == 1  # one kept-alive connection
+
+            summary = session.latency_summary()
+            assert (
+                summary[f"GET 127.0.0.1:{server.server_address[1]}/usage"]["count"] == 2
+            )
+
+            impatient = PooledSession(retries=0, timeout=(1.0, 0.1))
+            with pytest.raises(requests.RequestException):
+                impatient.get(f"{base_url}/slow")
+
+            session.close()
+            impatient.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
 
 class TestWaterTrackingDB:
     """Test database operations."""
@@ -196,6 +496,43 @@ class TestWaterTrackingDB:
 
             os.unlink(tmp.name)
 
+    def test_shared_connection_wal(self):
+        """Test the connection is reused, uses WAL and is thread-safe."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            with db.get_connection() as first, db.get_connection() as second:
+                assert first is second
+                mode = first.execute("PRAGMA journal_mode").fetchone()[0]
+                assert mode == "wal"
+
+            def write(offset):
+                db.save_water_readings(
+                    [
+                        WaterReading(
+                            timestamp=datetime(2023, 1, 1, 10, offset, second),
+                            value=1.0,
+                        )
+                        for second in range(20)
+                    ]
+                )
+
+            threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # A second handle (e.g. the reporter) sees committed rows
+            reader = WaterTrackingDB(tmp.name)
+            with reader.get_connection() as conn:
+                count = conn.execute("SELECT COUNT(*) FROM water_readings").fetchone()
+                assert count[0] == 80
+
+            reader.close()
+            db.close()
+            os.unlink(tmp.name)
+
     def test_save_and_retrieve_zones(self):
         """Test saving and retrieving zones."""
         with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
@@ -206,7 +543,14 @@ class TestWaterTrackingDB:
                 Zone(id="zone2", zone_number=2, name="Back Yard", enabled=False),
             ]
 
-            db.save_zones(zones)
+            assert db.save_zones(zones) == 2
+
+            # Unchanged zones are not rewritten
+            assert db.save_zones(zones) == 0
+            zones[1] = Zone(id="zone2", zone_number=2, name="Back Yard", enabled=True)
+            assert db.save_zones(zones) == 1
+            zones[1] = Zone(id="zone2", zone_number=2, name="Back Yard", enabled=False)
+            assert db.save_zones(zones) == 1
 
             # Retrieve and verify
             with db.get_connection() as conn:
@@ -222,6 +566,77 @@ class TestWaterTrackingDB:
 
             os.unlink(tmp.name)
 
+    def test_bulk_insert_water_readings(self):
+        """Test bulk ingest from raw tuples reports inserted rows."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            rows = [
+                (to_epoch(datetime(2023, 1, 1, 10, minute)), 0.5, "GAL", "meter", "MIN")
+                for minute in range(60)
+            ]
+            stats = db.bulk_insert_water_readings(iter(rows))
+
+            assert stats.inserted == 60
+            assert stats.skipped == 0
+            assert db.save_water_readings([]).inserted == 0
+
+            # Overlapping polls are ignored by the natural key
+            stats = db.bulk_insert_water_readings(rows[30:])
+            assert stats.inserted == 0
+            assert stats.skipped == 30
+
+            db.close()
+            os.unlink(tmp.name)
+
+    def test_migration_upgrades_legacy_rows(self):
+        """Test opening a legacy database dedupes and converts rows in place."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            conn = sqlite3.connect(tmp.name)
+            conn.executescript(
+                """
+                CREATE TABLE watering_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_date TIMESTAMP NOT NULL,
+                    zone_name TEXT NOT NULL,
+                    zone_number INTEGER NOT NULL,
+                    event_type TEXT NOT NULL,
+                    duration_seconds INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                CREATE TABLE water_readings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TIMESTAMP NOT NULL,
+                    value REAL NOT NULL,
+                    unit TEXT DEFAULT 'GAL',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+                INSERT INTO water_readings (timestamp, value)
+                VALUES ('2023-01-01 10:00:00', 1.0), ('2023-01-01 10:00:00', 1.0);
+                INSERT INTO watering_events
+                (event_date, zone_name, zone_number, event_type)
+                VALUES ('2023-01-01 10:00:00', 'Front Yard', 1, 'ZONE_STARTED'),
+                       ('2023-01-01 10:00:00', 'Front Yard', 1, 'ZONE_STARTED');
+            """
+            )
+            conn.commit()
+            conn.close()
+
+            db = WaterTrackingDB(tmp.name)
+            with db.get_connection() as conn:
+                readings = conn.execute("SELECT COUNT(*) FROM water_readings")
+                assert readings.fetchone()[0] == 1
+                events = conn.execute("SELECT COUNT(*) FROM watering_events")
+                assert events.fetchone()[0] == 1
+
+                reading = conn.execute("SELECT timestamp FROM water_readings")
+                assert reading.fetchone()[0] == to_epoch(datetime(2023, 1, 1, 10))
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                assert version == db.SCHEMA_VERSION
+
+            db.close()
+            os.unlink(tmp.name)
+
     def test_compute_zone_sessions(self):
         """Test computing zone sessions from events."""
         with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
@@ -259,6 +674,331 @@ class TestWaterTrackingDB:
 
             os.unlink(tmp.name)
 
+    def test_compute_zone_sessions_incremental(self):
+        """Test open sessions close and late readings update totals."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            start_time = datetime(2023, 1, 1, 10, 0)
+            end_time = datetime(2023, 1, 1, 10, 30)
+
+            db.save_watering_events(
+                [
+                    WateringEvent(
+                        event_date=start_time,
+                        zone_name="Front Yard",
+                        zone_number=1,
+                        event_type="ZONE_STARTED",
+                    )
+                ]
+            )
+            assert db.compute_zone_sessions() == 0
+
+            # End event arrives in a later cycle and closes the open start
+            db.save_watering_events(
+                [
+                    WateringEvent(
+                        event_date=end_time,
+                        zone_name="Front Yard",
+                        zone_number=1,
+                        event_type="ZONE_COMPLETED",
+                        duration_seconds=1800,
+                    )
+                ]
+            )
+            assert db.compute_zone_sessions() == 1
+
+            # Nothing new, nothing recomputed
+            assert db.compute_zone_sessions() == 0
+
+            # Late readings inside the session refresh its water total
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=datetime(2023, 1, 1, 10, 5), value=3.0),
+                    WaterReading(timestamp=datetime(2023, 1, 1, 10, 6), value=2.0),
+                ]
+            )
+            assert db.compute_zone_sessions() == 1
+
+            sessions = db.get_zone_sessions(datetime(2023, 1, 1), datetime(2023, 1, 2))
+            assert len(sessions) == 1
+            assert sessions[0]["total_water_used"] == 5.0
+
+            assert db.compute_zone_sessions(full_rebuild=True) == 1
+            sessions = db.get_zone_sessions(datetime(2023, 1, 1), datetime(2023, 1, 2))
+            assert len(sessions) == 1
+
+            os.unlink(tmp.name)
+
+    def test_incremental_sessions_match_full_rebuild(self):
+        """Test a late end event closes every start still open before it."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            def event(hour, minute, event_type):
+                return WateringEvent(
+                    event_date=datetime(2023, 1, 1, hour, minute),
+                    zone_name="Front Yard",
+                    zone_number=1,
+                    event_type=event_type,
+                )
+
+            def sessions():
+                return [
+                    (session["start_time"], session["end_time"])
+                    for session in db.get_zone_sessions(
+                        datetime(2023, 1, 1), datetime(2023, 1, 2)
+                    )
+                ]
+
+            # Three starts whose end events are all missing
+            db.save_watering_events(
+                [
+                    event(10, 0, "ZONE_STARTED"),
+                    event(10, 10, "ZONE_STARTED"),
+                    event(10, 20, "ZONE_STARTED"),
+                ]
+            )
+            assert db.compute_zone_sessions() == 0
+
+            db.save_watering_events([event(11, 0, "ZONE_COMPLETED")])
+            assert db.compute_zone_sessions() == 3
+
+            # An end arriving late, before the one that closed them, re-closes
+            # every start it follows
+            db.save_watering_events([event(10, 30, "ZONE_STOPPED")])
+            db.compute_zone_sessions()
+            incremental = sessions()
+
+            db.compute_zone_sessions(full_rebuild=True)
+            assert sessions() == incremental
+            stopped = to_epoch(datetime(2023, 1, 1, 10, 30))
+            assert [end for _, end in incremental] == [stopped] * 3
+
+            os.unlink(tmp.name)
+
+    def test_daily_rollup_uses_local_day_of_each_reading(self, monkeypatch):
+        """Test a UTC hour straddling local midnight splits between two days."""
+        monkeypatch.setenv("TZ", "Asia/Kolkata")  # UTC+05:30
+        time.tzset()
+        try:
+            with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+                db = WaterTrackingDB(tmp.name)
+
+                # 18:15 and 18:45 UTC, one UTC hour on either side of midnight
+                db.save_water_readings(
+                    [
+                        WaterReading(timestamp=datetime(2023, 1, 1, 23, 45), value=1.0),
+                        WaterReading(timestamp=datetime(2023, 1, 2, 0, 15), value=2.0),
+                    ]
+                )
+
+                with db.get_connection() as conn:
+                    daily = conn.execute(
+                        "SELECT day_start, total_gallons FROM water_usage_daily "
+                        "ORDER BY day_start"
+                    ).fetchall()
+                assert [tuple(row) for row in daily] == [
+                    (to_epoch(datetime(2023, 1, 1)), 1.0),
+                    (to_epoch(datetime(2023, 1, 2)), 2.0),
+                ]
+                assert not any(db.check_rollups().values())
+
+                db.close()
+                os.unlink(tmp.name)
+        finally:
+            monkeypatch.undo()
+            time.tzset()
+
+    def test_rollups_track_ingest_and_rebuild(self):
+        """Test rollups follow ingest and the checker repairs drift."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=datetime(2023, 1, 1, 10, 5), value=3.0),
+                    WaterReading(timestamp=datetime(2023, 1, 1, 10, 6), value=2.0),
+                    WaterReading(timestamp=datetime(2023, 1, 1, 11, 0), value=1.0),
+                ]
+            )
+            db.save_watering_events(
+                [
+                    WateringEvent(
+                        event_date=datetime(2023, 1, 1, 10, 0),
+                        zone_name="Front Yard",
+                        zone_number=1,
+                        event_type="ZONE_STARTED",
+                    ),
+                    WateringEvent(
+                        event_date=datetime(2023, 1, 1, 10, 30),
+                        zone_name="Front Yard",
+                        zone_number=1,
+                        event_type="ZONE_COMPLETED",
+                    ),
+                ]
+            )
+            db.compute_zone_sessions()
+
+            with db.get_connection() as conn:
+                daily = conn.execute(
+                    "SELECT total_gallons, reading_count FROM water_usage_daily"
+                ).fetchall()
+                assert [tuple(row) for row in daily] == [(6.0, 3)]
+                hourly = conn.execute(
+                    "SELECT total_gallons FROM water_usage_hourly ORDER BY hour_start"
+                ).fetchall()
+                assert [row[0] for row in hourly] == [5.0, 1.0]
+
+            stats = db.get_weekly_zone_stats(datetime(2023, 1, 1))
+            assert stats[0]["session_count"] == 1
+            assert stats[0]["total_water_used"] == 5.0
+
+            assert not any(db.check_rollups().values())
+
+            with db.get_connection() as conn:
+                conn.execute("UPDATE water_usage_hourly SET total_gallons = 0")
+                conn.commit()
+            assert db.check_rollups()["water_usage_hourly"] == 2
+
+            db.rebuild_rollups(datetime(2023, 1, 1), datetime(2023, 1, 1, 12))
+            assert not any(db.check_rollups().values())
+
+            db.close()
+            os.unlink(tmp.name)
+
+    def test_cumulative_usage_index(self):
+        """Test interval usage comes from the prefix sums, including backfill."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=datetime(2023, 1, 1, 10, m), value=1.0)
+                    for m in range(10)
+                ]
+            )
+            # An older batch arriving later must shift every later total
+            db.save_water_readings(
+                [WaterReading(timestamp=datetime(2023, 1, 1, 9, 0), value=4.0)]
+            )
+
+            assert db.get_water_usage(
+                datetime(2023, 1, 1, 9, 0), datetime(2023, 1, 1, 10, 4)
+            ) == pytest.approx(9.0)
+            assert db.get_water_usage(
+                datetime(2023, 1, 1, 10, 2), datetime(2023, 1, 1, 12, 0)
+            ) == pytest.approx(8.0)
+            assert db.get_water_usage(
+                datetime(2023, 1, 2), datetime(2023, 1, 3)
+            ) == pytest.approx(0.0)
+
+            with db.get_connection() as conn:
+                periods = [
+                    (
+                        to_epoch(datetime(2023, 1, 1, 8, 0)),
+                        to_epoch(datetime(2023, 1, 1, 9, 0)),
+                    ),
+                    (
+                        to_epoch(datetime(2023, 1, 1, 10, 3)),
+                        to_epoch(datetime(2023, 1, 1, 10, 3)),
+                    ),
+                    (
+                        to_epoch(datetime(2023, 1, 1, 9, 30)),
+                        to_epoch(datetime(2023, 1, 2)),
+                    ),
+                ]
+                assert db._usage_for_periods(conn, periods) == pytest.approx(
+                    [4.0, 1.0, 10.0]
+                )
+
+            # A batch interleaved with existing minutes, and one left out of
+            # the index until rebuilt, end up as a full rebuild would
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=datetime(2023, 1, 1, 9, 30), value=2.0),
+                    WaterReading(
+                        timestamp=datetime(2023, 1, 1, 10, 5),
+                        value=0.5,
+                        device_id="meter2",
+                    ),
+                ]
+            )
+            db.save_water_readings(
+                [WaterReading(timestamp=datetime(2023, 1, 1, 8, 0), value=3.0)],
+                update_usage_index=False,
+            )
+            db.rebuild_usage_index(datetime(2023, 1, 1, 8, 0))
+
+            def index():
+                with db.get_connection() as conn:
+                    return conn.execute(
+                        "SELECT * FROM water_usage_cumulative ORDER BY timestamp"
+                    ).fetchall()
+
+            incremental = [tuple(row) for row in index()]
+            db.rebuild_usage_index()
+            assert incremental == [tuple(row) for row in index()]
+            assert incremental[-1][1] == pytest.approx(19.5)
+
+            db.close()
+            os.unlink(tmp.name)
+
+    def test_retention_maintenance(self):
+        """Test old readings are pruned to rollups and the file is compacted."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+
+            now = datetime(2023, 3, 1, 12)
+            start = to_epoch(datetime(2023, 1, 1))
+            db.bulk_insert_water_readings(
+                (start + 60 * i, 0.5, "GAL", "meter-1", "MIN")
+                for i in range(59 * 24 * 60)
+            )
+            january = db.get_water_usage(datetime(2023, 1, 1), datetime(2023, 2, 1))
+
+            report = db.run_maintenance(
+                RetentionPolicy(raw_days=14, hourly_days=30), now=now
+            )
+
+            assert report.raw_cutoff == datetime(2023, 2, 15)
+            assert report.readings_pruned == 45 * 24 * 60
+            assert report.bytes_reclaimed > 0
+            assert set(report.latency_before_ms) == set(report.latency_after_ms)
+
+            with db.get_connection() as conn:
+                oldest = conn.execute(
+                    "SELECT MIN(timestamp) FROM water_readings"
+                ).fetchone()[0]
+                assert oldest == to_epoch(datetime(2023, 2, 15))
+                hourly = conn.execute(
+                    "SELECT MIN(hour_start) FROM water_usage_hourly"
+                ).fetchone()[0]
+                assert hourly == to_epoch(datetime(2023, 1, 30))
+                daily = conn.execute(
+                    "SELECT COUNT(*) FROM water_usage_daily"
+                ).fetchone()[0]
+                assert daily == 59
+
+            # Old usage is still answered at daily resolution
+            assert db.get_water_usage(
+                datetime(2023, 1, 1), datetime(2023, 2, 1)
+            ) == pytest.approx(january, abs=1.0)
+            assert not any(db.check_rollups().values())
+
+            # Backfill past the cutoff would double count its hourly totals
+            stats = db.bulk_insert_water_readings(
+                [(start, 0.5, "GAL", "meter-1", "MIN")]
+            )
+            assert stats.inserted == 0
+            assert stats.skipped == 1
+
+            assert not db.maintenance_due(timedelta(days=1), now=now)
+            assert db.maintenance_due(timedelta(days=1), now=now + timedelta(days=1))
+
+            db.close()
+            os.unlink(tmp.name)
+
 
 class TestWeeklyReporter:
     """Test weekly reporting functionality."""
@@ -281,8 +1021,8 @@ class TestWeeklyReporter:
                     (
                         "Front Yard",
                         1,
-                        "2023-01-02 10:00:00",
-                        "2023-01-02 10:30:00",
+                        to_epoch(datetime(2023, 1, 2, 10, 0)),
+                        to_epoch(datetime(2023, 1, 2, 10, 30)),
                         1800,
                         50.0,
                         1.67,
@@ -302,6 +1042,374 @@ class TestWeeklyReporter:
 
             os.unlink(tmp.name)
 
+    def test_weekly_report_spans_archive(self):
+        """Test reports combine archived months with the SQLite hot tier."""
+        pytest.importorskip("pyarrow")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "water.db")
+            db = WaterTrackingDB(db_path)
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time, duration_seconds, total_water_used, average_flow_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            "Front Yard",
+                            1,
+                            to_epoch(start),
+                            to_epoch(start) + 1800,
+                            1800,
+                            gallons,
+                            gallons / 30,
+                        )
+                        for start, gallons in (
+                            (datetime(2023, 1, 30, 6), 30.0),
+                            (datetime(2023, 1, 31, 6), 60.0),
+                            (datetime(2023, 2, 1, 6), 90.0),
+                        )
+                    ],
+                )
+                conn.commit()
+
+            db.bulk_insert_water_readings(
+                [
+                    (to_epoch(datetime(2023, 1, 30, 6, minute)), 1.0, "GAL", "m", "MIN")
+                    for minute in range(30)
+                ]
+            )
+
+            archive = ParquetArchive(os.path.join(tmp_dir, "archive"))
+            archived = archive.archive_before(db, datetime(2023, 2, 15))
+            assert archived["zone_sessions"] == 2
+            assert archived["water_readings"] == 30
+
+            # Usage over archived months still comes from the usage index
+            assert db.get_water_usage(
+                datetime(2023, 1, 30), datetime(2023, 1, 31)
+            ) == pytest.approx(30.0)
+            assert (
+                len(db.get_zone_sessions(datetime(2023, 1, 1), datetime(2023, 3, 1)))
+                == 1
+            )
+            assert os.path.isdir(
+                os.path.join(tmp_dir, "archive", "zone_sessions", "month=2023-01")
+            )
+
+            reporter = WeeklyReporter(
+                db_path, archive_dir=os.path.join(tmp_dir, "archive")
+            )
+            report = reporter.generate_weekly_report(datetime(2023, 1, 30))
+            assert report["summary"]["total_watering_sessions"] == 3
+            assert report["summary"]["total_water_used_gallons"] == 180.0
+            assert report["zones"][0]["average_flow_rate_gpm"] == 2.0
+
+            # Without the archive only the hot tier is reported
+            hot_only = WeeklyReporter(db_path).generate_weekly_report(
+                datetime(2023, 1, 30)
+            )
+            assert hot_only["summary"]["total_watering_sessions"] == 1
+
+            db.close()
+
+    def test_batch_weekly_reports(self):
+        """Test a range of weekly reports matches week-by-week generation."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "water.db")
+            db = WaterTrackingDB(db_path)
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time, duration_seconds, total_water_used, average_flow_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            f"Zone {day % 3 + 1}",
+                            day % 3 + 1,
+                            to_epoch(datetime(2024, 1, 1, 6) + timedelta(days=day)),
+                            to_epoch(datetime(2024, 1, 1, 6, 20) + timedelta(days=day)),
+                            1200,
+                            20.0 + day,
+                            1.0 + day / 10,
+                        )
+                        for day in range(0, 60, 2)
+                    ],
+                )
+                conn.commit()
+
+            reporter = WeeklyReporter(db_path)
+            reports = reporter.generate_weekly_reports(
+                datetime(2024, 1, 3), datetime(2024, 3, 1)
+            )
+            assert reports[0]["week_start"] == "2024-01-01T00:00:00"
+            assert reports[-1]["week_start"] == "2024-02-26T00:00:00"
+            assert len(reports) == 9
+
+            uncached = WeeklyReporter(db_path, use_cache=False)
+            for report in reports:
+                expected = uncached.generate_weekly_report(
+                    datetime.fromisoformat(report["week_start"])
+                )
+                for key in ("week_end", "summary", "zones"):
+                    assert report[key] == expected[key]
+            assert sum(r["summary"]["total_watering_sessions"] for r in reports) == 30
+
+            # Chunks spread over worker processes come back in week order
+            pooled = reporter.generate_weekly_reports(
+                datetime(2024, 1, 3), datetime(2024, 3, 1), processes=2
+            )
+            assert [r["summary"] for r in pooled] == [r["summary"] for r in reports]
+
+            filenames = reporter.save_reports_to_directory(
+                reports, os.path.join(tmp_dir, "reports")
+            )
+            assert len(filenames) == 9
+            with open(filenames[0]) as f:
+                assert json.load(f)["summary"] == reports[0]["summary"]
+
+            from main import parse_week_range
+
+            assert parse_week_range("2024-01..2024-12") == (
+                datetime(2024, 1, 1),
+                datetime(2025, 1, 1),
+            )
+            assert parse_week_range("2024-03-04..2024-03-10") == (
+                datetime(2024, 3, 4),
+                datetime(2024, 3, 11),
+            )
+            with pytest.raises(argparse.ArgumentTypeError):
+                parse_week_range("2024-12..2024-01")
+
+            db.close()
+
+    def test_report_cache_invalidation(self):
+        """Test cached reports survive unrelated ingest but not late data."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "water.db")
+            db = WaterTrackingDB(db_path)
+
+            def add_session(start: datetime, gallons: float) -> None:
+                with db.get_connection() as conn:
+                    conn.execute(
+                        """
+                        INSERT INTO zone_sessions
+                        (zone_name, zone_number, start_time, end_time, duration_seconds,
+                         total_water_used, average_flow_rate)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                        (
+                            "Lawn",
+                            1,
+                            to_epoch(start),
+                            to_epoch(start) + 600,
+                            600,
+                            gallons,
+                            gallons / 10,
+                        ),
+                    )
+                    conn.commit()
+
+            add_session(datetime(2024, 1, 2, 6), 30.0)
+            week = datetime(2024, 1, 1)
+            reporter = WeeklyReporter(db_path)
+            first = reporter.generate_weekly_report(week)
+            assert first["summary"]["total_water_used_gallons"] == 30.0
+
+            # Served from the cache without touching the analytics layer
+            with patch.object(
+                reporter.analytics, "period_zone_totals", side_effect=AssertionError
+            ):
+                assert reporter.generate_weekly_report(week) == first
+
+                # Readings and sessions outside the window leave it valid
+                db.save_water_readings(
+                    [WaterReading(timestamp=datetime(2024, 3, 1, 6), value=1.0)]
+                )
+                add_session(datetime(2024, 3, 1, 6), 50.0)
+                assert reporter.generate_weekly_report(week) == first
+
+            cached = db.get_report_cache_watermark()
+            with db.get_connection() as conn:
+                stored = json.loads(
+                    conn.execute("SELECT watermark FROM report_cache").fetchone()[0]
+                )
+            assert stored == cached
+
+            # A late session inside the week invalidates just that entry
+            add_session(datetime(2024, 1, 5, 6), 20.0)
+            refreshed = reporter.generate_weekly_report(week)
+            assert refreshed["summary"]["total_water_used_gallons"] == 50.0
+            assert refreshed["summary"]["total_watering_sessions"] == 2
+
+            # The open-ended efficiency window is cached until new data arrives
+            add_session(datetime.now() - timedelta(days=1), 40.0)
+            analysis = reporter.get_zone_efficiency_analysis(weeks_back=1)
+            assert analysis["zones"]["Lawn"]["total_sessions"] == 1
+            assert reporter.get_zone_efficiency_analysis(weeks_back=1) == analysis
+            add_session(datetime.now() - timedelta(hours=1), 40.0)
+            assert (
+                reporter.get_zone_efficiency_analysis(weeks_back=1)["zones"]["Lawn"][
+                    "total_sessions"
+                ]
+                == 2
+            )
+
+            # Rebuilding rollups clears the cache; disabling it stores nothing
+            db.rebuild_rollups()
+            with db.get_connection() as conn:
+                assert (
+                    conn.execute("SELECT COUNT(*) FROM report_cache").fetchone()[0] == 0
+                )
+            WeeklyReporter(db_path, use_cache=False).generate_weekly_report(week)
+            with db.get_connection() as conn:
+                assert (
+                    conn.execute("SELECT COUNT(*) FROM report_cache").fetchone()[0] == 0
+                )
+
+            db.close()
+
+
+class TestSessionAnalytics:
+    """Test vectorized session analytics."""
+
+    def test_zone_statistics_and_distributions(self):
+        """Test grouped aggregates match a straightforward per-zone computation."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = WaterTrackingDB(os.path.join(tmp_dir, "water.db"))
+            sessions = [
+                ("Back Yard", 2, datetime(2023, 1, 2, 6) + timedelta(days=day), flow)
+                for day, flow in enumerate([0.4, 1.5, 2.5, 2.5, 9.0])
+            ] + [
+                ("Front Yard", 1, datetime(2023, 1, 2, 7) + timedelta(days=day), flow)
+                for day, flow in enumerate([1.0, 3.0])
+            ]
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time, duration_seconds, total_water_used, average_flow_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            name,
+                            number,
+                            to_epoch(start),
+                            to_epoch(start) + 600,
+                            600,
+                            flow * 10,
+                            flow,
+                        )
+                        for name, number, start, flow in sessions
+                    ],
+                )
+                conn.commit()
+
+            analytics = SessionAnalytics(db)
+            columns = analytics.load_sessions(
+                datetime(2023, 1, 1), datetime(2023, 2, 1)
+            )
+            assert len(columns) == 7
+            assert columns["start_time"].dtype == np.int64
+
+            stats = analytics.zone_statistics(
+                datetime(2023, 1, 1), datetime(2023, 2, 1)
+            )
+            assert [stat["zone_name"] for stat in stats] == ["Front Yard", "Back Yard"]
+
+            back_yard = stats[1]
+            flows = [0.4, 1.5, 2.5, 2.5, 9.0]
+            assert back_yard["zone_number"] == 2
+            assert back_yard["session_count"] == 5
+            assert back_yard["total_duration_seconds"] == 3000
+            assert back_yard["total_water_used"] == pytest.approx(sum(flows) * 10)
+            assert back_yard["avg_flow_rate"] == pytest.approx(np.mean(flows))
+            for name, expected in zip(
+                ("p10", "p50", "p90"), np.percentile(flows, [10, 50, 90])
+            ):
+                assert back_yard["flow_rate_percentiles"][name] == pytest.approx(
+                    expected
+                )
+            histogram = back_yard["flow_rate_histogram"]
+            assert sum(histogram.values()) == 5
+            assert histogram["<0.5"] == 1
+            assert histogram["<3"] == 2
+            assert histogram["<12"] == 1
+            assert stats[0]["flow_rate_percentiles"]["p50"] == pytest.approx(2.0)
+
+            # Sessions are windowed by start time, end exclusive
+            window = analytics.zone_statistics(
+                datetime(2023, 1, 2), datetime(2023, 1, 3), by=("zone_number",)
+            )
+            assert [
+                (stat["zone_number"], stat["session_count"]) for stat in window
+            ] == [
+                (1, 1),
+                (2, 1),
+            ]
+            assert (
+                analytics.zone_statistics(datetime(2024, 1, 1), datetime(2024, 2, 1))
+                == []
+            )
+
+            db.close()
+
+    def test_efficiency_analysis_distributions(self):
+        """Test the efficiency analysis reports percentiles and daily usage."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_path = os.path.join(tmp_dir, "water.db")
+            db = WaterTrackingDB(db_path)
+            start = datetime.now().replace(microsecond=0) - timedelta(days=3)
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time, duration_seconds, total_water_used, average_flow_rate)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                    [
+                        (
+                            "Lawn",
+                            1,
+                            to_epoch(start) + offset,
+                            to_epoch(start) + offset + 1200,
+                            1200,
+                            40.0,
+                            2.0,
+                        )
+                        for offset in (0, 86400)
+                    ],
+                )
+                conn.commit()
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=start + timedelta(minutes=minute), value=2.0)
+                    for minute in range(20)
+                ]
+            )
+
+            analysis = WeeklyReporter(db_path).get_zone_efficiency_analysis(
+                weeks_back=1
+            )
+            lawn = analysis["zones"]["Lawn"]
+            assert lawn["total_sessions"] == 2
+            assert lawn["average_flow_rate_gpm"] == 2.0
+            assert lawn["flow_rate_percentiles_gpm"] == {
+                "p10": 2.0,
+                "p50": 2.0,
+                "p90": 2.0,
+            }
+            assert lawn["flow_rate_distribution"]["<3"] == 2
+            assert analysis["daily_usage"]["total_gallons"] == 40.0
+            assert analysis["daily_usage"]["max_gallons"] == 40.0
+
+            db.close()
+
 
 class TestWaterTrackingCollector:
     """Test the data collection service."""
@@ -316,8 +1424,67 @@ class TestWaterTrackingCollector:
             assert collector.db is not None
             assert collector.poll_interval == 300  # Default 5 minutes
 
+            # API clients are only built (and signed in) on first use
+            mock_flume.assert_not_called()
+            mock_rachio.assert_not_called()
+            assert collector.flume_client is collector.flume_client
+            mock_flume.assert_called_once()
+            mock_rachio.assert_not_called()
+
+            os.unlink(tmp.name)
+
+    def test_status_from_database(self):
+        """Test status is answered from the DB and the CLI skips HTTP imports."""
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+            now = datetime(2023, 6, 1, 12, 0)
+
+            db.save_watering_events(
+                [
+                    WateringEvent(
+                        event_date=now - timedelta(minutes=10),
+                        zone_name="Front Lawn",
+                        zone_number=1,
+                        event_type="ZONE_STARTED",
+                    )
+                ],
+                collected_until=now,
+            )
+            db.save_water_readings(
+                [
+                    WaterReading(timestamp=now - timedelta(minutes=m), value=v)
+                    for m, v in ((90, 10.0), (2, 3.0), (1, 5.0))
+                ],
+                collected_until=now,
+            )
+
+            status = db.get_status(now)
+            assert status["active_zone"] == {
+                "zone_number": 1,
+                "zone_name": "Front Lawn",
+            }
+            assert status["current_usage_rate_gpm"] == pytest.approx(4.0)
+            assert status["today_usage_gallons"] == pytest.approx(18.0)
+            assert status["last_flume_collection"] == now.isoformat()
+
+            db.close()
             os.unlink(tmp.name)
 
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import main, sys; "
+                "heavy = {'requests', 'pyarrow', 'collector'}; "
+                "print(sorted(heavy & set(sys.modules)))",
+            ],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "[]"
+
     @patch("collector.RachioClient")
     @patch("collector.FlumeClient")
     async def test_collect_once(self, mock_flume_class, mock_rachio_class):
@@ -347,6 +1514,429 @@ class TestWaterTrackingCollector:
 
             os.unlink(tmp.name)
 
+    @patch("collector.RachioClient")
+    @patch("collector.FlumeClient")
+    def test_collect_once_overlaps_api_calls(self, mock_flume_class, mock_rachio_class):
+        """Test the two APIs are polled in parallel, not one after the other."""
+
+        def slow(result):
+            def call(*args, **kwargs):
+                time.sleep(0.3)
+                return result
+
+            return call
+
+        mock_rachio = Mock()
+        mock_rachio.get_zones.side_effect = slow([])
+        mock_rachio.get_recent_events.side_effect = slow([])
+        mock_rachio_class.return_value = mock_rachio
+
+        mock_flume = Mock()
+        mock_flume.get_usage.side_effect = slow(
+            [WaterReading(timestamp=datetime(2023, 1, 1, 10, 0), value=1.0)]
+        )
+        mock_flume_class.return_value = mock_flume
+
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            collector = WaterTrackingCollector(tmp.name)
+
+            asyncio.run(collector.collect_once())
+
+            timings = collector.last_cycle_timings
+            assert timings["rachio"] >= 0.6
+            assert timings["flume"] >= 0.3
+            # Wall time tracks the slower API rather than the sum of both
+            assert timings["collect"] < timings["rachio"] + timings["flume"] - 0.2
+            assert timings["cycle"] >= timings["collect"] + timings["process"]
+            assert collector.db.get_water_usage(
+                datetime(2023, 1, 1), datetime(2023, 1, 2)
+            ) == pytest.approx(1.0)
+
+            collector.close()
+            os.unlink(tmp.name)
+
+    @patch("collector.RachioClient")
+    @patch("collector.FlumeClient")
+    def test_watermarks_survive_restart(self, mock_flume_class, mock_rachio_class):
+        """Test a restarted collector resumes polling from the stored watermarks."""
+        mock_rachio = Mock()
+        mock_rachio.get_zones.return_value = []
+        mock_rachio.get_recent_events.return_value = []
+        mock_rachio.get_events.return_value = []
+        mock_rachio.get_active_zone.return_value = None
+        mock_rachio_class.return_value = mock_rachio
+
+        mock_flume = Mock()
+        mock_flume.get_usage.return_value = [
+            WaterReading(timestamp=datetime(2023, 1, 1, 10, 0), value=1.0)
+        ]
+        mock_flume.get_usage_snapshot.return_value = {
+            "current_usage_rate_gpm": 0.0,
+            "today_usage_gallons": 0.0,
+        }
+        mock_flume_class.return_value = mock_flume
+
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            collector = WaterTrackingCollector(tmp.name)
+            assert collector.get_current_status()["last_flume_collection"] is None
+
+            asyncio.run(collector.collect_once())
+            flume_until = mock_flume.get_usage.call_args.args[1]
+            mock_rachio.get_recent_events.assert_called_once()
+            collector.close()
+
+            restarted = WaterTrackingCollector(tmp.name)
+            assert restarted.last_flume_collection == flume_until
+            assert restarted.get_current_status()["last_flume_collection"] == (
+                flume_until.isoformat()
+            )
+
+            # The next poll is incremental instead of a fresh 24h/7d download
+            asyncio.run(restarted.collect_once())
+            assert mock_flume.get_usage.call_args.args[0] == flume_until
+            mock_rachio.get_recent_events.assert_called_once()
+            mock_rachio.get_events.assert_called_once()
+
+            restarted.close()
+            os.unlink(tmp.name)
+
+
+class TestApiRateLimiter:
+    """Test API budget accounting."""
+
+    @patch("requests.Session.get")
+    def test_budget_shared_through_database(self, mock_get):
+        """Test calls are counted in the DB and refused once the budget is spent."""
+        response = Mock()
+        response.raise_for_status.return_value = None
+        response.json.return_value = {"name": "Controller", "zones": []}
+        mock_get.return_value = response
+
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+            noon = datetime(2023, 6, 1, 12, 0)
+
+            # A second process's limiter sees the first one's calls
+            first = ApiRateLimiter("rachio", daily_budget=3, burst=10, store=db)
+            second = ApiRateLimiter("rachio", daily_budget=3, burst=10, store=db)
+            first.acquire(noon)
+            first.acquire(noon)
+            assert second.remaining_today(noon) == 1
+            second.acquire(noon)
+            with pytest.raises(BudgetExhaustedError):
+                first.acquire(noon)
+            assert db.get_api_calls("rachio", "2023-06-01") == 3
+
+            # A refused call is not counted, and a zero budget allows nothing
+            assert db.record_api_call("rachio", "2023-06-01", budget=3) is None
+            assert db.get_api_calls("rachio", "2023-06-01") == 3
+            assert db.record_api_call("flume", "2023-06-01", budget=0) is None
+            assert db.get_api_calls("flume", "2023-06-01") == 0
+
+            # The budget resets on the next UTC day
+            tomorrow = noon + timedelta(days=1)
+            assert first.remaining_today(tomorrow) == 3
+
+            # Remaining calls are spread evenly until the reset
+            assert first.suggested_interval(1, noon) == first.seconds_until_reset(noon)
+            interval = first.suggested_interval(1, tomorrow)
+            assert interval == pytest.approx(first.seconds_until_reset(tomorrow) / 3)
+
+            # Every client request goes through the limiter
+            limiter = ApiRateLimiter("rachio", daily_budget=1, store=db)
+            client = RachioClient("key", "device", rate_limiter=limiter)
+            client.get_device_info()
+            with pytest.raises(BudgetExhaustedError):
+                client.get_events(noon, tomorrow)
+            assert mock_get.call_count == 1
+
+            db.close()
+            os.unlink(tmp.name)
+
+    def test_throttled_responses_retried_within_budget(self):
+        """Test a 503 is retried after Retry-After and every attempt is counted."""
+        seen = {"requests": 0}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                seen["requests"] += 1
+                body = b'{"name": "Controller", "zones": []}'
+                self.send_response(503 if seen["requests"] == 1 else 200)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            limiter = ApiRateLimiter("rachio", daily_budget=10, burst=10)
+            client = RachioClient("key", "device", rate_limiter=limiter)
+            client.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+
+            assert client.get_device_info()["name"] == "Controller"
+            assert seen["requests"] == 2
+            assert limiter.calls_today() == 2
+
+            # A retry that would overspend the budget is refused, not sent
+            seen["requests"] = 0
+            limiter = ApiRateLimiter("rachio", daily_budget=1, burst=10)
+            client = RachioClient("key", "device", rate_limiter=limiter)
+            client.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}"
+            with pytest.raises(BudgetExhaustedError):
+                client.get_device_info()
+            assert seen["requests"] == 1
+
+            client.session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestBackfillEngine:
+    """Test historical backfill."""
+
+    def test_backfill_resumes_from_checkpoint(self):
+        """Test windows are batched, streamed to the DB and resumed after a crash."""
+
+        def usage_windows(windows, bucket, strict):
+            return [
+                WaterReading(timestamp=start, value=1.0, device_id="meter1")
+                for start, _ in windows
+            ]
+
+        flume = Mock()
+        flume.get_usage_windows.side_effect = usage_windows
+
+        fetched = []
+
+        def events(start, end):
+            fetched.append(start)
+            if len(fetched) == 3:
+                raise requests.ConnectionError("connection reset")
+            return [
+                WateringEvent(
+                    event_date=start + timedelta(hours=1),
+                    zone_name="Front Lawn",
+                    zone_number=1,
+                    event_type="ZONE_STARTED",
+                )
+            ]
+
+        rachio = Mock()
+        rachio.get_events.side_effect = events
+
+        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp:
+            db = WaterTrackingDB(tmp.name)
+            engine = BackfillEngine(
+                db,
+                rachio_client=rachio,
+                flume_client=flume,
+                max_concurrency=1,
+            )
+            since = datetime(2023, 1, 1)
+            until = datetime(2023, 2, 1)
+
+            with pytest.raises(requests.ConnectionError):
+                engine.run(since, until)
+
+            # 62 half-day windows went out ten per Flume request
+            assert flume.get_usage_windows.call_count == 7
+            assert db.get_water_usage(since, until) == pytest.approx(62.0)
+
+            # The two Rachio weeks stored before the failure are checkpointed
+            results = engine.run(since, until)
+            rachio_result = results[1]
+            assert rachio_result.resumed_from == datetime(2023, 1, 15)
+            assert fetched[3] == datetime(2023, 1, 15)
+            assert rachio_result.inserted == 3
+
+            # Flume finished last time and is not fetched again
+            assert results[0].resumed_from == until
+            assert results[0].requests == 0
+            assert flume.get_usage_windows.call_count == 7
+
+            db.close()
+            os.unlink(tmp.name)
+
+
+class TestAttributionEngine:
+    """Test minute-resolution flow attribution."""
+
+    def test_overlapping_sessions_split_after_baseline(self):
+        """Test overlapping zones share each minute and household use is removed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = WaterTrackingDB(os.path.join(tmp_dir, "water.db"))
+            day = datetime(2023, 6, 1)
+
+            def minutes(hour, minute, count, gallons):
+                start = to_epoch(day.replace(hour=hour, minute=minute))
+                return [
+                    (start + 60 * i, gallons, "GAL", "meter1", "MIN")
+                    for i in range(count)
+                ]
+
+            # Idle household use, then zone 1 alone, zone 2 alone, and a
+            # manual zone 2 run overlapping a scheduled zone 1 run
+            db.bulk_insert_water_readings(
+                minutes(6, 0, 30, 0.2)
+                + minutes(6, 30, 10, 2.2)
+                + minutes(6, 40, 10, 1.2)
+                + minutes(6, 50, 10, 3.2)
+                + minutes(7, 0, 1, 0.2)
+            )
+            sessions = [
+                ("Front Lawn", 1, (6, 30), (6, 40)),
+                ("Back Yard", 2, (6, 40), (6, 50)),
+                ("Front Lawn", 1, (6, 50), (7, 0)),
+                ("Back Yard", 2, (6, 50), (7, 0)),
+            ]
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time, duration_seconds)
+                    VALUES (?, ?, ?, ?, 600)
+                """,
+                    [
+                        (
+                            name,
+                            number,
+                            to_epoch(day.replace(hour=start[0], minute=start[1])),
+                            to_epoch(day.replace(hour=end[0], minute=end[1])),
+                        )
+                        for name, number, start, end in sessions
+                    ],
+                )
+                conn.commit()
+
+            engine = AttributionEngine(db)
+            result = engine.run()
+            assert result.minutes == 61
+            assert result.irrigated_minutes == 30
+            assert result.household_gallons == pytest.approx(6.0)
+            assert result.attributed_gallons == pytest.approx(60.0)
+            assert result.sessions_updated == 4
+
+            # Overlap minutes split 2:1 by the flows learned from solo minutes
+            totals = [
+                (row["zone_number"], row["total_water_used"], row["average_flow_rate"])
+                for row in db.get_zone_sessions(day, day + timedelta(days=1))
+            ]
+            assert [zone for zone, _, _ in totals] == [1, 2, 1, 2]
+            assert [total for _, total, _ in totals] == pytest.approx(
+                [20.0, 10.0, 20.0, 10.0]
+            )
+            assert [rate for _, _, rate in totals] == pytest.approx(
+                [2.0, 1.0, 2.0, 1.0]
+            )
+
+            with db.get_connection() as conn:
+                rows = conn.execute(
+                    "SELECT COUNT(*), SUM(gallons) FROM zone_attribution"
+                ).fetchone()
+            assert rows[0] == 40
+            assert rows[1] == pytest.approx(60.0)
+
+            # Nothing new was ingested, so the next run has nothing to do
+            assert engine.run().minutes == 0
+
+            # A late reading from a second meter re-walks the overlap session
+            late = to_epoch(day.replace(hour=6, minute=55))
+            db.bulk_insert_water_readings([(late, 0.0, "GAL", "meter2", "MIN")])
+            result = engine.run()
+            assert result.start == day.replace(hour=6, minute=50)
+            assert result.sessions_updated == 0
+
+            db.close()
+
+
+class TestAnomalyDetector:
+    """Test streaming leak and broken head detection."""
+
+    def test_leak_and_broken_head_alerts(self):
+        """Test anomalies are flagged once, across runs, as readings arrive."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db = WaterTrackingDB(os.path.join(tmp_dir, "water.db"))
+            day = datetime(2023, 6, 1)
+
+            def at(hour, minute=0):
+                return to_epoch(day.replace(hour=hour, minute=minute))
+
+            def minutes(start, end, gallons):
+                return [
+                    (timestamp, gallons(index), "GAL", "meter1", "MIN")
+                    for index, timestamp in enumerate(range(start, end, 60))
+                ]
+
+            def household(index):
+                return 0.0 if index % 2 else 0.3
+
+            with db.get_connection() as conn:
+                conn.executemany(
+                    """
+                    INSERT INTO zone_sessions
+                    (zone_name, zone_number, start_time, end_time)
+                    VALUES ('Front Lawn', 1, ?, ?)
+                """,
+                    [(at(6), at(6, 40)), (at(7), at(7, 20))],
+                )
+                conn.commit()
+
+            # Zone 1 runs at 2 GPM, then at 3.5 GPM with a broken head
+            db.bulk_insert_water_readings(
+                minutes(at(0), at(6), household)
+                + minutes(at(6), at(6, 40), lambda _: 2.0)
+                + minutes(at(6, 40), at(7), household)
+                + minutes(at(7), at(7, 20), lambda _: 3.5)
+                + minutes(at(7, 20), at(8), household)
+                + minutes(at(8), at(8, 30), lambda _: 0.1)
+            )
+            detector = AnomalyDetector(db)
+            alerts = detector.process()
+            assert [alert.alert_type for alert in alerts] == ["broken_head"]
+            assert alerts[0].zone_number == 1
+            assert alerts[0].detected_at == day.replace(hour=7, minute=2)
+            assert alerts[0].expected_gpm == pytest.approx(1.85, abs=0.05)
+
+            # The idle trickle that started last run becomes a leak at an hour
+            db.bulk_insert_water_readings(minutes(at(8, 30), at(9, 30), lambda _: 0.1))
+            alerts = detector.process()
+            assert [alert.alert_type for alert in alerts] == ["leak"]
+            assert alerts[0].start_time == day.replace(hour=8)
+            assert alerts[0].detected_at == day.replace(hour=8, minute=59)
+            assert alerts[0].flow_rate_gpm == pytest.approx(0.1)
+
+            # A zone still waiting for its end event is not a leak
+            db.save_watering_events(
+                [
+                    WateringEvent(
+                        event_date=day.replace(hour=10),
+                        zone_name="Front Lawn",
+                        zone_number=1,
+                        event_type="ZONE_STARTED",
+                    )
+                ]
+            )
+            db.bulk_insert_water_readings(
+                minutes(at(9, 30), at(10), lambda _: 0.0)
+                + minutes(at(10), at(11, 30), lambda _: 2.0)
+            )
+            assert detector.process() == []
+
+            stored = db.get_flow_alerts(day, day + timedelta(days=1))
+            assert [alert["alert_type"] for alert in stored] == ["leak", "broken_head"]
+            assert db.get_status(day.replace(hour=12))["recent_alerts"] == stored
+
+            db.close()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])